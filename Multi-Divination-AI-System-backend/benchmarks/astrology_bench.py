@@ -0,0 +1,83 @@
+# benchmarks/astrology_bench.py - 星历表插值 vs 解析计算：精度与单次/批量查询耗时
+"""
+在临时目录生成星历表，然后：
+
+- 在随机时刻上对比插值结果与解析计算的最大误差（角分）
+- 单次星盘计算（natal_chart）的耗时分位数
+- 批量星盘计算（natal_charts）的每条平均耗时
+
+    python -m benchmarks.astrology_bench --samples 100000 --batch 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.results import format_table, summarize
+
+CITIES = ["Taipei", "北京", "London", "New York", "Sydney", "Tokyo"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="星历表基准")
+    parser.add_argument("--samples", type=int, default=100_000, help="精度校验的随机时刻数")
+    parser.add_argument("--single", type=int, default=2_000, help="单次星盘计算次数")
+    parser.add_argument("--batch", type=int, default=10_000, help="批量星盘计算条数")
+    args = parser.parse_args()
+
+    os.environ["EPHEMERIS_DIR"] = tempfile.mkdtemp(prefix="ephemeris_bench_")
+    from services import ephemeris
+    from services.astrology import natal_chart, natal_charts
+
+    start = time.perf_counter()
+    ephemeris.build_table(ephemeris.table_path())
+    print(f"生成星历表: {time.perf_counter() - start:.2f} s，"
+          f"{os.path.getsize(ephemeris.table_path()) / 1024 / 1024:.1f} MB")
+
+    # 精度
+    rng = np.random.default_rng(7)
+    table = ephemeris.get_ephemeris()
+    jd = ephemeris.START_JD + rng.uniform(0, ephemeris.DAYS - 1, args.samples)
+    start = time.perf_counter()
+    interpolated = table.longitudes(jd)
+    lookup = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = ephemeris.compute_longitudes(jd)
+    analytic = time.perf_counter() - start
+    error = np.abs((interpolated - exact + 180) % 360 - 180) * 60
+    print(f"插值 {lookup * 1e6 / args.samples:.2f} µs/时刻 vs 解析计算 {analytic * 1e6 / args.samples:.2f} µs/时刻")
+    print("最大插值误差（角分）: " + ", ".join(
+        f"{body} {value:.2f}" for body, value in zip(ephemeris.BODIES, error.max(axis=0))
+    ))
+
+    # 单次与批量星盘
+    days = rng.integers(0, 365 * 100, args.batch)
+    items = [
+        {
+            "birth_date": str(np.datetime64("1930-01-01") + int(day)),
+            "birth_time": f"{int(day) % 24:02d}:{int(day) % 60:02d}",
+            "birth_location": CITIES[int(day) % len(CITIES)],
+        }
+        for day in days
+    ]
+    latencies = []
+    for item in items[:args.single]:
+        start = time.perf_counter()
+        natal_chart(item)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    natal_charts(items)
+    batch = time.perf_counter() - start
+
+    print(format_table({"single_chart": summarize(latencies, 0, sum(latencies))}))
+    print(f"批量 {args.batch} 条: {batch:.3f} s，{batch * 1e6 / args.batch:.1f} µs/条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/chat_bench.py - 聊天消息存储：万条消息会话上的追加、翻页与上下文窗口查询
+"""
+在临时 SQLite 数据库（或 DATABASE_URL 指定的数据库）中建一个 --messages 条消息的会话，然后对比：
+
+- append: 追加一条消息（含会话统计与 last_message_at 的更新）
+- page_keyset / page_offset: 随机深度翻页，keyset（before_id 游标）vs OFFSET
+- window_index / window_full_load: 最近 --window-tokens token 的上下文，
+  token_offset 索引范围查询 vs 加载整个会话后在 Python 中截取
+
+    python -m benchmarks.chat_bench --messages 10000 --samples 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import format_table, summarize
+
+WORDS = ("moon", "star", "path", "card", "destiny", "career", "love", "change", "future", "question",
+         "命运", "事业", "感情", "变化", "未来")
+
+
+def make_content(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 120)))
+
+
+def timed(samples: int, func):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(samples):
+        began = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, 0, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天消息存储基准")
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--window-tokens", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='chat_bench_')}/chat.db"
+
+    from database import SessionLocal, engine
+    from models import Base, ChatMessage, User, AuthProvider, UserRole
+    from schemas import ChatMessageCreate, ChatSessionCreate
+    from services.chat_service import ChatService
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    user = User(username=f"chat_bench_{rng.randrange(10 ** 9)}", auth_provider=AuthProvider.GUEST, role=UserRole.FREE)
+    db.add(user)
+    db.commit()
+    service = ChatService(db)
+    session = service.create_session(ChatSessionCreate(title="bench"), user.id)
+
+    start = time.perf_counter()
+    for offset in range(0, args.messages, 100):
+        batch = [
+            ChatMessageCreate(content=make_content(rng), is_user_message=(offset + i) % 2 == 0)
+            for i in range(min(100, args.messages - offset))
+        ]
+        service.append_messages(session.id, batch, user.id)
+    seeded = time.perf_counter() - start
+    print(f"写入 {args.messages:,} 条消息: {seeded:.2f} s（每批 100 条，{args.messages / seeded:,.0f} 条/s）")
+
+    ids = [row[0] for row in db.query(ChatMessage.id).filter(ChatMessage.session_id == session.id)]
+    results = {}
+    results["append"] = timed(args.samples, lambda: service.append_message(
+        session.id, ChatMessageCreate(content=make_content(rng)), user.id
+    ))
+
+    results["page_keyset"] = timed(args.samples, lambda: service.get_messages(
+        session.id, before_id=rng.choice(ids), limit=args.page_size, user_id=user.id
+    ))
+
+    def page_offset():
+        db.query(ChatMessage).filter(ChatMessage.session_id == session.id).order_by(
+            ChatMessage.id.desc()
+        ).offset(rng.randrange(len(ids))).limit(args.page_size).all()
+    results["page_offset"] = timed(args.samples, page_offset)
+
+    window_sizes = []
+
+    def window_index():
+        window_sizes.append(len(service.get_context_window(session.id, args.window_tokens, user.id)))
+    results["window_index"] = timed(args.samples, window_index)
+
+    def window_full_load():
+        messages = db.query(ChatMessage).filter(ChatMessage.session_id == session.id).order_by(ChatMessage.id).all()
+        used, window = 0, []
+        for message in reversed(messages):
+            if used + message.token_count > args.window_tokens:
+                break
+            used += message.token_count
+            window.append(message)
+        db.expunge_all()  # 与每次请求新建会话的情形一致，不复用身份映射中的对象
+        return window
+    results["window_full_load"] = timed(max(1, args.samples // 10), window_full_load)
+
+    print(format_table(results))
+    print(f"上下文窗口: {window_sizes[-1]} 条消息 / {args.window_tokens} token")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/fake_model_server.py - 本地假模型服务（模拟 Gemini generateContent / streamGenerateContent 接口）
+"""
+在测试和基准测试中代替 Gemini。接口路径与请求/响应结构（含 alt=sse 流式输出）与 Gemini REST API 一致，
+因此只需把 GEMINI_BASE_URL 指向该服务，或在进程内注入 ASGI transport：
+
+    from benchmarks.fake_model_server import create_fake_model_client
+    set_model_client(create_fake_model_client(latency=0.2))
+
+故障注入：error_rate / error_status（按概率返回错误）、slow_rate / slow_factor（按概率放大延迟）、
+fail_next（接下来 N 次调用固定失败），可在运行中修改 client.fake_config。
+
+独立运行:
+    FAKE_MODEL_LATENCY=0.5 FAKE_MODEL_ERROR_RATE=0.1 uvicorn benchmarks.fake_model_server:app --port 9000
+    GEMINI_BASE_URL=http://127.0.0.1:9000 uvicorn main:app
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ["星辰", "命运", "洞察", "成长", "勇气", "平衡", "insight", "journey", "balance", "clarity"]
+
+
+class FakeModelConfig:
+    """假模型的行为参数（可在运行中修改）"""
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        tokens: int = 300,
+        seed: int = 0,
+        first_token_ratio: float = 0.1,
+        chunk_tokens: int = 20,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0
+    ):
+        self.latency = latency   # 每次调用的基础延迟（秒）
+        self.jitter = jitter     # 延迟随机抖动比例（0.2 表示 ±20%）
+        self.tokens = tokens     # 每次回复的 token 数
+        self.first_token_ratio = first_token_ratio  # 流式接口中首段文本出现在总延迟的比例处
+        self.chunk_tokens = chunk_tokens            # 流式接口每段的 token 数
+        # 故障注入
+        self.error_rate = error_rate      # 以该概率直接返回 error_status
+        self.error_status = error_status
+        self.slow_rate = slow_rate        # 以该概率把延迟放大 slow_factor 倍（模拟长尾）
+        self.slow_factor = slow_factor
+        self.fail_next = 0                # 接下来固定失败的调用次数（测试熔断时使用）
+        self.errors = 0
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+
+def fake_text(prompt: str, tokens: int) -> str:
+    """根据提示词生成确定性的回复文本"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return " ".join(WORDS[digest[i % len(digest)] % len(WORDS)] for i in range(tokens))
+
+
+def prompt_text(body: Dict[str, Any]) -> str:
+    parts: List[Dict[str, Any]] = [p for c in body.get("contents", []) for p in c.get("parts", [])]
+    return "".join(p.get("text", "") for p in parts)
+
+
+def create_app(config: FakeModelConfig) -> FastAPI:
+    fake_app = FastAPI(title="Fake Gemini")
+    fake_app.state.config = config
+
+    def delay() -> float:
+        spread = config.latency * config.jitter
+        value = max(0.0, config.latency + config.rng.uniform(-spread, spread))
+        if config.slow_rate and config.rng.random() < config.slow_rate:
+            value *= config.slow_factor
+        return value
+
+    def should_fail() -> bool:
+        if config.fail_next > 0:
+            config.fail_next -= 1
+            return True
+        return bool(config.error_rate) and config.rng.random() < config.error_rate
+
+    def usage(prompt: str) -> Dict[str, int]:
+        prompt_tokens = max(1, len(prompt) // 4)
+        return {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": config.tokens,
+            "totalTokenCount": prompt_tokens + config.tokens,
+        }
+
+    def payload(text: str, model: str, finish_reason=None, usage_metadata=None) -> Dict[str, Any]:
+        candidate: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}}
+        if finish_reason:
+            candidate["finishReason"] = finish_reason
+        result: Dict[str, Any] = {"candidates": [candidate], "modelVersion": model}
+        if usage_metadata:
+            result["usageMetadata"] = usage_metadata
+        return result
+
+    async def stream_events(prompt: str, model: str):
+        # 首段在总延迟的 first_token_ratio 处到达，其余分段均匀分布在剩余时间内
+        total = delay()
+        words = fake_text(prompt, config.tokens).split(" ")
+        chunks = [words[i:i + config.chunk_tokens] for i in range(0, len(words), config.chunk_tokens)]
+        await asyncio.sleep(total * config.first_token_ratio)
+        step = total * (1 - config.first_token_ratio) / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(step)
+            last = index == len(chunks) - 1
+            text = (" " if index else "") + " ".join(chunk)
+            event = payload(text, model, "STOP" if last else None, usage(prompt) if last else None)
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n"
+
+    @fake_app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        if action not in ("generateContent", "streamGenerateContent"):
+            raise HTTPException(status_code=404, detail=f"unsupported action {action}")
+
+        body = await request.json()
+        config.calls += 1
+        prompt = prompt_text(body)
+        if should_fail():
+            config.errors += 1
+            await asyncio.sleep(config.latency * 0.1)
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"code": config.error_status, "message": "injected fault", "status": "UNAVAILABLE"}}
+            )
+        if action == "streamGenerateContent":
+            return StreamingResponse(stream_events(prompt, model), media_type="text/event-stream")
+
+        await asyncio.sleep(delay())
+        return payload(fake_text(prompt, config.tokens), model, "STOP", usage(prompt))
+
+    return fake_app
+
+
+def create_fake_model_client(latency: float = 0.2, jitter: float = 0.0, tokens: int = 300, **client_kwargs):
+    """返回通过 ASGI transport 直连假模型服务的 GeminiClient（不占用网络端口）"""
+    from services.model_client import GeminiClient
+
+    config = FakeModelConfig(latency=latency, jitter=jitter, tokens=tokens)
+    client = GeminiClient(
+        api_key="fake",
+        base_url="http://fake-model",
+        transport=httpx.ASGITransport(app=create_app(config)),
+        **client_kwargs
+    )
+    client.fake_config = config
+    return client
+
+
+app = create_app(FakeModelConfig(
+    latency=float(os.environ.get("FAKE_MODEL_LATENCY", "0.2")),
+    jitter=float(os.environ.get("FAKE_MODEL_JITTER", "0.1")),
+    tokens=int(os.environ.get("FAKE_MODEL_TOKENS", "300")),
+    error_rate=float(os.environ.get("FAKE_MODEL_ERROR_RATE", "0")),
+    slow_rate=float(os.environ.get("FAKE_MODEL_SLOW_RATE", "0")),
+))
@@ -0,0 +1,91 @@
+# benchmarks/generation_bench.py - 逐个生成 vs 并发生成的端到端延迟对比
+"""
+对比前端当前的做法（逐个方法依次调用模型，再生成综合报告）与后端并发扇出的总耗时，
+以及相同请求命中生成结果缓存（仅进程内层）时的耗时。使用进程内假模型服务，不访问网络和数据库。
+
+    python -m benchmarks.generation_bench --latency 0.5 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_model_server import create_fake_model_client
+from benchmarks.results import summarize, format_table
+
+METHODS = ["LifePathNumber", "Palmistry", "Astrology", "MBTI", "Tarot"]
+INPUT_DATA = {"birth_date": "1990-05-17", "birth_time": "08:30", "birth_location": "Taipei", "mbti_type": "INFJ"}
+
+
+async def run(latency: float, rounds: int, concurrency: int):
+    from models import DivinationMethod
+    from schemas import GenerationRequest
+    from services.generation_service import GenerationService
+    from services.generation_cache import GenerationCache
+    from services.prompts import build_method_prompt, build_integrated_prompt
+
+    client = create_fake_model_client(latency=latency, jitter=0.1)
+    request_fields = dict(
+        user_name="Bench", primary_question="What should I focus on this year?",
+        selected_methods=METHODS, input_data=INPUT_DATA
+    )
+    request = GenerationRequest(**request_fields)
+    uncached_request = GenerationRequest(**request_fields, use_cache=False)
+    cache = GenerationCache(persistent=False)
+
+    sequential, concurrent, cached = [], [], []
+    for _ in range(rounds):
+        # 逐个生成（前端现状）
+        start = time.perf_counter()
+        reports = {}
+        for method in METHODS:
+            parts = build_method_prompt(DivinationMethod(method), INPUT_DATA, request.primary_question, request.user_name)
+            reports[method] = (await client.generate(parts)).text
+        await client.generate(build_integrated_prompt(reports, request.primary_question, request.user_name))
+        sequential.append(time.perf_counter() - start)
+
+        # 并发扇出（跳过缓存）
+        service = GenerationService(db=None, client=client, max_concurrency=concurrency, cache=cache)
+        concurrent.append(await _fan_out(service, uncached_request))
+
+        # 并发扇出（缓存已由上一步预热）
+        cached.append(await _fan_out(service, request))
+
+    await client.aclose()
+    return {
+        "sequential": summarize(sequential, 0, sum(sequential)),
+        "concurrent": summarize(concurrent, 0, sum(concurrent)),
+        "cached": summarize(cached, 0, sum(cached)),
+    }
+
+
+async def _fan_out(service, request) -> float:
+    from models import DivinationMethod
+    from services.prompts import build_integrated_prompt
+
+    start = time.perf_counter()
+    results = await service.generate_individual_reports(request)
+    await service._generate(
+        DivinationMethod.INTEGRATED,
+        build_integrated_prompt(
+            {r.method.value: r.result.text for r in results}, request.primary_question, request.user_name
+        ),
+        use_cache=request.use_cache
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报告生成扇出基准")
+    parser.add_argument("--latency", type=float, default=0.5, help="假模型单次调用延迟（秒）")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=5)
+    args = parser.parse_args()
+    print(format_table(asyncio.run(run(args.latency, args.rounds, args.concurrency))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/load_driver.py - 进程内 ASGI 负载驱动
+"""
+通过 httpx.ASGITransport 在进程内直接调用 FastAPI 应用（不经过网络），
+按场景以固定并发发送请求，输出 p50/p95/p99 与吞吐，并保存为可跨提交对比的 JSON。
+
+用法（先用 benchmarks.seed_data 生成数据）:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.load_driver \\
+        --scenarios list,details,favorites,summary,search,batch_create \\
+        --requests 500 --concurrency 16 --output benchmarks/results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 必须在导入应用配置之前设置：进程内的所有请求都来自同一个客户端，
+# 按客户端限流和准入控制会把结果变成拒绝计数，这里测的是接口本身
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["ADMISSION_ENABLED"] = "false"
+# 基准数据属于测试用户，请求不带访问令牌
+os.environ["AUTH_REQUIRED"] = "false"
+
+import httpx
+
+from benchmarks.results import build_meta, format_table, save_results, summarize
+
+# 场景：名称 -> (HTTP方法, 生成 (路径, JSON体) 的函数)
+RequestFactory = Callable[[random.Random], Tuple[str, object]]
+
+
+def build_scenarios(reading_ids: List[int], persona_names: List[str]) -> Dict[str, Tuple[str, RequestFactory]]:
+    def batch_body(rng: random.Random):
+        methods = rng.sample(["LifePathNumber", "Palmistry", "Astrology", "MBTI", "Tarot"], 3)
+        return "/batch/readings", {
+            "user_name": f"bench_{rng.randint(0, 50)}",
+            "primary_question": "What should I focus on this year?",
+            "selected_methods": methods,
+            # request_nonce 保证请求体互不相同，避免被 single-flight 合并而少算写入
+            "input_data": {"birth_date": "1990-05-17", "request_nonce": rng.getrandbits(64)},
+            "individual_reports": {m: f"{m} report " * 200 for m in methods},
+            "integrated_report": "integrated report " * 400,
+            "ai_model_used": "gemini-2.5-flash",
+        }
+
+    return {
+        "batch_create": ("POST", batch_body),
+        "list": ("GET", lambda rng: (f"/readings/?limit=20&offset={rng.randint(0, 5) * 20}", None)),
+        "details": ("GET", lambda rng: (f"/readings/{rng.choice(reading_ids)}/details", None)),
+        "favorites": ("GET", lambda rng: ("/readings/favorites/list?limit=20", None)),
+        "summary": ("GET", lambda rng: ("/batch/summary", None)),
+        "search": ("GET", lambda rng: (f"/personas/search?fuzzy=true&name={rng.choice(persona_names)[:2]}", None)),
+    }
+
+
+def load_targets() -> Tuple[List[int], List[str]]:
+    """读取测试用户的报告ID与Persona名称，作为请求参数的取值范围"""
+    from database import SessionLocal
+    from models import Reading, Persona
+    from constants import TEST_USER_ID
+
+    db = SessionLocal()
+    try:
+        reading_ids = [r.id for r in db.query(Reading.id).filter(Reading.user_id == TEST_USER_ID).all()]
+        persona_names = [p.display_name for p in db.query(Persona.display_name).filter(Persona.user_id == TEST_USER_ID).all()]
+    finally:
+        db.close()
+    if not reading_ids or not persona_names:
+        raise SystemExit("❌ 测试用户没有数据，请先运行 python -m benchmarks.seed_data")
+    return reading_ids, persona_names
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    http_method: str,
+    factory: RequestFactory,
+    requests: int,
+    concurrency: int,
+    seed: int,
+) -> Dict[str, object]:
+    rng = random.Random(seed)
+    planned = [factory(rng) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = rate_limited = overloaded = 0
+    queue = iter(planned)
+
+    async def worker():
+        nonlocal errors, rate_limited, overloaded
+        for path, body in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.request(http_method, path, json=body)
+                if response.status_code == 429:
+                    rate_limited += 1
+                elif response.status_code == 503:
+                    overloaded += 1
+                elif response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - wall_start, rate_limited, overloaded)
+
+
+async def run(scenario_names: List[str], requests: int, concurrency: int, warmup: int, seed: int) -> Dict[str, Dict]:
+    from main import app
+
+    reading_ids, persona_names = load_targets()
+    scenarios = build_scenarios(reading_ids, persona_names)
+    unknown = [name for name in scenario_names if name not in scenarios]
+    if unknown:
+        raise SystemExit(f"❌ 未知场景: {unknown}，可选: {list(scenarios)}")
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in scenario_names:
+                http_method, factory = scenarios[name]
+                if warmup:
+                    await run_scenario(client, http_method, factory, warmup, concurrency, seed + 1)
+                results[name] = await run_scenario(client, http_method, factory, requests, concurrency, seed)
+                print(f"   ✅ {name}: p95={results[name]['p95_ms']}ms rps={results[name]['throughput_rps']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 进程内负载测试")
+    parser.add_argument("--scenarios", default="list,details,favorites,summary,search,batch_create")
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="每个场景的预热请求数（不计入结果）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    scenario_names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    print(f"🚀 运行场景 {scenario_names}，每个 {args.requests} 次请求，并发 {args.concurrency}")
+    results = asyncio.run(run(scenario_names, args.requests, args.concurrency, args.warmup, args.seed))
+
+    print()
+    print(format_table(results))
+
+    if args.output:
+        from config import settings
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        meta = build_meta(
+            concurrency=args.concurrency,
+            requests=args.requests,
+            seed=args.seed,
+            database_url=settings.database_url.split("@")[-1],
+        )
+        save_results(args.output, meta, results)
+        print(f"\n📄 结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
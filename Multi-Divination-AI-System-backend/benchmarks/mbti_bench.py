@@ -0,0 +1,71 @@
+# benchmarks/mbti_bench.py - MBTI 计分：逐份纯 Python vs 答案矩阵 × 权重表
+"""
+随机生成答卷（每题随机作答或跳过），分别用逐份纯 Python 循环和 score_matrix（一次矩阵乘法）计分，
+并校验两者的类型与置信度一致。纯 Python 只跑 --python-sample 份，再按吞吐量折算总耗时。
+
+    python -m benchmarks.mbti_bench --submissions 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.mbti import DIMENSIONS, MBTI_TYPES, PRIOR_WEIGHT, QUESTION_IDS, QUESTIONS, score_matrix
+
+
+def score_python(row):
+    """逐题累加的参考实现"""
+    raw = dict.fromkeys(DIMENSIONS, 0.0)
+    capacity = dict.fromkeys(DIMENSIONS, 0.0)
+    for qid, value in zip(QUESTION_IDS, row):
+        if value != value:  # NaN：未作答
+            continue
+        for dim, weight in QUESTIONS[qid]["weights"].items():
+            raw[dim] += value * weight
+            capacity[dim] += abs(weight)
+    scores = [raw[dim] / (capacity[dim] + PRIOR_WEIGHT) for dim in DIMENSIONS]
+    mbti_type = "".join(dim[0] if score >= 0 else dim[1] for dim, score in zip(DIMENSIONS, scores))
+    confidence = min(max(round(sum(abs(score) for score in scores) / len(scores) * 100), 1), 100)
+    return mbti_type, confidence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MBTI 批量计分基准")
+    parser.add_argument("--submissions", type=int, default=1_000_000)
+    parser.add_argument("--python-sample", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    answers = rng.choice([-1.0, -0.5, 0.0, 0.5, 1.0, np.nan], size=(args.submissions, len(QUESTION_IDS)))
+
+    start = time.perf_counter()
+    result = score_matrix(answers)
+    vectorized = time.perf_counter() - start
+
+    sample = answers[:args.python_sample].tolist()
+    start = time.perf_counter()
+    expected = [score_python(row) for row in sample]
+    scalar = time.perf_counter() - start
+    scalar_total = scalar / len(sample) * args.submissions
+
+    types = result["types"][:len(expected)].tolist()
+    confidence = result["confidence"][:len(expected)].tolist()
+    if [(t, int(c)) for t, c in zip(types, confidence)] != expected:
+        raise SystemExit("矩阵计分结果与逐份计分不一致")
+
+    values, counts = np.unique(result["types"], return_counts=True)
+    print(f"答卷数: {args.submissions:,}，题数: {len(QUESTION_IDS)}")
+    print(f"{'mode':<12}{'seconds':>12}{'subs/s':>16}")
+    print(f"{'numpy':<12}{vectorized:>12.3f}{args.submissions / vectorized:>16,.0f}")
+    print(f"{'python':<12}{scalar_total:>12.3f}{len(sample) / scalar:>16,.0f}  (按 {len(sample):,} 份抽样折算)")
+    print(f"加速比: {scalar_total / vectorized:.1f}x，抽样结果一致")
+    print(f"类型覆盖: {len(values)}/{len(MBTI_TYPES)}，平均置信度 {result['confidence'].mean():.1f}")
+
+
+if __name__ == "__main__":
+    main()
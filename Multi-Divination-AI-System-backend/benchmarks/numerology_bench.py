@@ -0,0 +1,62 @@
+# benchmarks/numerology_bench.py - 生命灵数计算：逐个纯 Python vs NumPy 向量化批量
+"""
+随机生成 1900-2030 年间的出生日期，分别用逐个计算（numerology_profile 的算法）和
+NumPy 向量化批量计算（life_path_numbers，按 chunk 分块以控制内存）计算生命灵数，
+并在抽样上校验两者结果一致。纯 Python 只跑 --python-sample 条，再按吞吐量折算总耗时。
+
+    python -m benchmarks.numerology_bench --dates 10000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.numerology import life_path_number, life_path_numbers
+
+START = np.datetime64("1900-01-01")
+DAYS = int((np.datetime64("2030-12-31") - START).astype(np.int64))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生命灵数批量计算基准")
+    parser.add_argument("--dates", type=int, default=10_000_000)
+    parser.add_argument("--chunk", type=int, default=1_000_000, help="向量化计算每块的日期数")
+    parser.add_argument("--python-sample", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    dates = START + rng.integers(0, DAYS, size=args.dates).astype("timedelta64[D]")
+
+    # 向量化
+    start = time.perf_counter()
+    results = np.empty(args.dates, dtype=np.int64)
+    for offset in range(0, args.dates, args.chunk):
+        results[offset:offset + args.chunk] = life_path_numbers(dates[offset:offset + args.chunk])
+    vectorized = time.perf_counter() - start
+
+    # 逐个计算（抽样）
+    sample = dates[:args.python_sample].astype(object)
+    start = time.perf_counter()
+    expected = [life_path_number(value) for value in sample]
+    scalar = time.perf_counter() - start
+    scalar_total = scalar / len(sample) * args.dates
+
+    if not np.array_equal(results[:len(expected)], np.array(expected)):
+        raise SystemExit("向量化结果与逐个计算不一致")
+
+    values, counts = np.unique(results, return_counts=True)
+    print(f"日期数: {args.dates:,}（chunk {args.chunk:,}）")
+    print(f"{'mode':<12}{'seconds':>12}{'dates/s':>16}")
+    print(f"{'numpy':<12}{vectorized:>12.3f}{args.dates / vectorized:>16,.0f}")
+    print(f"{'python':<12}{scalar_total:>12.3f}{len(sample) / scalar:>16,.0f}  (按 {len(sample):,} 条抽样折算)")
+    print(f"加速比: {scalar_total / vectorized:.1f}x，抽样结果一致")
+    print("分布: " + ", ".join(f"{value}:{count / args.dates:.1%}" for value, count in zip(values, counts)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/results.py - 基准测试结果格式与跨提交对比
+"""
+结果文件为 JSON：
+    {
+      "meta": {"git_commit": ..., "timestamp": ..., "concurrency": ..., ...},
+      "scenarios": {
+        "<场景名>": {"requests": N, "errors": E, "rate_limited": R, "overloaded": O,
+                     "p50_ms": ..., "p95_ms": ..., "p99_ms": ...,
+                     "mean_ms": ..., "max_ms": ..., "throughput_rps": ...}
+      }
+    }
+
+errors 不含 429（限流，rate_limited）和 503（准入控制排队超时，overloaded）；
+这两类是被拒绝而没有执行的请求，其延迟与吞吐不代表接口本身的性能，单独计数。
+
+对比两次结果:
+    python -m benchmarks.results base.json head.json
+"""
+import json
+import math
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+COMPARED_FIELDS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法百分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(
+    latencies: List[float],
+    errors: int,
+    wall_time: float,
+    rate_limited: int = 0,
+    overloaded: int = 0
+) -> Dict[str, Any]:
+    """把一个场景的延迟样本（秒）汇总成结果字典"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": errors,
+        "rate_limited": rate_limited,
+        "overloaded": overloaded,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else 0.0,
+        "max_ms": round(values[-1] * 1000, 3) if count else 0.0,
+        "throughput_rps": round(count / wall_time, 2) if wall_time > 0 else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def build_meta(**extra) -> Dict[str, Any]:
+    meta = {
+        "git_commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    meta.update(extra)
+    return meta
+
+
+def save_results(path: str, meta: Dict[str, Any], scenarios: Dict[str, Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "scenarios": scenarios}, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_table(scenarios: Dict[str, Dict[str, Any]]) -> str:
+    header = (
+        f"{'scenario':<16}{'reqs':>8}{'errs':>6}{'429':>6}{'503':>6}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for name, r in scenarios.items():
+        lines.append(
+            f"{name:<16}{r['requests']:>8}{r['errors']:>6}{r.get('rate_limited', 0):>6}{r.get('overloaded', 0):>6}"
+            f"{r['p50_ms']:>10.2f}"
+            f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput_rps']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any]) -> str:
+    """逐场景对比两次结果，延迟下降/吞吐上升为改善"""
+    lines = [
+        f"base: {base['meta'].get('git_commit')}  head: {head['meta'].get('git_commit')}",
+        f"{'scenario':<16}{'metric':<16}{'base':>12}{'head':>12}{'change':>10}",
+    ]
+    for name, head_result in head["scenarios"].items():
+        base_result = base["scenarios"].get(name)
+        if base_result is None:
+            lines.append(f"{name:<16}(base 中没有该场景)")
+            continue
+        for field in COMPARED_FIELDS:
+            before, after = base_result[field], head_result[field]
+            change = (after - before) / before * 100 if before else 0.0
+            lines.append(f"{name:<16}{field:<16}{before:>12.2f}{after:>12.2f}{change:>+9.1f}%")
+        rejected = {
+            label: (base_result.get(field, 0), head_result.get(field, 0))
+            for label, field in (("429", "rate_limited"), ("503", "overloaded"))
+        }
+        if any(before or after for before, after in rejected.values()):
+            # 有请求被拒绝时延迟和吞吐不可比，显式标出
+            lines.append(f"{name:<16}⚠️  被拒绝的请求 " + "  ".join(
+                f"{label}: {before} -> {after}" for label, (before, after) in rejected.items()
+            ))
+    return "\n".join(lines)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("用法: python -m benchmarks.results <base.json> <head.json>")
+        raise SystemExit(2)
+    print(compare(load_results(sys.argv[1]), load_results(sys.argv[2])))
+
+
+if __name__ == "__main__":
+    main()
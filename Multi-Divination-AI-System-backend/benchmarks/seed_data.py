@@ -0,0 +1,232 @@
+# benchmarks/seed_data.py - 可复现的基准测试数据生成器
+"""
+在 init_testuser.py 的基础上，为基准测试生成固定种子的数据集：
+N 个用户、每个用户若干 Persona、每个 Persona 若干次批量占卜（含综合报告及 ReadingSource 关联）。
+
+测试用户（TEST_USER_ID）同样会被填充数据，因为当前接口都以该用户身份访问。
+
+用法（在后端根目录运行）:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed_data --users 20 --personas 5 --batches 10 --seed 42
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 各占卜方法报告长度（字符数）的对数正态分布参数：(中位数, sigma)
+OUTPUT_LENGTH_PROFILE: Dict[str, tuple] = {
+    "LifePathNumber": (1800, 0.35),
+    "Palmistry": (2200, 0.40),
+    "Astrology": (2800, 0.40),
+    "MBTI": (2000, 0.35),
+    "Tarot": (2500, 0.45),
+    "Integrated": (5000, 0.35),
+}
+
+INDIVIDUAL_METHODS = ["LifePathNumber", "Palmistry", "Astrology", "MBTI", "Tarot"]
+
+FAVORITE_RATIO = 0.15
+RATING_RATIO = 0.30
+INTEGRATED_RATIO = 0.7  # 多方法批量中生成综合报告的比例
+
+QUESTIONS = [
+    "我今年的事业发展会怎样？",
+    "我和伴侣的感情未来如何？",
+    "What should I focus on this year?",
+    "我应该换工作吗？",
+    "How can I improve my relationships?",
+    "我的财运在下半年会有变化吗？",
+    "What are my hidden strengths?",
+    "我适合出国深造吗？",
+]
+
+NAME_SYLLABLES = ["An", "Bo", "Chen", "Li", "Mei", "Xu", "Yun", "Zhi", "Lan", "Hao", "Ning", "Qi"]
+
+TEXT_FRAGMENTS = [
+    "星象显示你正处在一个转变的阶段，",
+    "The cards suggest a period of reflection and renewal. ",
+    "你的生命数字体现出坚韧与创造力，",
+    "Your palm lines indicate a strong sense of intuition. ",
+    "在人际关系方面需要更多的耐心与沟通，",
+    "This is a favorable time to pursue long-term goals. ",
+    "内在的力量将帮助你度过眼前的挑战。",
+    "Trust the process and stay open to new opportunities. ",
+]
+
+TAROT_CARDS = ["The Fool", "The Magician", "The High Priestess", "The Empress", "The Lovers",
+               "The Chariot", "Strength", "The Hermit", "Wheel of Fortune", "Justice",
+               "The Star", "The Moon", "The Sun", "The World"]
+MBTI_TYPES = ["INTJ", "INTP", "ENTJ", "ENTP", "INFJ", "INFP", "ENFJ", "ENFP",
+              "ISTJ", "ISFJ", "ESTJ", "ESFJ", "ISTP", "ISFP", "ESTP", "ESFP"]
+
+
+def make_text(rng: random.Random, method: str) -> str:
+    """按方法的长度分布生成报告文本"""
+    median, sigma = OUTPUT_LENGTH_PROFILE[method]
+    target = max(200, int(rng.lognormvariate(0, sigma) * median))
+    parts, length = [], 0
+    while length < target:
+        fragment = rng.choice(TEXT_FRAGMENTS)
+        parts.append(fragment)
+        length += len(fragment)
+    return "".join(parts)[:target]
+
+
+def make_input_data(rng: random.Random, method: str, birth_date: datetime) -> Dict:
+    """生成与 BatchService._extract_method_input_data 结构一致的输入数据"""
+    data: Dict = {}
+    if method == "LifePathNumber":
+        data["birth_date"] = birth_date.strftime("%Y-%m-%d")
+    elif method == "Palmistry":
+        data["hand_type"] = rng.choice(["left", "right"])
+    elif method == "Astrology":
+        data.update({
+            "birth_date": birth_date.strftime("%Y-%m-%d"),
+            "birth_time": f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+            "birth_location": rng.choice(["Beijing", "Shanghai", "Taipei", "New York", "London"]),
+        })
+    elif method == "MBTI":
+        data["mbti_type"] = rng.choice(MBTI_TYPES)
+    elif method == "Tarot":
+        data.update({
+            "spread_type": rng.choice(["three_card", "single", "celtic_cross"]),
+            "selected_cards": rng.sample(TAROT_CARDS, 3),
+        })
+    data["created_via"] = "batch_creation"
+    return data
+
+
+def seed_user(db, rng: random.Random, user_id: int, personas: int, batches: int, now: datetime) -> int:
+    """为单个用户生成 Persona 和占卜记录，返回生成的报告数量"""
+    from models import Persona, Reading, ReadingSource, DivinationMethod, ReadingStatus
+    from services.input_fields import indexed_fields
+
+    reading_count = 0
+    for p in range(personas):
+        name = "".join(rng.sample(NAME_SYLLABLES, 2)) + f"_{user_id}_{p}"
+        birth_date = datetime(1960, 1, 1) + timedelta(days=rng.randint(0, 365 * 45))
+        persona = Persona(
+            user_id=user_id,
+            display_name=name,
+            description="基准测试数据",
+            birth_date=birth_date,
+            created_at=now - timedelta(days=rng.randint(0, 365)),
+        )
+        db.add(persona)
+        db.flush()
+
+        for _ in range(batches):
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            question = rng.choice(QUESTIONS)
+            methods = rng.sample(INDIVIDUAL_METHODS, rng.randint(1, len(INDIVIDUAL_METHODS)))
+
+            sources: List[Reading] = []
+            for method in methods:
+                input_data = make_input_data(rng, method, birth_date)
+                reading = Reading(
+                    user_id=user_id,
+                    persona_id=persona.id,
+                    method=DivinationMethod(method),
+                    main_question=question,
+                    output_text=make_text(rng, method),
+                    input_data=input_data,
+                    **indexed_fields(input_data),
+                    status=ReadingStatus.COMPLETED,
+                    ai_model_used="gemini-2.5-flash",
+                    processing_time=rng.randint(5, 40),
+                    is_favorite=rng.random() < FAVORITE_RATIO,
+                    user_rating=rng.randint(1, 5) if rng.random() < RATING_RATIO else None,
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+                db.add(reading)
+                sources.append(reading)
+
+            if len(sources) > 1 and rng.random() < INTEGRATED_RATIO:
+                integrated = Reading(
+                    user_id=user_id,
+                    persona_id=persona.id,
+                    method=DivinationMethod.INTEGRATED,
+                    main_question=question,
+                    output_text=make_text(rng, "Integrated"),
+                    input_data={"source_methods": methods, "total_individual_reports": len(methods)},
+                    status=ReadingStatus.COMPLETED,
+                    ai_model_used="gemini-2.5-flash",
+                    is_favorite=rng.random() < FAVORITE_RATIO,
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+                db.add(integrated)
+                db.flush()
+                for source in sources:
+                    db.add(ReadingSource(integrated_reading_id=integrated.id, source_reading_id=source.id, weight=1))
+                reading_count += 1
+
+            reading_count += len(sources)
+    return reading_count
+
+
+def seed(users: int, personas: int, batches: int, seed_value: int) -> Dict[str, int]:
+    """生成完整数据集；同样的参数和种子总是生成同样的数据"""
+    from init_testuser import create_database_tables, create_test_user
+    from database import SessionLocal
+    from models import User, AuthProvider, UserRole
+
+    if not create_database_tables():
+        raise SystemExit(1)
+    test_user_id = create_test_user()
+    if test_user_id is None:
+        raise SystemExit(1)
+
+    rng = random.Random(seed_value)
+    now = datetime(2025, 1, 1)
+    db = SessionLocal()
+    totals = {"users": 0, "personas": 0, "readings": 0}
+    try:
+        user_ids = [test_user_id]
+        for i in range(users - 1):
+            user = User(
+                username=f"bench_user_{seed_value}_{i}",
+                display_name=f"基准用户{i}",
+                auth_provider=AuthProvider.GUEST,
+                role=UserRole.FREE,
+            )
+            db.add(user)
+            db.flush()
+            user_ids.append(user.id)
+
+        for user_id in user_ids:
+            totals["readings"] += seed_user(db, rng, user_id, personas, batches, now)
+            totals["personas"] += personas
+            totals["users"] += 1
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成基准测试数据集")
+    parser.add_argument("--users", type=int, default=10, help="用户数量（包含测试用户）")
+    parser.add_argument("--personas", type=int, default=5, help="每个用户的Persona数量")
+    parser.add_argument("--batches", type=int, default=10, help="每个Persona的批量占卜次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = seed(args.users, args.personas, args.batches, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"✅ 数据生成完成: {totals['users']} 用户, {totals['personas']} Persona, "
+          f"{totals['readings']} 报告, 用时 {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/streaming_bench.py - 阻塞生成 vs SSE 流式生成的首字节时间（TTFB）对比
+"""
+httpx.ASGITransport 会缓冲完整响应，无法测量首字节时间，因此这里用 uvicorn 在本机端口上
+分别启动假模型服务和 API，经真实 HTTP 连接测量：
+
+- blocking: POST /generation/readings        —— 全部报告生成并保存后才返回
+- stream:   POST /generation/readings/stream —— 先推送 start 事件（报告已以 processing 状态保存），
+            第一个文本片段到达即推送 token 事件；stream_token 为用户看到第一段报告内容的时间
+
+    python -m benchmarks.streaming_bench --latency 2.0 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+
+from benchmarks.results import format_table, summarize
+
+METHODS = ["LifePathNumber", "Palmistry", "Astrology", "MBTI", "Tarot"]
+INPUT_DATA = {"birth_date": "1990-05-17", "birth_time": "08:30", "birth_location": "Taipei", "mbti_type": "INFJ"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def measure(client: httpx.AsyncClient, path: str, body: dict):
+    """返回 (首字节时间, 首个报告内容时间, 总时间)，单位秒"""
+    start = time.perf_counter()
+    ttfb = first_token = None
+    async with client.stream("POST", path, json=body) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            now = time.perf_counter() - start
+            if ttfb is None and chunk:
+                ttfb = now
+            if first_token is None and (b"event: token" in chunk or not path.endswith("/stream")):
+                first_token = now
+    return ttfb, first_token, time.perf_counter() - start
+
+
+async def run(api_url: str, rounds: int):
+    results = {name: [] for name in (
+        "blocking_ttfb", "blocking_total", "stream_ttfb", "stream_token", "stream_total"
+    )}
+    async with httpx.AsyncClient(base_url=api_url, timeout=120) as client:
+        for index in range(rounds):
+            # 每轮使用不同问题并跳过缓存，确保两种方式都真正调用模型
+            body = {
+                "user_name": "Bench",
+                "primary_question": f"What should I focus on this year? #{index}",
+                "selected_methods": METHODS,
+                "input_data": INPUT_DATA,
+                "use_cache": False,
+            }
+            ttfb, _, total = await measure(client, "/generation/readings", body)
+            results["blocking_ttfb"].append(ttfb)
+            results["blocking_total"].append(total)
+
+            ttfb, first_token, total = await measure(client, "/generation/readings/stream", body)
+            results["stream_ttfb"].append(ttfb)
+            results["stream_token"].append(first_token)
+            results["stream_total"].append(total)
+
+    return {name: summarize(samples, 0, sum(samples)) for name, samples in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE 流式生成首字节时间基准")
+    parser.add_argument("--latency", type=float, default=2.0, help="假模型单次调用的完整生成时间（秒）")
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # 必须在导入应用之前设置：临时数据库 + 指向假模型服务
+    model_port, api_port = free_port(), free_port()
+    db_dir = tempfile.mkdtemp(prefix="streaming_bench_")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(db_dir, 'bench.db')}")
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{model_port}"
+    os.environ["GEMINI_API_KEY"] = "fake"
+    os.environ["AUTH_REQUIRED"] = "false"  # 请求不带访问令牌，按测试用户处理
+
+    from benchmarks.fake_model_server import FakeModelConfig, create_app
+    import main as api
+
+    servers = [
+        serve_in_thread(create_app(FakeModelConfig(latency=args.latency, tokens=args.tokens)), model_port),
+        serve_in_thread(api.app, api_port),
+    ]
+    try:
+        print(format_table(asyncio.run(run(f"http://127.0.0.1:{api_port}", args.rounds))))
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/upload_bench.py - 手相图片上传：每次上传的内存占用（流式 multipart vs JSON 内嵌 base64）
+"""
+生成一张大尺寸 JPEG，然后在当前进程中分别测量两种上传方式服务端处理一次上传的 Python 堆内存峰值（tracemalloc）：
+
+- stream: receive_upload 按 64 KB 分块解析 multipart 请求体并写入 blob 存储（含进程池生成派生图）
+- base64_json: 读取整个 JSON 请求体、json.loads、base64 解码（原来 input_data.palm_image_data 的方式，
+  尚未计入之后把图片随报告写入数据库的开销）
+
+耗时单独测量（tracemalloc 开启时明显变慢）。Pillow 解码在图片处理进程中进行，不计入上面的峰值，
+处理进程的峰值 RSS（/proc/self/status 的 VmHWM）单独列出。
+
+    python -m benchmarks.upload_bench --width 4000 --height 3000 --rounds 5
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+CHUNK_SIZE = 64 * 1024
+BOUNDARY = "benchboundary7d93"
+
+
+class FileRequest:
+    """只提供 receive_upload 需要的 headers 和 stream()，请求体从磁盘分块读取"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+    async def stream(self):
+        with open(self.path, "rb") as file:
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def make_image(width: int, height: int, seed: int) -> bytes:
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    # 平滑渐变叠加噪声，接近照片的压缩率
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None] * np.ones((height, 1, 3), np.float32)
+    pixels = np.clip(gradient + rng.normal(0, 24, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def write_multipart(path: str, image: bytes):
+    with open(path, "wb") as file:
+        file.write(
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"hand_type\"\r\n\r\nleft\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"palm.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n".encode()
+        )
+        file.write(image)
+        file.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+
+
+def measure(func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def worker_peak_rss() -> float:
+    """图片处理进程的峰值 RSS（MB）"""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片上传内存基准")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="upload_bench_")
+    os.environ["BLOB_DIR"] = os.path.join(workdir, "blobs")
+    os.environ["IMAGE_WORKERS"] = "1"
+    from services.palm_images import get_image_pool, receive_upload, shutdown_image_pool
+
+    rows = []
+    for round_index in range(args.rounds):
+        image = make_image(args.width, args.height, round_index)
+        body_path = os.path.join(workdir, "body.bin")
+        write_multipart(body_path, image)
+        json_body = json.dumps({"input_data": {"palm_image_data": base64.b64encode(image).decode()}}).encode()
+        del image
+
+        upload, stream_peak, stream_time = measure(lambda: asyncio.run(receive_upload(FileRequest(body_path))))
+
+        def decode_json():
+            body = bytes(json_body)  # 相当于 await request.body()
+            data = json.loads(body)
+            return len(base64.b64decode(data["input_data"]["palm_image_data"]))
+
+        _, json_peak, json_time = measure(decode_json)
+        rows.append((upload["size"], stream_peak, stream_time, json_peak, json_time))
+
+    worker_rss = get_image_pool().submit(worker_peak_rss).result()
+    shutdown_image_pool()
+
+    mb = 1024 * 1024
+    print(f"图片 {args.width}x{args.height}，{args.rounds} 次上传，平均大小 {np.mean([r[0] for r in rows]) / mb:.1f} MB")
+    print(f"{'mode':<14}{'peak MB':>10}{'peak/size':>12}{'seconds':>10}")
+    for label, peak_index, time_index in (("stream", 1, 2), ("base64_json", 3, 4)):
+        peak = np.mean([r[peak_index] for r in rows])
+        ratio = np.mean([r[peak_index] / r[0] for r in rows])
+        print(f"{label:<14}{peak / mb:>10.2f}{ratio:>12.2f}{np.mean([r[time_index] for r in rows]):>10.3f}")
+    print(f"图片处理进程峰值 RSS: {worker_rss:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
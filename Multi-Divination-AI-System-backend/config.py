@@ -38,6 +38,9 @@ from pydantic_settings import BaseSettings
 from typing import List
 import os
 
+# 仅供本地开发的签名密钥；需要认证时使用该密钥会拒绝启动（任何人都能伪造令牌）
+DEFAULT_SECRET_KEY = "fallback-development-secret"
+
 class Settings(BaseSettings):
     # 应用基础设置
     app_name: str = "多元占卜AI系统后端"
@@ -58,14 +61,107 @@ class Settings(BaseSettings):
     # Cloud SQL 连接名称（用于 Unix 套接字）
     cloud_sql_connection_name: str = ""
     
-    # Gemini AI API设置 (暂时不用，但保留配置)
+    # Gemini AI API设置
     gemini_api_key: str = ""
+    gemini_base_url: str = "https://generativelanguage.googleapis.com"  # 测试时可指向本地假模型服务
+    generation_max_concurrency: int = 5   # 单次批量生成的最大并发模型调用数
+    generation_timeout: float = 60.0      # 单次模型调用超时（秒）
+    
+    # 综合报告提示词中源报告的 token 预算（超出时抽取式压缩，整体另受 GEMINI_CONFIG["MAX_TOKENS"] 限制）
+    integrated_source_token_budget: int = 3000
+    
+    # 生成结果缓存（相同提示词直接复用已生成的报告）
+    generation_cache_enabled: bool = True
+    generation_cache_ttl: int = 7 * 24 * 3600             # 缓存有效期（秒）
+    generation_cache_max_bytes: int = 32 * 1024 * 1024    # 进程内缓存容量上限（字节）
+    generation_cache_persistent: bool = True              # 是否同时写入数据库（跨进程/重启共享）
+    
+    # 模型调用容错（重试、对冲请求、熔断；并发上限见 GEMINI_CONFIG["MAX_CONCURRENT_REQUESTS"]）
+    generation_resilience_enabled: bool = True
+    generation_max_retries: int = 2                   # 失败后的最大重试次数
+    generation_retry_base_delay: float = 0.5          # 指数退避基准（秒），实际等待为 [0, base * 2^n] 内的随机值
+    generation_retry_max_delay: float = 8.0
+    generation_hedge_enabled: bool = True             # 超过近期 p95 延迟仍未返回时发出第二个相同请求
+    generation_hedge_initial_delay: float = 10.0      # 样本不足时使用的对冲延迟（秒）
+    generation_hedge_min_delay: float = 0.5
+    generation_circuit_failure_threshold: int = 5     # 连续失败次数达到后熔断
+    generation_circuit_reset_timeout: float = 30.0    # 熔断后多久允许一次试探请求（秒）
+    
+    # 相同的生成/批量保存请求在进行中时合并为一次执行
+    request_coalescing_enabled: bool = True
+    
+    # 本地占卜计算引擎
+    ephemeris_dir: str = "data"  # 预计算星历表目录（不存在时首次使用自动生成）
+    
+    # 手相图片上传（内容寻址的本地文件存储，报告只保存引用）
+    blob_dir: str = "data/blobs"
+    palm_upload_max_bytes: int = 15 * 1024 * 1024
+    palm_upload_max_pixels: int = 50_000_000  # 超过时拒绝（防解压炸弹）
+    image_workers: int = 2                    # 缩略图/裁剪图处理进程数
+    
+    # 聊天
+    chat_context_max_tokens: int = 4000  # 构建模型上下文时取最近多少 token 的消息
+    chat_report_token_budget: int = 1500  # 系统指令中关联报告摘要的 token 预算
+    chat_context_cache_ttl: int = 600     # 会话上下文在进程内缓存的时间（秒）
+    chat_context_cache_max_sessions: int = 1000
+    
+    # 聊天上下文压缩：未汇总的消息超过阈值后，窗口之外的旧消息由后台任务汇总进会话摘要
+    chat_compaction_enabled: bool = True
+    chat_compaction_threshold_tokens: int = 8000  # 检查点之后的 token 数超过该值时触发
+    chat_compaction_batch_tokens: int = 6000      # 每次汇总的消息 token 上限（超出时分多步推进检查点）
+    chat_summary_max_tokens: int = 800
+    chat_compaction_sweep_interval: float = 300.0  # 扫描数据库中待压缩会话的间隔（秒）
+    
+    # 占卜次数额度（订阅的 monthly_reading_limit）；每个 worker 向数据库预占一小批额度，在进程内扣减
+    quota_enabled: bool = True
+    quota_lease_size: int = 5              # 每次预占的次数（剩余不足时按实际需要预占）
+    quota_reconcile_interval: float = 30.0  # 对账间隔（秒）：归还未用完的预占额度并重新读取订阅
+    
+    # 限流（GCRA，按客户端 + 路由类别，每个 worker 单独计数）；请求数/分钟 与 突发上限
+    rate_limit_enabled: bool = True
+    rate_limit_generation_per_minute: float = 20   # 模型生成、批量保存、图片上传、聊天连接
+    rate_limit_generation_burst: int = 5
+    rate_limit_write_per_minute: float = 120
+    rate_limit_write_burst: int = 60
+    rate_limit_read_per_minute: float = 600
+    rate_limit_read_burst: int = 100
+    rate_limit_trust_forwarded_for: bool = False   # 部署在反向代理（如 Cloud Run）后时按 X-Forwarded-For 识别客户端
+    rate_limit_max_clients: int = 100_000          # 进程内最多跟踪的客户端数
+    
+    # 准入控制：并发处理数达到上限后请求排队，排队超过目标时间或队列已满时返回 503
+    admission_enabled: bool = True
+    admission_generation_concurrency: int = 16
+    admission_default_concurrency: int = 32        # 低于线程池大小（40），给同步路由留出余量
+    admission_max_queue: int = 100
+    admission_queue_target_ms: float = 500.0
     
     # 认证设置
-    secret_key: str = "fallback-development-secret"
+    secret_key: str = DEFAULT_SECRET_KEY  # 通过 SECRET_KEY 设置
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60 * 24
+    auth_required: bool = True           # 仅本地开发可设为 False：没有令牌的请求按测试用户处理
+    auth_token_cache_size: int = 10000   # 进程内缓存的已验证令牌数，条目在令牌过期时失效
+    auth_user_cache_ttl: float = 60.0    # 用户状态缓存时间（秒），停用用户最迟在该时间后被拒绝
+    auth_user_cache_size: int = 10000
     
+    # 写回缓冲设置（收藏/评分等高频交互更新合并后批量落库）
+    write_behind_enabled: bool = False
+    write_behind_flush_interval: float = 1.0  # 刷新间隔（秒）
+    write_behind_max_pending: int = 10000     # 超过后直接同步写入
+
+    # SQL统计与慢查询日志
+    sql_instrumentation_enabled: bool = True
+    slow_query_threshold_ms: float = 200.0  # 数据库耗时超过该值时记录慢查询日志
+    slow_query_top_n: int = 3                # 日志中保留的最慢语句条数
+
+    # Prometheus 指标（多进程模式通过 PROMETHEUS_MULTIPROC_DIR 环境变量开启）
+    metrics_enabled: bool = True
+
+    # 性能分析（默认关闭；开启后需通过 X-Admin-Token 访问 /admin/profile）
+    profiling_enabled: bool = False
+    admin_token: str = ""
+    profiling_request_paths: List[str] = ["/batch/readings", "/readings/", "/personas/"]
+
     # CORS设置 - 生产环境需要更新
     allowed_origins: List[str] = [
         "http://localhost:3000",
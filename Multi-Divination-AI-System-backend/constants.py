@@ -6,7 +6,6 @@ TEST_USERNAME = "testuser"
 
 # ===== AI相关常量 =====
 DEFAULT_AI_MODEL = "gemini-2.5-flash"  # 使用 Gemini Flash 2.5
-DEFAULT_CONFIDENCE_SCORE = 85
 DEFAULT_PROCESSING_TIME = 30  # 默认处理时间（秒）
 
 # Gemini Flash 2.5 特定配置
@@ -16,7 +15,24 @@ GEMINI_CONFIG = {
     "TEMPERATURE": 0.7,              # 创造性参数
     "TOP_P": 0.9,                    # 采样参数
     "TOP_K": 40,                     # 候选词数量
-    "SAFETY_THRESHOLD": "BLOCK_MEDIUM_AND_ABOVE"  # 安全过滤级别
+    "SAFETY_THRESHOLD": "BLOCK_MEDIUM_AND_ABOVE",  # 安全过滤级别
+    "MAX_CONCURRENT_REQUESTS": 10    # 每个进程同时进行的模型请求上限
+}
+
+# 模型价格（美元 / 百万 token），用于估算生成成本
+MODEL_PRICING = {
+    "gemini-2.5-flash": {"INPUT_PER_MILLION": 0.30, "OUTPUT_PER_MILLION": 2.50},
+    "gemini-2.5-pro": {"INPUT_PER_MILLION": 1.25, "OUTPUT_PER_MILLION": 10.00},
+}
+
+# 各方法回复的预估 token 数（对应提示词中要求的字数）
+EXPECTED_OUTPUT_TOKENS = {
+    "LifePathNumber": 450,
+    "Palmistry": 450,
+    "Astrology": 450,
+    "MBTI": 450,
+    "Tarot": 380,
+    "Integrated": 600
 }
 
 # ===== 业务规则常量 =====
@@ -51,12 +67,14 @@ SUCCESS_MESSAGES = {
     "READING_CREATED": "报告创建成功",
     "READING_UPDATED": "报告更新成功",
     "READING_DELETED": "报告删除成功",
-    "BATCH_DELETE_SUCCESS": "批量删除成功"
+    "BATCH_DELETE_SUCCESS": "批量删除成功",
+    "BATCH_UPDATE_SUCCESS": "批量更新成功"
 }
 
 ERROR_MESSAGES = {
     "PERSONA_NOT_FOUND": "角色档案未找到",
     "READING_NOT_FOUND": "报告未找到",
+    "READING_FILTERED_OUT": "报告不符合筛选条件",
     "USER_NOT_FOUND": "用户不存在",
     "INVALID_METHOD": "无效的占卜方法",
     "INSUFFICIENT_DATA": "输入数据不足",
@@ -66,7 +84,10 @@ ERROR_MESSAGES = {
     "DATABASE_ERROR": "数据库操作失败",
     "PERMISSION_DENIED": "权限不足",
     "INVALID_RATING": f"评分必须在 {MIN_USER_RATING} 到 {MAX_USER_RATING} 之间",
-    "INVALID_PAGE_SIZE": f"分页大小必须在 {MIN_PAGE_SIZE} 到 {MAX_PAGE_SIZE} 之间"
+    "INVALID_PAGE_SIZE": f"分页大小必须在 {MIN_PAGE_SIZE} 到 {MAX_PAGE_SIZE} 之间",
+    "BULK_TARGET_REQUIRED": "请提供报告ID列表或过滤条件（persona_id / method）",
+    "BULK_UPDATE_EMPTY": "没有需要更新的字段",
+    "QUOTA_EXCEEDED": "本月占卜次数已用完"
 }
 
 # ===== 占卜方法配置 =====
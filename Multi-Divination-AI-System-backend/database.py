@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -20,6 +20,22 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # 基础模型类
 Base = declarative_base()
 
+# 检查已存在的表是否缺少模型中的列（create_all 只创建缺失的表，不会修改已有表）
+# 只读检查：新增的列和索引通过迁移添加（alembic upgrade head），应用启动时不执行 DDL
+def missing_columns(bind=None):
+    bind = bind or engine
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in existing_columns)
+    
+    return missing
+
 # 依赖注入：获取数据库会话
 def get_db():
     db = SessionLocal()
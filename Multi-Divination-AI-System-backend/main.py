@@ -1,17 +1,29 @@
 # main.py - FastAPI 主应用文件
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 import uvicorn
 from datetime import datetime
 
 # 导入路由
-from routers import persona_routes, batch_routes, reading_routes
+from routers import persona_routes, batch_routes, reading_routes, admin_routes, generation_routes, numerology_routes, astrology_routes, tarot_routes, mbti_routes, palm_routes, chat_routes
 
 # 导入数据库相关
-from database import engine, get_db
+from database import engine, get_db, missing_columns
 from models import Base
+from config import DEFAULT_SECRET_KEY, settings
+from services.write_buffer import reading_write_buffer
+from monitoring.query_stats import QueryStatsMiddleware, install_query_instrumentation
+from monitoring.metrics import MetricsMiddleware, install_pool_metrics, render_metrics, mark_worker_dead
+from monitoring.profiler import RequestProfilingMiddleware
+from services.rate_limit import RateLimitMiddleware, build_limiters, build_admission
+from services.model_client import close_model_client
+from services.generation_cache import generation_cache
+from services.ephemeris import get_ephemeris
+from services.palm_images import shutdown_image_pool
+from services.chat_compaction import chat_compactor
+from services.quota import reading_quota
 
 # 生命周期管理
 @asynccontextmanager
@@ -19,17 +31,84 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     print("🚀 启动占卜系统API...")
     
+    # 需要认证时不能使用默认签名密钥，否则任何人都能伪造访问令牌
+    if settings.auth_required and settings.secret_key == DEFAULT_SECRET_KEY:
+        raise RuntimeError("需要认证时必须通过 SECRET_KEY 环境变量设置访问令牌签名密钥")
+    
     # 创建数据库表（如果不存在）
     try:
         Base.metadata.create_all(bind=engine)
         print("✅ 数据库表创建/检查完成")
+        # 已有表的新列和索引由迁移添加，这里只检查
+        pending_columns = missing_columns(engine)
+        if pending_columns:
+            print(f"⚠️  数据库缺少列 {', '.join(pending_columns)}，请运行 alembic upgrade head")
     except Exception as e:
         print(f"❌ 数据库初始化失败: {e}")
     
+    # 清理过期的生成结果缓存
+    if settings.generation_cache_enabled and settings.generation_cache_persistent:
+        try:
+            purged = generation_cache.purge_expired()
+            if purged:
+                print(f"✅ 已清理 {purged} 条过期生成缓存")
+        except Exception as e:
+            print(f"❌ 生成缓存清理失败: {e}")
+    
+    # 映射星历表（不存在时生成），避免首个占星请求承担生成耗时
+    try:
+        get_ephemeris()
+        print("✅ 星历表已加载")
+    except Exception as e:
+        print(f"❌ 星历表加载失败: {e}")
+    
+    # 启动写回缓冲后台刷新任务
+    if settings.write_behind_enabled:
+        await reading_write_buffer.start()
+        print("✅ 写回缓冲已启用")
+    
+    # 启动占卜额度对账后台任务
+    if settings.quota_enabled:
+        await reading_quota.start()
+        print("✅ 占卜额度检查已启用")
+    
+    # 启动长会话上下文压缩后台任务
+    if settings.chat_compaction_enabled:
+        await chat_compactor.start()
+        print("✅ 聊天上下文压缩已启用")
+    
+    if not settings.auth_required:
+        print("⚠️  未要求认证：没有访问令牌的请求按测试用户处理")
+    
     yield
     
     # 关闭时执行
     print("🛑 关闭占卜系统API...")
+    
+    # 关闭前刷新写回缓冲，避免丢失尚未落库的更新
+    if settings.write_behind_enabled:
+        try:
+            await reading_write_buffer.stop()
+            print("✅ 写回缓冲已刷新")
+        except Exception as e:
+            print(f"❌ 写回缓冲刷新失败: {e}")
+    
+    if settings.chat_compaction_enabled:
+        await chat_compactor.stop()
+    
+    # 归还未用完的预占额度
+    if settings.quota_enabled:
+        try:
+            await reading_quota.stop()
+            print("✅ 占卜额度已对账")
+        except Exception as e:
+            print(f"❌ 占卜额度对账失败: {e}")
+    
+    await close_model_client()
+    shutdown_image_pool()
+    
+    if settings.metrics_enabled:
+        mark_worker_dead()
 
 # 创建 FastAPI 应用实例
 app = FastAPI(
@@ -62,6 +141,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 限流与准入控制（在 CORS 之内注册，429/503 响应同样带有 CORS 头）
+if settings.rate_limit_enabled or settings.admission_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiters=build_limiters(settings) if settings.rate_limit_enabled else {},
+        admission=build_admission(settings) if settings.admission_enabled else None,
+        trust_forwarded_for=settings.rate_limit_trust_forwarded_for
+    )
+
 # CORS 中间件配置
 app.add_middleware(
     CORSMiddleware,
@@ -71,6 +159,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# SQL统计中间件（Server-Timing 响应头 + 慢查询日志）
+if settings.sql_instrumentation_enabled:
+    install_query_instrumentation(engine)
+    app.add_middleware(
+        QueryStatsMiddleware,
+        slow_query_threshold_ms=settings.slow_query_threshold_ms,
+        top_n=settings.slow_query_top_n
+    )
+
+# Prometheus 指标中间件
+if settings.metrics_enabled:
+    install_pool_metrics(engine)
+    app.add_middleware(MetricsMiddleware)
+
+# 单请求性能采样中间件（仅在显式开启时注册，关闭时零开销）
+if settings.profiling_enabled and settings.admin_token:
+    app.add_middleware(
+        RequestProfilingMiddleware,
+        admin_token=settings.admin_token,
+        path_prefixes=settings.profiling_request_paths
+    )
+
 # 全局异常处理器
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -81,7 +191,8 @@ async def http_exception_handler(request, exc):
             "status_code": exc.status_code,
             "timestamp": datetime.utcnow().isoformat(),
             "path": str(request.url)
-        }
+        },
+        headers=exc.headers
     )
 
 @app.exception_handler(Exception)
@@ -112,7 +223,8 @@ def read_root():
         "endpoints": {
             "personas": "/personas",
             "batch": "/batch", 
-            "readings": "/readings"
+            "readings": "/readings",
+            "generation": "/generation"
         }
     }
 
@@ -165,13 +277,28 @@ def api_info():
             "LifePathNumber - 生命数字",
             "Integrated - 综合分析"
         ],
-        "endpoints_count": {
-            "personas": 6,
-            "batch": 5,
-            "readings": 8
-        }
+        "endpoints_count": _count_endpoints_by_tag()
     }
 
+def _count_endpoints_by_tag():
+    """按路由标签统计已注册的接口数量"""
+    counts = {}
+    for route in app.routes:
+        for tag in getattr(route, "tags", None) or []:
+            counts[tag] = counts.get(tag, 0) + len(getattr(route, "methods", None) or [])
+    return counts
+
+# Prometheus 指标
+@app.get("/metrics", tags=["系统"], include_in_schema=False)
+def metrics():
+    """
+    Prometheus 文本格式的指标
+    """
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="指标未启用")
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 # 注册路由模块
 app.include_router(
     persona_routes.router,
@@ -188,6 +315,46 @@ app.include_router(
     # prefix="/api/v1"
 )
 
+app.include_router(
+    generation_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    numerology_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    astrology_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    tarot_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    mbti_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    palm_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    chat_routes.router,
+    # prefix="/api/v1"
+)
+
+app.include_router(
+    admin_routes.router,
+    # prefix="/api/v1"
+)
+
 # 开发服务器启动配置
 if __name__ == "__main__":
     uvicorn.run(
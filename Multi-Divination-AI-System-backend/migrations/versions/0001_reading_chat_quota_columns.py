@@ -0,0 +1,175 @@
+"""报告查询字段与 token 用量、聊天统计与压缩检查点、额度计费月；塔罗/MBTI/生成缓存表；相关索引
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+此前新增的列和索引由应用启动时自动补齐，这里改为迁移。
+已经被自动补齐（或由 create_all 新建）的数据库上，已存在的表、列和索引会跳过，可以直接升级。
+PostgreSQL 上已有表的索引用 CREATE INDEX CONCURRENTLY 创建，不锁写入；
+升级后运行 python -m services.input_fields 回填报告的查询字段。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def new_columns():
+    # Column 对象添加后会绑定到表上，每次迁移重新创建
+    return {
+        "readings": [
+            sa.Column("spread_type", sa.String(32), nullable=True),
+            sa.Column("mbti_type", sa.String(4), nullable=True),
+            sa.Column("birth_date", sa.Date(), nullable=True),
+            sa.Column("created_via", sa.String(32), nullable=True),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=True),
+            sa.Column("output_tokens", sa.Integer(), nullable=True),
+            sa.Column("latency_ms", sa.Integer(), nullable=True),
+        ],
+        "chat_sessions": [
+            sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("token_total", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("summary_token_offset", sa.Integer(), nullable=False, server_default="0"),
+        ],
+        "chat_messages": [
+            sa.Column("token_count", sa.Integer(), nullable=True),
+            sa.Column("token_offset", sa.Integer(), nullable=True),
+        ],
+        "subscriptions": [
+            sa.Column("usage_period_start", sa.DateTime(), nullable=True),
+        ],
+    }
+
+
+# 已有（可能很大的）表上的新索引
+NEW_INDEXES = [
+    ("ix_readings_user_spread_created", "readings", ["user_id", "spread_type", "created_at"]),
+    ("ix_readings_user_mbti_created", "readings", ["user_id", "mbti_type", "created_at"]),
+    ("ix_readings_user_birth_date", "readings", ["user_id", "birth_date"]),
+    ("ix_readings_created_via_created", "readings", ["created_via", "created_at"]),
+    ("ix_chat_sessions_user_last_message", "chat_sessions", ["user_id", "last_message_at"]),
+    ("ix_chat_messages_session_id", "chat_messages", ["session_id", "id"]),
+    ("ix_chat_messages_session_offset", "chat_messages", ["session_id", "token_offset"]),
+]
+
+DIVINATION_METHODS = ("LIFEPATH", "PALMISTRY", "ASTROLOGY", "MBTI", "TAROT", "INTEGRATED")
+
+
+def _create_tables(existing_tables) -> None:
+    # 新表为空，建表时一并创建索引
+    if "tarot_card_draws" not in existing_tables:
+        op.create_table(
+            "tarot_card_draws",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("reading_id", sa.Integer(), sa.ForeignKey("readings.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("position", sa.SmallInteger(), nullable=False),
+            sa.Column("card", sa.SmallInteger(), nullable=False),
+            sa.Column("is_reversed", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("reading_id", "position", name="uq_tarot_reading_position"),
+        )
+        op.create_index("ix_tarot_draws_card", "tarot_card_draws", ["card", "is_reversed"])
+        op.create_index("ix_tarot_draws_user_card", "tarot_card_draws", ["user_id", "card"])
+
+    if "mbti_results" not in existing_tables:
+        op.create_table(
+            "mbti_results",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column(
+                "reading_id", sa.Integer(), sa.ForeignKey("readings.id", ondelete="CASCADE"),
+                nullable=False, unique=True
+            ),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("mbti_type", sa.String(4), nullable=False),
+            sa.Column("ei_score", sa.Float(), nullable=False),
+            sa.Column("sn_score", sa.Float(), nullable=False),
+            sa.Column("tf_score", sa.Float(), nullable=False),
+            sa.Column("jp_score", sa.Float(), nullable=False),
+            sa.Column("confidence", sa.SmallInteger(), nullable=False),
+            sa.Column("answered", sa.SmallInteger(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_mbti_results_type", "mbti_results", ["mbti_type"])
+        op.create_index("ix_mbti_results_user_created", "mbti_results", ["user_id", "created_at"])
+
+    if "generation_cache" not in existing_tables:
+        # PostgreSQL 上 divinationmethod 枚举类型已随 readings 表创建
+        method_type = sa.Enum(*DIVINATION_METHODS, name="divinationmethod", length=32).with_variant(
+            postgresql.ENUM(*DIVINATION_METHODS, name="divinationmethod", create_type=False),
+            "postgresql"
+        )
+        op.create_table(
+            "generation_cache",
+            sa.Column("cache_key", sa.String(64), primary_key=True),
+            sa.Column("method", method_type, nullable=False),
+            sa.Column("model", sa.String(100), nullable=False),
+            sa.Column("output_text", sa.Text(), nullable=False),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=True),
+            sa.Column("output_tokens", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_generation_cache_expires_at", "generation_cache", ["expires_at"])
+
+
+def upgrade() -> None:
+    context = op.get_context()
+    if context.as_sql:
+        # 生成 SQL 脚本（--sql）时无法检查现有结构，按旧库输出全部语句
+        existing_tables, existing_columns, existing_indexes = set(), lambda table: set(), lambda table: set()
+    else:
+        inspector = sa.inspect(op.get_bind())
+        existing_tables = set(inspector.get_table_names())
+        existing_columns = lambda table: {column["name"] for column in inspector.get_columns(table)}
+        existing_indexes = lambda table: {index["name"] for index in inspector.get_indexes(table)}
+
+    for table_name, columns in new_columns().items():
+        present = existing_columns(table_name)
+        for column in columns:
+            if column.name not in present:
+                op.add_column(table_name, column)
+
+    _create_tables(existing_tables)
+
+    missing_indexes = [
+        (name, table_name, columns)
+        for name, table_name, columns in NEW_INDEXES
+        if name not in existing_indexes(table_name)
+    ]
+    if context.dialect.name == "postgresql":
+        # CONCURRENTLY 不能在事务中执行
+        with op.get_context().autocommit_block():
+            for name, table_name, columns in missing_indexes:
+                op.create_index(name, table_name, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table_name, columns in missing_indexes:
+            op.create_index(name, table_name, columns)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, table_name, _ in reversed(NEW_INDEXES):
+                op.drop_index(name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table_name, _ in reversed(NEW_INDEXES):
+            op.drop_index(name, table_name=table_name)
+
+    op.drop_table("generation_cache")
+    op.drop_table("mbti_results")
+    op.drop_table("tarot_card_draws")
+
+    for table_name, columns in new_columns().items():
+        with op.batch_alter_table(table_name) as batch_op:
+            for column in reversed(columns):
+                batch_op.drop_column(column.name)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, Boolean,
+    Column, Integer, SmallInteger, Float, String, Text, Date, DateTime, Boolean,
     ForeignKey, Enum as SqlEnum, Index, UniqueConstraint,
     JSON, DECIMAL
 )
@@ -120,12 +120,22 @@ class Reading(Base):
     
     # 扩展信息
     input_data = Column(JSON, nullable=True)  # 存储输入的原始数据
+    
+    # 从 input_data 提取的常用查询字段（见 services/input_fields.py）
+    spread_type = Column(String(32), nullable=True)
+    mbti_type = Column(String(4), nullable=True)
+    birth_date = Column(Date, nullable=True)
+    created_via = Column(String(32), nullable=True)
+    
     status = Column(SqlEnum(ReadingStatus, native_enum=True), default=ReadingStatus.PENDING)
     
     # AI相关信息
     ai_model_used = Column(String(100), nullable=True)  # 记录使用的AI模型
     processing_time = Column(Integer, nullable=True)  # 处理时间(秒)
     confidence_score = Column(Integer, nullable=True)  # AI置信度(1-100)
+    prompt_tokens = Column(Integer, nullable=True)  # 提示词token数（上游未返回时为估算值）
+    output_tokens = Column(Integer, nullable=True)  # 回复token数
+    latency_ms = Column(Integer, nullable=True)  # 模型调用耗时(毫秒)
     
     # 用户交互
     is_favorite = Column(Boolean, default=False)
@@ -144,6 +154,22 @@ class Reading(Base):
     user = relationship("User", back_populates="readings")
     persona = relationship("Persona", back_populates="readings")
     
+    # 塔罗抽牌（每张牌一行，便于按牌统计）
+    tarot_cards = relationship(
+        "TarotCardDraw",
+        back_populates="reading",
+        order_by="TarotCardDraw.position",
+        passive_deletes=True
+    )
+    
+    # MBTI 问卷计分结果（一对一）
+    mbti_result = relationship(
+        "MBTIResult",
+        back_populates="reading",
+        uselist=False,
+        passive_deletes=True
+    )
+    
     # 作为综合报告的源报告
     integrated_readings = relationship(
         "ReadingSource",
@@ -166,6 +192,57 @@ class Reading(Base):
         Index("ix_readings_method_status", "method", "status"),
         Index("ix_readings_user_method", "user_id", "method"),
         Index("ix_readings_sharing_token", "sharing_token"),
+        Index("ix_readings_user_spread_created", "user_id", "spread_type", "created_at"),
+        Index("ix_readings_user_mbti_created", "user_id", "mbti_type", "created_at"),
+        Index("ix_readings_user_birth_date", "user_id", "birth_date"),
+        Index("ix_readings_created_via_created", "created_via", "created_at"),
+    )
+
+class TarotCardDraw(Base):
+    __tablename__ = "tarot_card_draws"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    reading_id = Column(Integer, ForeignKey("readings.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    # 牌阵中的位置序号、牌下标(0-77，见 services/tarot.py)和正逆位
+    position = Column(SmallInteger, nullable=False)
+    card = Column(SmallInteger, nullable=False)
+    is_reversed = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # 关系
+    reading = relationship("Reading", back_populates="tarot_cards")
+    
+    __table_args__ = (
+        UniqueConstraint("reading_id", "position", name="uq_tarot_reading_position"),
+        Index("ix_tarot_draws_card", "card", "is_reversed"),
+        Index("ix_tarot_draws_user_card", "user_id", "card"),
+    )
+
+class MBTIResult(Base):
+    __tablename__ = "mbti_results"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    reading_id = Column(Integer, ForeignKey("readings.id", ondelete="CASCADE"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    # 计分得到的类型与四个维度得分（-1 ~ 1，正值偏向 E/S/T/J，见 services/mbti.py）
+    mbti_type = Column(String(4), nullable=False)
+    ei_score = Column(Float, nullable=False)
+    sn_score = Column(Float, nullable=False)
+    tf_score = Column(Float, nullable=False)
+    jp_score = Column(Float, nullable=False)
+    confidence = Column(SmallInteger, nullable=False)  # 1-100
+    answered = Column(SmallInteger, nullable=False)  # 作答题数
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # 关系
+    reading = relationship("Reading", back_populates="mbti_result")
+    
+    __table_args__ = (
+        Index("ix_mbti_results_type", "mbti_type"),
+        Index("ix_mbti_results_user_created", "user_id", "created_at"),
     )
 
 class ReadingSource(Base):
@@ -197,6 +274,20 @@ class ReadingSource(Base):
         Index("ix_rs_source", "source_reading_id"),
     )
 
+class GenerationCacheEntry(Base):
+    """模型生成结果缓存（按提示词哈希）"""
+    __tablename__ = "generation_cache"
+    
+    cache_key = Column(String(64), primary_key=True)  # 提示词及生成参数的 SHA-256
+    method = Column(SqlEnum(DivinationMethod, native_enum=True, length=32), nullable=False)
+    model = Column(String(100), nullable=False)
+    output_text = Column(Text, nullable=False)
+    prompt_tokens = Column(Integer, nullable=True)
+    output_tokens = Column(Integer, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 # ===== 以下是为未来功能准备的模型 =====
 
 class ChatSessionType(str, Enum):
@@ -226,6 +317,12 @@ class ChatSession(Base):
     ai_personality = Column(String(50), default="aura")  # AI助手人格
     context_data = Column(JSON, nullable=True)  # 会话上下文数据
     
+    # 消息统计（追加消息时与 last_message_at 在同一条 UPDATE 中累加）
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    token_total = Column(Integer, nullable=False, default=0, server_default="0")  # 全部消息的估算 token 数
+    # 压缩检查点：token_offset 不超过该值的消息已汇总进 context_data["summary"]
+    summary_token_offset = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -240,6 +337,7 @@ class ChatSession(Base):
     __table_args__ = (
         Index("ix_chat_sessions_user_active", "user_id", "is_active"),
         Index("ix_chat_sessions_user_updated", "user_id", "updated_at"),
+        Index("ix_chat_sessions_user_last_message", "user_id", "last_message_at"),
     )
 
 class ChatMessage(Base):
@@ -256,6 +354,10 @@ class ChatMessage(Base):
     message_type = Column(String(50), default="text")  # text, image, file等
     message_metadata = Column(JSON, nullable=True)  # 存储额外信息如AI模型、处理时间等
     
+    # 估算 token 数，以及会话内截至本条（含）的累计 token 数，用于按 token 截取最近的上下文
+    token_count = Column(Integer, nullable=True)
+    token_offset = Column(Integer, nullable=True)
+    
     # 用户交互
     user_reaction = Column(String(20), nullable=True)  # 用户反应：like, dislike, love等
     is_edited = Column(Boolean, default=False)
@@ -269,6 +371,8 @@ class ChatMessage(Base):
     
     __table_args__ = (
         Index("ix_chat_messages_session_created", "session_id", "created_at"),
+        Index("ix_chat_messages_session_id", "session_id", "id"),
+        Index("ix_chat_messages_session_offset", "session_id", "token_offset"),
     )
 
 class SubscriptionTier(str, Enum):
@@ -313,6 +417,7 @@ class Subscription(Base):
     # 功能限制
     monthly_reading_limit = Column(Integer, nullable=True)
     current_monthly_usage = Column(Integer, default=0)
+    usage_period_start = Column(DateTime, nullable=True)  # current_monthly_usage 所属的计费月（UTC 月初）
     
     # 自动续费
     auto_renew = Column(Boolean, default=True)
@@ -0,0 +1,258 @@
+# monitoring/metrics.py - Prometheus 指标（API延迟/吞吐/错误率、数据库连接池、业务计数）
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+# 设置 PROMETHEUS_MULTIPROC_DIR 后进入多进程模式：
+# 每个 uvicorn worker 把指标写入该目录下的 mmap 文件，/metrics 抓取时汇总所有 worker
+MULTIPROCESS_MODE = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ===== API 指标 =====
+HTTP_REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "HTTP请求总数",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP请求延迟（秒）",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "正在处理的HTTP请求数",
+    ["method", "route"],
+    multiprocess_mode="livesum"
+)
+
+# ===== 数据库连接池指标 =====
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "数据库连接池容量",
+    multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "当前被借出的数据库连接数",
+    multiprocess_mode="livesum"
+)
+DB_POOL_CONNECTIONS_TOTAL = Counter(
+    "db_pool_connections_created_total",
+    "连接池新建的数据库连接总数"
+)
+
+# ===== 业务指标 =====
+READINGS_CREATED_TOTAL = Counter(
+    "divination_readings_created_total",
+    "创建的占卜报告总数",
+    ["method"]
+)
+
+# 生成结果缓存命中率 = sum(rate(...{result="hit"})) / sum(rate(...))
+GENERATION_CACHE_LOOKUPS_TOTAL = Counter(
+    "divination_generation_cache_lookups_total",
+    "生成结果缓存查询次数",
+    ["tier", "result"]
+)
+GENERATION_CACHE_BYTES = Gauge(
+    "divination_generation_cache_bytes",
+    "进程内生成结果缓存占用（字节）",
+    multiprocess_mode="livesum"
+)
+
+COALESCED_REQUESTS_TOTAL = Counter(
+    "divination_coalesced_requests_total",
+    "与进行中的相同请求合并执行的请求数",
+    ["operation"]
+)
+
+# 额度检查：local 为进程内预占额度直接放行，lease 为向数据库预占后放行，rejected 为超出额度
+QUOTA_CHECKS_TOTAL = Counter(
+    "divination_quota_checks_total",
+    "占卜次数额度检查次数（result: unlimited / local / lease / rejected）",
+    ["result"]
+)
+
+# ===== 限流与准入控制 =====
+REQUESTS_REJECTED_TOTAL = Counter(
+    "divination_requests_rejected_total",
+    "被限流或准入控制拒绝的请求数（reason: rate_limited / queue_full / queue_timeout）",
+    ["route_class", "reason"]
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "divination_admission_queue_wait_seconds",
+    "请求在准入队列中的等待时间（秒，含被拒绝的请求）",
+    ["route_class"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "divination_admission_in_flight",
+    "已准入、正在处理的请求数",
+    ["route_class"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_QUEUED = Gauge(
+    "divination_admission_queued",
+    "在准入队列中等待的请求数",
+    ["route_class"],
+    multiprocess_mode="livesum"
+)
+
+# ===== 模型调用指标 =====
+MODEL_CALLS_TOTAL = Counter(
+    "divination_model_calls_total",
+    "模型调用次数（outcome: success / error / retry / hedge / circuit_open）",
+    ["model", "outcome"]
+)
+MODEL_CALL_DURATION = Histogram(
+    "divination_model_call_duration_seconds",
+    "成功的模型调用延迟（秒）",
+    ["model"],
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+)
+MODEL_CIRCUIT_STATE = Gauge(
+    "divination_model_circuit_state",
+    "模型熔断器状态（0 关闭 / 1 半开 / 2 打开）",
+    ["model"],
+    multiprocess_mode="max"
+)
+
+
+def record_reading_created(method) -> None:
+    """记录一个新建的占卜报告（method 为 DivinationMethod 或其字符串值）"""
+    READINGS_CREATED_TOTAL.labels(method=getattr(method, "value", method)).inc()
+
+
+def record_generation_cache_lookup(tier: str, hit: bool) -> None:
+    """记录一次生成结果缓存查询（tier 为 memory 或 database）"""
+    GENERATION_CACHE_LOOKUPS_TOTAL.labels(tier=tier, result="hit" if hit else "miss").inc()
+
+
+def record_coalesced_request(operation: str) -> None:
+    COALESCED_REQUESTS_TOTAL.labels(operation=operation).inc()
+
+
+def record_quota_check(result: str) -> None:
+    QUOTA_CHECKS_TOTAL.labels(result=result).inc()
+
+
+def record_request_rejected(route_class: str, reason: str) -> None:
+    REQUESTS_REJECTED_TOTAL.labels(route_class=route_class, reason=reason).inc()
+
+
+def record_admission_wait(route_class: str, seconds: float) -> None:
+    ADMISSION_QUEUE_WAIT.labels(route_class=route_class).observe(seconds)
+
+
+def record_model_call(model: str, outcome: str, duration: float = None) -> None:
+    MODEL_CALLS_TOTAL.labels(model=model, outcome=outcome).inc()
+    if duration is not None:
+        MODEL_CALL_DURATION.labels(model=model).observe(duration)
+
+
+def set_model_circuit_state(model: str, state: int) -> None:
+    MODEL_CIRCUIT_STATE.labels(model=model).set(state)
+
+
+def set_generation_cache_bytes(size: int) -> None:
+    GENERATION_CACHE_BYTES.set(size)
+
+
+def install_pool_metrics(engine: Engine) -> None:
+    """通过连接池事件维护连接池指标（重复调用是安全的）"""
+    if event.contains(engine, "checkout", _on_checkout):
+        return
+    pool_size = getattr(engine.pool, "size", None)
+    if callable(pool_size):
+        DB_POOL_SIZE.set(pool_size())
+    event.listen(engine, "connect", _on_connect)
+    event.listen(engine, "checkout", _on_checkout)
+    event.listen(engine, "checkin", _on_checkin)
+
+
+def _on_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTIONS_TOTAL.inc()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+class MetricsMiddleware:
+    """
+    ASGI中间件：记录每个路由的请求数、延迟直方图与并发数
+
+    route 标签使用路由模板（如 /readings/{reading_id}），未匹配的路径统一记为 "unmatched"，避免标签基数膨胀
+    """
+
+    def __init__(self, app, excluded_paths=("/metrics",)):
+        self.app = app
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._resolve_route(scope)
+        status_code = 500
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method=method, route=route)
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            HTTP_REQUEST_DURATION.labels(method=method, route=route).observe(elapsed)
+            HTTP_REQUESTS_TOTAL.labels(method=method, route=route, status=str(status_code)).inc()
+
+    def _resolve_route(self, scope) -> str:
+        """在进入路由前按模板匹配路径"""
+        app = scope.get("app")
+        if app is None:
+            return "unmatched"
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+
+def render_metrics():
+    """生成 Prometheus 文本格式的指标，返回 (内容, Content-Type)"""
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead() -> None:
+    """多进程模式下 worker 退出时清理其 livesum 类型的 gauge 文件"""
+    if MULTIPROCESS_MODE:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,197 @@
+# monitoring/profiler.py - 低开销的栈采样分析器（输出 flamegraph 可用的 collapsed stacks）
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+# 线程处于这些函数时视为空闲（等待锁/IO/任务队列），默认不计入结果
+IDLE_FUNCTIONS = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+})
+
+MAX_PROFILE_SECONDS = 60
+MIN_INTERVAL_SECONDS = 0.001
+
+
+class ProfilerBusyError(Exception):
+    """已有采样在运行"""
+
+
+class StackSampler:
+    """
+    定时读取 sys._current_frames() 的采样器
+
+    只在 start()/stop() 之间运行一个后台线程，不使用 sys.setprofile，
+    因此未开启时没有任何开销；开启时开销与采样频率成正比。
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = max(interval, MIN_INTERVAL_SECONDS)
+        self.include_idle = include_idle
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        thread_names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_ident:
+                    continue
+                stack = self._collapse(frame)
+                if stack is None:
+                    continue
+                self.samples[f"{thread_names.get(thread_id, thread_id)};{stack}"] += 1
+            self.sample_count += 1
+
+    def _collapse(self, frame) -> Optional[str]:
+        leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        if not self.include_idle and leaf in IDLE_FUNCTIONS:
+            return None
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed 格式：每行 "帧1;帧2;... 次数"，可直接交给 flamegraph.pl / speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+# 同一时间只允许一个采样器运行，避免多个采样线程叠加开销
+_profile_lock = threading.Lock()
+
+
+def profile_for(seconds: float, interval: float = 0.01, include_idle: bool = False) -> StackSampler:
+    """对当前进程采样指定秒数"""
+    seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("已有性能采样正在进行")
+    try:
+        sampler = StackSampler(interval=interval, include_idle=include_idle)
+        sampler.start()
+        time.sleep(seconds)
+        sampler.stop()
+        return sampler
+    finally:
+        _profile_lock.release()
+
+
+class RequestProfileStore:
+    """保存最近若干次单请求采样结果（按 profile_id 查询）"""
+
+    def __init__(self, max_entries: int = 20):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, path: str, sampler: StackSampler, duration: float) -> str:
+        profile_id = uuid.uuid4().hex
+        with self._lock:
+            self._profiles[profile_id] = {
+                "path": path,
+                "duration_ms": round(duration * 1000, 2),
+                "sample_count": sampler.sample_count,
+                "collapsed": sampler.collapsed()
+            }
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+request_profiles = RequestProfileStore()
+
+
+class RequestProfilingMiddleware:
+    """
+    单请求采样：请求带 X-Profile 头且 X-Admin-Token 正确时，对本次请求采样，
+    结果通过响应头 X-Profile-Id 返回，再用 GET /admin/profile/requests/{profile_id} 获取。
+
+    采样覆盖进程内所有非空闲线程，并发请求较多时结果中可能包含其它请求的栈。
+    只在启用性能分析时注册该中间件。
+    """
+
+    def __init__(self, app, admin_token: str, path_prefixes=(), interval: float = 0.005):
+        self.app = app
+        self.admin_token = admin_token.encode("latin-1")
+        self.path_prefixes = tuple(path_prefixes)
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not _profile_lock.acquire(blocking=False):
+            # 已有采样在进行，正常处理请求
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(interval=self.interval)
+        start = time.perf_counter()
+        response_start = None
+
+        async def hold_response_start(message):
+            nonlocal response_start
+            if message["type"] == "http.response.start":
+                # 等采样结束后再发送响应头，以便附带 X-Profile-Id
+                response_start = message
+                return
+            if response_start is not None:
+                await finish_and_send_start()
+            await send(message)
+
+        async def finish_and_send_start():
+            nonlocal response_start
+            sampler.stop()
+            _profile_lock.release()
+            stored_id = request_profiles.add(scope["path"], sampler, time.perf_counter() - start)
+            headers = list(response_start.get("headers", []))
+            headers.append((b"x-profile-id", stored_id.encode("latin-1")))
+            message, response_start = dict(response_start, headers=headers), None
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, hold_response_start)
+        finally:
+            if sampler._thread is not None:
+                sampler.stop()
+                _profile_lock.release()
+
+    def _should_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        if b"x-profile" not in headers:
+            return False
+        if not self.admin_token or not hmac.compare_digest(headers.get(b"x-admin-token", b""), self.admin_token):
+            return False
+        return scope["path"].startswith(self.path_prefixes)
@@ -0,0 +1,171 @@
+# monitoring/query_stats.py - 基于SQLAlchemy事件的每请求SQL统计与慢查询日志
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("divination.sql")
+
+MAX_LOGGED_STATEMENT_LENGTH = 500
+
+
+class QueryStats:
+    """单个请求内的SQL执行统计"""
+
+    def __init__(self, top_n: int = 3):
+        self.top_n = top_n
+        self.query_count = 0
+        self.total_time = 0.0  # 秒
+        self.slowest: List[Tuple[float, str]] = []  # [(耗时秒, SQL)]，按耗时降序
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.query_count += 1
+        self.total_time += elapsed
+        if len(self.slowest) < self.top_n or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.top_n:]
+
+    @property
+    def total_time_ms(self) -> float:
+        return self.total_time * 1000
+
+    def server_timing(self) -> str:
+        """Server-Timing 头的值"""
+        return f'db;dur={self.total_time_ms:.2f};desc="{self.query_count} queries"'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query_count": self.query_count,
+            "db_time_ms": round(self.total_time_ms, 2),
+            "slowest": [
+                {
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "statement": statement[:MAX_LOGGED_STATEMENT_LENGTH]
+                }
+                for elapsed, statement in self.slowest
+            ]
+        }
+
+
+# 当前请求的统计对象；同步路由运行在线程池中，anyio 会复制上下文，因此同一对象在线程内可见
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# 进程级的全局计数器（供测试/基准的 count_queries 使用）
+_global_counters: List[QueryStats] = []
+
+
+def get_current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def install_query_instrumentation(engine: Engine) -> None:
+    """在引擎上注册SQL计时事件（重复调用是安全的）"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for counter in _global_counters:
+        counter.record(statement, elapsed)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI中间件：为每个HTTP请求收集SQL统计
+
+    - 响应头 Server-Timing / X-DB-Query-Count 返回查询次数与数据库耗时
+    - 数据库总耗时或单条语句超过阈值时输出结构化（JSON）慢查询日志
+    """
+
+    def __init__(self, app, slow_query_threshold_ms: float = 200.0, top_n: int = 3):
+        self.app = app
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self.top_n = top_n
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(top_n=self.top_n)
+        token = _current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                headers.append((b"x-db-query-count", str(stats.query_count).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+            self._log_if_slow(scope, stats)
+
+    def _log_if_slow(self, scope, stats: QueryStats) -> None:
+        slowest_ms = stats.slowest[0][0] * 1000 if stats.slowest else 0.0
+        if stats.total_time_ms < self.slow_query_threshold_ms and slowest_ms < self.slow_query_threshold_ms:
+            return
+        record = {
+            "event": "slow_query",
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "threshold_ms": self.slow_query_threshold_ms,
+            **stats.to_dict()
+        }
+        logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+# ===== 测试辅助 =====
+
+@contextmanager
+def count_queries(top_n: int = 3):
+    """
+    统计代码块内（包括其它线程中）执行的全部SQL
+
+        with count_queries() as stats:
+            client.get("/batch/summary")
+        assert stats.query_count <= 5
+    """
+    stats = QueryStats(top_n=top_n)
+    _global_counters.append(stats)
+    try:
+        yield stats
+    finally:
+        _global_counters.remove(stats)
+
+
+def assert_max_queries(response, max_queries: int) -> int:
+    """断言某个接口响应的SQL查询次数不超过上限（读取 X-DB-Query-Count 头）"""
+    header = response.headers.get("x-db-query-count")
+    if header is None:
+        raise AssertionError("响应中没有 X-DB-Query-Count 头，请确认已启用 QueryStatsMiddleware")
+    query_count = int(header)
+    if query_count > max_queries:
+        raise AssertionError(
+            f"{response.request.method} {response.request.url.path} 执行了 {query_count} 条SQL，"
+            f"超过上限 {max_queries}（{response.headers.get('server-timing')}）"
+        )
+    return query_count
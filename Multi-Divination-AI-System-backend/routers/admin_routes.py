@@ -0,0 +1,107 @@
+# routers/admin_routes.py - 管理员运维路由（性能分析、token 用量）
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from config import settings
+from database import get_db
+from services.reading_service import ReadingService
+from monitoring.profiler import profile_for, request_profiles, ProfilerBusyError, MAX_PROFILE_SECONDS
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """校验管理员令牌；未配置令牌时接口视为不存在"""
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足"
+        )
+
+def require_profiling():
+    """未开启性能分析时采样接口视为不存在"""
+    if not settings.profiling_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+
+# 创建路由器
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.get("/usage")
+def get_token_usage(
+    days: int = Query(30, ge=1, le=365, description="统计最近多少天"),
+    db: Session = Depends(get_db)
+):
+    """
+    按占卜方法和模型汇总 token 用量、平均延迟和估算成本
+    
+    - **days**: 统计最近多少天的已完成报告
+    - 成本按 MODEL_PRICING 估算，未知模型为 null
+    """
+    return ReadingService(db).get_token_usage_summary(days)
+
+@router.get("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_profiling)])
+def profile_process(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS, description="采样时长（秒）"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="采样间隔（毫秒）"),
+    include_idle: bool = Query(False, description="是否包含空闲线程的栈")
+):
+    """
+    对当前 worker 进程进行栈采样
+    
+    - **seconds**: 采样时长
+    - **interval_ms**: 采样间隔
+    - 返回 collapsed stacks 文本，可直接用于 flamegraph.pl / speedscope
+    """
+    try:
+        sampler = profile_for(seconds, interval=interval_ms / 1000, include_idle=include_idle)
+        return PlainTextResponse(
+            sampler.collapsed(),
+            headers={"X-Profile-Samples": str(sampler.sample_count)}
+        )
+        
+    except ProfilerBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@router.get(
+    "/profile/requests/{profile_id}",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_profiling)]
+)
+def get_request_profile(profile_id: str):
+    """
+    获取单请求采样结果（由请求头 X-Profile 触发，响应头 X-Profile-Id 返回ID）
+    
+    - **profile_id**: 采样ID
+    """
+    profile = request_profiles.get(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="采样结果不存在或已过期"
+        )
+    
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={
+            "X-Profile-Path": profile["path"],
+            "X-Profile-Duration-Ms": str(profile["duration_ms"]),
+            "X-Profile-Samples": str(profile["sample_count"])
+        }
+    )
@@ -0,0 +1,57 @@
+# routers/astrology_routes.py - 星盘计算路由（本地星历表计算，不调用模型）
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from database import get_db
+from schemas import AstrologyBatchRequest, AstrologyBatchResponse
+from services.astrology import natal_charts
+from services.persona_service import PersonaService
+from services.auth import get_current_user_id
+
+# 创建路由器
+router = APIRouter(
+    prefix="/astrology",
+    tags=["astrology"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.post("/charts/batch", response_model=AstrologyBatchResponse)
+def compute_charts_batch(
+    batch: AstrologyBatchRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    批量计算星盘（太阳/月亮/上升星座与行星位置）
+    
+    - **items**: 出生信息列表，结果在 results 中按输入顺序返回
+    - **persona_ids**: 角色档案ID列表，结果在 persona_results 中按ID返回；
+      使用档案的出生信息或其最近一次占星报告的输入数据
+    - 出生日期超出 1900-2100 或无法解析出生信息的条目为 null
+    """
+    if not batch.items and not batch.persona_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="数据验证失败: items 和 persona_ids 不能同时为空"
+        )
+    
+    try:
+        items = [item.dict(exclude_none=True) for item in batch.items]
+        birth_data = PersonaService(db).get_birth_data(batch.persona_ids, user_id) if batch.persona_ids else {}
+        persona_ids = list(birth_data)
+        
+        # 直接输入与角色档案合并为一次批量计算
+        charts = natal_charts(items + [birth_data[persona_id] for persona_id in persona_ids])
+        persona_charts = dict(zip(persona_ids, charts[len(items):]))
+        
+        return AstrologyBatchResponse(
+            results=charts[:len(items)],
+            persona_results={persona_id: persona_charts.get(persona_id) for persona_id in batch.persona_ids},
+            count=len(charts)
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"星盘计算失败: {str(e)}"
+        )
@@ -5,6 +5,9 @@ from typing import Dict, Any
 
 from database import get_db
 from services.batch_service import BatchService
+from services import coalescing
+from services.quota import QuotaExceededError
+from services.auth import get_current_user_id
 from schemas import BatchReadingCreate, BatchReadingResponse, MessageResponse
 from constants import ERROR_MESSAGES
 
@@ -15,26 +18,34 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
+def _quota_exceeded(e: QuotaExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers=e.headers()
+    )
+
 @router.post("/readings", response_model=BatchReadingResponse)
-def create_batch_readings(
+async def create_batch_readings(
     batch_data: BatchReadingCreate,
-    db: Session = Depends(get_db)
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     批量创建占卜报告
     
     - **batch_data**: 包含用户信息、问题、各方法的报告和输入数据
     - 返回创建的persona和所有报告信息
+    - 进行中的相同请求会合并为一次写入，所有请求返回同一结果
+    - 每次批量创建计 1 次占卜额度，额度用尽时返回 429
     """
     try:
-        # 创建批量服务实例
-        batch_service = BatchService(db)
-        
-        # 执行批量创建
-        result = batch_service.create_batch_readings(batch_data)
+        # 执行批量创建（相同请求合并执行）
+        result = await coalescing.create_batch_readings(batch_data, user_id)
         
         return result
         
+    except QuotaExceededError as e:
+        raise _quota_exceeded(e)
     except ValueError as e:
         # 数据验证错误
         raise HTTPException(
@@ -50,7 +61,8 @@ def create_batch_readings(
 
 @router.get("/summary", response_model=Dict[str, Any])
 def get_user_batch_summary(
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取用户的批量操作汇总统计
@@ -62,7 +74,7 @@ def get_user_batch_summary(
         batch_service = BatchService(db)
         
         # 获取汇总信息
-        summary = batch_service.get_user_batch_summary()
+        summary = batch_service.get_user_batch_summary(user_id)
         
         return summary
         
@@ -75,7 +87,8 @@ def get_user_batch_summary(
 @router.get("/personas/{persona_id}/readings/count")
 def get_persona_reading_count(
     persona_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取指定persona的报告数量
@@ -85,7 +98,7 @@ def get_persona_reading_count(
     """
     try:
         batch_service = BatchService(db)
-        count = batch_service.get_persona_reading_count(persona_id)
+        count = batch_service.get_persona_reading_count(persona_id, user_id)
         
         return {
             "persona_id": persona_id,
@@ -102,7 +115,8 @@ def get_persona_reading_count(
 @router.delete("/personas/{persona_id}/readings", response_model=Dict[str, Any])
 def delete_persona_readings(
     persona_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     删除指定persona的所有报告（批量删除）
@@ -112,7 +126,7 @@ def delete_persona_readings(
     """
     try:
         batch_service = BatchService(db)
-        result = batch_service.delete_batch_readings(persona_id)
+        result = batch_service.delete_batch_readings(persona_id, user_id)
         
         return result
         
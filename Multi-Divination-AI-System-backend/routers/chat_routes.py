@@ -0,0 +1,252 @@
+# routers/chat_routes.py - 聊天会话与消息路由
+from contextlib import aclosing
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from database import get_db
+from config import settings
+from services.auth import AuthenticationError, authenticate_websocket, get_current_user_id
+from services.chat_service import ChatService, SESSION_NOT_FOUND
+from services.chat_compaction import context_messages, session_summary
+from services.chat_stream import chat_context_cache, get_chat_context, stream_reply
+from schemas import (
+    ChatSessionCreate, ChatSessionResponse, ChatMessageCreate, ChatMessageResponse,
+    ChatMessagePage, ChatContextResponse
+)
+
+# 创建路由器
+router = APIRouter(
+    prefix="/chat",
+    tags=["chat"],
+    responses={404: {"description": "Not found"}}
+)
+
+def _session_not_found():
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=SESSION_NOT_FOUND
+    )
+
+@router.post("/sessions", response_model=ChatSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_session(
+    session_data: ChatSessionCreate,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    创建聊天会话
+
+    - **related_reading_id**: 可选，讨论的占卜报告
+    - **persona_id**: 可选，关联的角色档案
+    """
+    try:
+        chat_service = ChatService(db)
+        session = chat_service.create_session(session_data, user_id)
+        return ChatSessionResponse.from_orm(session)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建聊天会话失败: {str(e)}"
+        )
+
+@router.get("/sessions", response_model=List[ChatSessionResponse])
+def get_sessions(
+    limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
+    offset: int = Query(0, ge=0, description="偏移量"),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    获取聊天会话列表（按最近消息时间倒序，不含已归档的会话）
+    """
+    try:
+        chat_service = ChatService(db)
+        sessions = chat_service.get_sessions_by_user(user_id, limit=limit, offset=offset)
+        return [ChatSessionResponse.from_orm(session) for session in sessions]
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取聊天会话列表失败: {str(e)}"
+        )
+
+@router.get("/sessions/{session_id}", response_model=ChatSessionResponse)
+def get_session(
+    session_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    获取聊天会话
+    """
+    chat_service = ChatService(db)
+    session = chat_service.get_session(session_id, user_id)
+    if not session:
+        raise _session_not_found()
+    return ChatSessionResponse.from_orm(session)
+
+@router.post(
+    "/sessions/{session_id}/messages",
+    response_model=ChatMessageResponse,
+    status_code=status.HTTP_201_CREATED
+)
+def append_message(
+    session_id: int,
+    message: ChatMessageCreate,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    追加一条消息（消息只追加不修改）
+
+    - 同时更新会话的 last_message_at、消息数和 token 总数
+    """
+    try:
+        chat_service = ChatService(db)
+        saved = chat_service.append_message(session_id, message, user_id)
+        # 本进程缓存的会话上下文不包含这条消息
+        chat_context_cache.invalidate(session_id)
+        return ChatMessageResponse.from_orm(saved)
+
+    except LookupError:
+        raise _session_not_found()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"保存聊天消息失败: {str(e)}"
+        )
+
+@router.get("/sessions/{session_id}/messages", response_model=ChatMessagePage)
+def get_messages(
+    session_id: int,
+    before_id: Optional[int] = Query(None, ge=1, description="游标：返回ID小于该值的消息"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量限制"),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    分页获取聊天记录
+
+    - 每页按时间正序返回；取更早一页时把响应中的 next_before_id 作为 before_id 传入
+    """
+    try:
+        chat_service = ChatService(db)
+        messages = chat_service.get_messages(session_id, before_id=before_id, limit=limit, user_id=user_id)
+        if not messages and not chat_service.get_session(session_id, user_id):
+            raise _session_not_found()
+
+        return ChatMessagePage(
+            messages=[ChatMessageResponse.from_orm(message) for message in messages],
+            next_before_id=messages[0].id if len(messages) == limit else None
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取聊天记录失败: {str(e)}"
+        )
+
+@router.get("/sessions/{session_id}/context", response_model=ChatContextResponse)
+def get_context(
+    session_id: int,
+    max_tokens: Optional[int] = Query(None, ge=1, le=1_000_000, description="未开启压缩时的 token 上限，默认取配置值"),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    获取构建模型上下文用的消息（与实际发送给模型的内容一致）
+
+    - 开启上下文压缩时返回压缩检查点之后的全部消息，压缩过的会话同时返回更早对话的摘要
+    - 未开启压缩时返回最近的消息（总估算 token 数不超过 max_tokens）
+    """
+    try:
+        max_tokens = max_tokens or settings.chat_context_max_tokens
+        chat_service = ChatService(db)
+        session = chat_service.get_session(session_id, user_id)
+        if not session:
+            raise _session_not_found()
+        summary = session_summary(session)
+        messages = context_messages(chat_service, session, max_tokens, user_id)
+        token_count = sum(message.token_count for message in messages)
+
+        return ChatContextResponse(
+            messages=[ChatMessageResponse.from_orm(message) for message in messages],
+            token_count=token_count,
+            max_tokens=max_tokens,
+            truncated=token_count < session.token_total,
+            summary=summary
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取聊天上下文失败: {str(e)}"
+        )
+
+@router.websocket("/sessions/{session_id}/ws")
+async def chat_websocket(websocket: WebSocket, session_id: int):
+    """
+    与 Aura 实时对话（WebSocket）
+
+    - 客户端发送 `{"content": "..."}`，每次一条
+    - 服务端逐段推送 `{"type": "token", "text": ...}`，结束时推送
+      `{"type": "done", "user_message_id", "message_id", "usage"}`；出错时推送 `{"type": "error", "detail"}`
+    - 一轮结束后用户消息和回复一次写入；会话上下文（含关联报告）在进程内缓存，不随每条消息重新加载
+    - 认证：请求头 `Authorization: Bearer <token>` 或查询参数 `?token=`（浏览器无法设置请求头），
+      失败时以 4401（令牌无效）/ 4403（用户已停用）关闭连接
+    - 会话不存在时以 4404 关闭连接
+    """
+    await websocket.accept()
+    try:
+        user = await authenticate_websocket(websocket)
+    except AuthenticationError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=4000 + e.status_code)
+        return
+
+    try:
+        await get_chat_context(session_id, user.id)
+    except LookupError:
+        await websocket.send_json({"type": "error", "detail": SESSION_NOT_FOUND})
+        await websocket.close(code=4404)
+        return
+
+    try:
+        while True:
+            try:
+                data = await websocket.receive_json()
+                message = ChatMessageCreate(content=data.get("content") if isinstance(data, dict) else None)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": f"数据验证失败: {str(e)}"})
+                continue
+
+            try:
+                context = await get_chat_context(session_id, user.id)
+            except LookupError:
+                await websocket.send_json({"type": "error", "detail": SESSION_NOT_FOUND})
+                await websocket.close(code=4404)
+                return
+
+            try:
+                async with aclosing(stream_reply(context, message.content)) as events:
+                    async for event, payload in events:
+                        await websocket.send_json({"type": event, **payload})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json({"type": "error", "detail": f"聊天失败: {str(e)}"})
+
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,109 @@
+# routers/generation_routes.py - 后端报告生成路由
+import json
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from database import SessionLocal
+from services import coalescing
+from services.generation_service import GenerationService
+from services.quota import QuotaExceededError, reading_quota
+from services.auth import get_current_user_id
+from config import settings
+from schemas import GenerationRequest, BatchReadingResponse
+
+# 创建路由器
+router = APIRouter(
+    prefix="/generation",
+    tags=["generation"],
+    responses={404: {"description": "Not found"}}
+)
+
+def _quota_exceeded(e: QuotaExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers=e.headers()
+    )
+
+@router.post("/readings", response_model=BatchReadingResponse)
+async def generate_batch_readings(
+    request: GenerationRequest,
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    由后端生成并保存占卜报告
+    
+    - **request**: 用户信息、问题、选择的方法和输入数据
+    - 各方法报告并发生成，全部完成后生成综合报告，再一次性保存
+    - 返回结构与 POST /batch/readings 相同
+    - 进行中的相同请求（如重复点击、前端重试）会合并，共享一次生成和保存
+    - 每次生成计 1 次占卜额度，额度用尽时返回 429（Retry-After 为额度重置前的秒数）
+    """
+    try:
+        return await coalescing.generate_batch(request, user_id)
+        
+    except QuotaExceededError as e:
+        raise _quota_exceeded(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"报告生成失败: {str(e)}"
+        )
+
+
+@router.post("/readings/stream")
+async def stream_batch_readings(
+    request: GenerationRequest,
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    流式生成并保存占卜报告（Server-Sent Events）
+    
+    - 各方法并发生成，文本片段到达即以 `token` 事件推送（不同方法的事件交错出现）
+    - 报告先以 processing 状态保存，生成完成后变为 completed（`done` 事件），失败为 failed（`error` 事件）
+    - 单项报告全部结束后生成综合报告（`integrated_start` + `token` + `done`），最后推送 `complete`
+    - 开始前扣减 1 次占卜额度，额度用尽时返回 429
+    """
+    try:
+        GenerationService.selected_methods(request)
+        if settings.quota_enabled:
+            await reading_quota.acquire(user_id)
+    except QuotaExceededError as e:
+        raise _quota_exceeded(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
+    
+    return StreamingResponse(
+        _sse_events(request, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _sse_events(request: GenerationRequest, user_id: int):
+    # 响应体在路由函数返回后才开始生成，因此使用独立会话而不是请求级的 get_db 会话
+    db = SessionLocal()
+    generated = False
+    try:
+        async for event, data in GenerationService(db).stream_batch(request, user_id):
+            generated = generated or event == "done"
+            yield format_sse(event, data)
+    except Exception as e:
+        yield format_sse("error", {"detail": f"报告生成失败: {str(e)}"})
+    finally:
+        if not generated and settings.quota_enabled:
+            # 与非流式生成一致：出错、全部方法失败或中途断开且没有生成任何报告时退回额度
+            reading_quota.refund(user_id)
+        db.close()
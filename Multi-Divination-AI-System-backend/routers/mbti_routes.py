@@ -0,0 +1,41 @@
+# routers/mbti_routes.py - MBTI 问卷与计分路由（本地矩阵运算，不调用模型）
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from schemas import MBTIQuestion, MBTIScoreRequest, MBTIScoreResponse
+from services.auth import get_current_user_id
+from services.mbti import QUESTIONS, MBTIScoringError, primary_dimension, score_submissions
+
+# 创建路由器
+router = APIRouter(
+    prefix="/mbti",
+    tags=["mbti"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.get("/questions", response_model=List[MBTIQuestion])
+def get_questions():
+    """获取问卷题目（前 4 题与前端快速测试一致）"""
+    return [
+        MBTIQuestion(id=qid, text=item["text"], dimension=primary_dimension(qid), options=list(item["options"]))
+        for qid, item in QUESTIONS.items()
+    ]
+
+@router.post("/score", response_model=MBTIScoreResponse, dependencies=[Depends(get_current_user_id)])
+def score_quiz(batch: MBTIScoreRequest):
+    """
+    批量计分
+    
+    - **submissions**: 答卷列表（最多 10000 份），题号也可用维度代码（EI/SN/TF/JP）代替每个维度的第一题
+    - 所有答卷组成一个答案矩阵，与权重表一次矩阵乘法得到维度得分、类型和置信度
+    """
+    try:
+        results = score_submissions(batch.submissions)
+        return MBTIScoreResponse(results=results, count=len(results))
+        
+    except MBTIScoringError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
@@ -0,0 +1,34 @@
+# routers/numerology_routes.py - 数字学计算路由（本地确定性计算，不调用模型）
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from schemas import NumerologyBatchRequest, NumerologyBatchResponse
+from services.auth import get_current_user_id
+from services.numerology import numerology_profiles
+
+# 创建路由器
+router = APIRouter(
+    prefix="/numerology",
+    tags=["numerology"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.post("/batch", response_model=NumerologyBatchResponse, dependencies=[Depends(get_current_user_id)])
+def compute_numerology_batch(batch: NumerologyBatchRequest):
+    """
+    批量计算生命灵数、生日数、表达数和主数
+    
+    - **items**: 出生日期和姓名列表（最多 10000 条）
+    - 使用 NumPy 向量化计算，结果顺序与输入一致
+    """
+    try:
+        results = numerology_profiles(
+            [item.birth_date for item in batch.items],
+            [item.name for item in batch.items]
+        )
+        return NumerologyBatchResponse(results=results, count=len(results))
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
@@ -0,0 +1,77 @@
+# routers/palm_routes.py - 手相图片上传与读取路由
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse
+
+from schemas import PalmImageResponse
+from services.auth import get_current_user_id
+from services.blob_store import BlobTooLargeError, get_blob_store
+from services.palm_images import VARIANTS, ImageUploadError, receive_upload
+
+# 创建路由器
+router = APIRouter(
+    prefix="/palm",
+    tags=["palmistry"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.post(
+    "/images",
+    response_model=PalmImageResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(get_current_user_id)]
+)
+async def upload_palm_image(request: Request):
+    """
+    上传手相图片（multipart/form-data，文件字段名为 file）
+    
+    - 请求体流式写入内容寻址存储，相同图片只存一份
+    - 返回的 ref 作为 input_data.palm_image_ref 传给生成接口，代替 base64 图片数据
+    - 支持 JPEG / PNG / WEBP
+    """
+    try:
+        upload = await receive_upload(request)
+        return PalmImageResponse(
+            ref=upload["ref"],
+            size=upload["size"],
+            content_type=upload["content_type"],
+            width=upload["width"],
+            height=upload["height"],
+            thumbnail_url=f"/palm/images/{upload['ref']}/thumbnail",
+            normalized_url=f"/palm/images/{upload['ref']}/normalized"
+        )
+        
+    except BlobTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ImageUploadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"图片上传失败: {str(e)}"
+        )
+
+@router.get("/images/{ref}/{variant}")
+def get_palm_image(ref: str, variant: str):
+    """
+    获取图片的派生版本
+    
+    - **variant**: thumbnail（缩略图）或 normalized（标准化裁剪图）
+    """
+    store = get_blob_store()
+    if variant not in VARIANTS or not store.exists(ref, VARIANTS[variant]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="图片不存在"
+        )
+    # 内容寻址：同一 URL 的内容不会变化
+    return FileResponse(
+        store.path(ref, VARIANTS[variant]),
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
@@ -5,6 +5,7 @@ from typing import List, Optional, Dict, Any
 
 from database import get_db
 from services.persona_service import PersonaService
+from services.auth import get_current_user_id
 from schemas import PersonaCreate, PersonaUpdate, PersonaResponse, MessageResponse
 from constants import ERROR_MESSAGES, SUCCESS_MESSAGES
 
@@ -18,7 +19,8 @@ router = APIRouter(
 @router.post("/", response_model=PersonaResponse)
 def create_persona(
     persona_data: PersonaCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     创建新的角色档案
@@ -29,7 +31,7 @@ def create_persona(
     """
     try:
         persona_service = PersonaService(db)
-        persona = persona_service.create_persona(persona_data)
+        persona = persona_service.create_persona(persona_data, user_id)
         
         return PersonaResponse.from_orm(persona)
         
@@ -46,7 +48,8 @@ def create_persona(
 
 @router.get("/", response_model=List[PersonaResponse])
 def get_user_personas(
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取用户的所有角色档案
@@ -55,7 +58,7 @@ def get_user_personas(
     """
     try:
         persona_service = PersonaService(db)
-        personas = persona_service.get_personas_by_user()
+        personas = persona_service.get_personas_by_user(user_id)
         
         return [PersonaResponse.from_orm(persona) for persona in personas]
         
@@ -69,7 +72,8 @@ def get_user_personas(
 def search_personas(
     name: str = Query(..., description="要搜索的角色名称"),
     fuzzy: bool = Query(False, description="是否启用模糊搜索"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     根据名称搜索角色档案
@@ -81,9 +85,9 @@ def search_personas(
         persona_service = PersonaService(db)
         
         if fuzzy:
-            personas = persona_service.find_personas_by_name_fuzzy(name)
+            personas = persona_service.find_personas_by_name_fuzzy(name, user_id)
         else:
-            persona = persona_service.find_persona_by_name(name)
+            persona = persona_service.find_persona_by_name(name, user_id)
             personas = [persona] if persona else []
         
         return [PersonaResponse.from_orm(persona) for persona in personas]
@@ -97,7 +101,8 @@ def search_personas(
 @router.get("/{persona_id}", response_model=PersonaResponse)
 def get_persona(
     persona_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取指定ID的角色档案
@@ -106,7 +111,7 @@ def get_persona(
     """
     try:
         persona_service = PersonaService(db)
-        persona = persona_service.get_persona_by_id(persona_id)
+        persona = persona_service.get_persona_by_id(persona_id, user_id)
         
         if not persona:
             raise HTTPException(
@@ -127,7 +132,8 @@ def get_persona(
 @router.get("/{persona_id}/stats", response_model=Dict[str, Any])
 def get_persona_with_stats(
     persona_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取带统计信息的角色档案
@@ -137,7 +143,7 @@ def get_persona_with_stats(
     """
     try:
         persona_service = PersonaService(db)
-        result = persona_service.get_persona_with_stats(persona_id)
+        result = persona_service.get_persona_with_stats(persona_id, user_id)
         
         return result
         
@@ -156,7 +162,8 @@ def get_persona_with_stats(
 def update_persona(
     persona_id: int,
     persona_data: PersonaUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     更新角色档案
@@ -166,7 +173,7 @@ def update_persona(
     """
     try:
         persona_service = PersonaService(db)
-        persona = persona_service.update_persona(persona_id, persona_data)
+        persona = persona_service.update_persona(persona_id, persona_data, user_id)
         
         return PersonaResponse.from_orm(persona)
         
@@ -189,7 +196,8 @@ def update_persona(
 @router.delete("/{persona_id}", response_model=MessageResponse)
 def delete_persona(
     persona_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     删除角色档案
@@ -199,7 +207,7 @@ def delete_persona(
     """
     try:
         persona_service = PersonaService(db)
-        success = persona_service.delete_persona(persona_id)
+        success = persona_service.delete_persona(persona_id, user_id)
         
         if success:
             return MessageResponse(
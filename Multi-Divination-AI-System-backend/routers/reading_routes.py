@@ -2,10 +2,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
+from datetime import date
 
 from database import get_db
 from services.reading_service import ReadingService
-from schemas import SingleReadingCreate, ReadingUpdate, ReadingResponse, MessageResponse
+from services.quota import QuotaExceededError, reading_quota
+from services.auth import get_current_user_id
+from config import settings
+from schemas import (
+    SingleReadingCreate, ReadingUpdate, ReadingResponse, MessageResponse,
+    ReadingBulkUpdate, ReadingBulkUpdateResponse
+)
 from models import DivinationMethod
 from constants import ERROR_MESSAGES, SUCCESS_MESSAGES
 
@@ -16,29 +23,55 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
+def _quota_exceeded(e: QuotaExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers=e.headers()
+    )
+
+def _refund_quota(user_id: int):
+    if settings.quota_enabled:
+        reading_quota.refund(user_id)
+
 @router.post("/", response_model=ReadingResponse)
 def create_reading(
     reading_data: SingleReadingCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     创建单个占卜报告
     
     - **reading_data**: 包含占卜报告的完整信息
     - 可以指定 persona_id 关联到特定角色档案
+    - 计 1 次占卜额度，额度用尽时返回 429
     """
+    try:
+        if settings.quota_enabled:
+            reading_quota.consume(user_id)
+    except QuotaExceededError as e:
+        raise _quota_exceeded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建占卜报告失败: {str(e)}"
+        )
+
     try:
         reading_service = ReadingService(db)
-        reading = reading_service.create_reading(reading_data)
+        reading = reading_service.create_reading(reading_data, user_id)
         
         return ReadingResponse.from_orm(reading)
         
     except ValueError as e:
+        _refund_quota(user_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"数据验证失败: {str(e)}"
         )
     except Exception as e:
+        _refund_quota(user_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"创建占卜报告失败: {str(e)}"
@@ -48,25 +81,39 @@ def create_reading(
 def get_user_readings(
     persona_id: Optional[int] = Query(None, description="按角色档案ID过滤"),
     method: Optional[DivinationMethod] = Query(None, description="按占卜方法过滤"),
+    spread_type: Optional[str] = Query(None, max_length=32, description="按塔罗牌阵过滤"),
+    mbti_type: Optional[str] = Query(None, pattern=r'^[EIei][SNsn][TFtf][JPjp]$', description="按MBTI类型过滤"),
+    birth_date_from: Optional[date] = Query(None, description="出生日期下限（含）"),
+    birth_date_to: Optional[date] = Query(None, description="出生日期上限（含）"),
+    created_via: Optional[str] = Query(None, max_length=32, description="按创建途径过滤"),
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取用户的占卜报告列表
     
     - **persona_id**: 可选，按角色档案ID过滤
     - **method**: 可选，按占卜方法过滤
+    - **spread_type** / **mbti_type** / **birth_date_from** / **birth_date_to** / **created_via**: 可选，
+      按输入数据中的常用字段过滤
     - **limit**: 返回数量限制（1-100）
     - **offset**: 偏移量，用于分页
     """
     try:
         reading_service = ReadingService(db)
         readings = reading_service.get_readings_by_user(
+            user_id=user_id,
             persona_id=persona_id,
             method=method,
             limit=limit,
-            offset=offset
+            offset=offset,
+            spread_type=spread_type,
+            mbti_type=mbti_type,
+            birth_date_from=birth_date_from,
+            birth_date_to=birth_date_to,
+            created_via=created_via
         )
         
         return [ReadingResponse.from_orm(reading) for reading in readings]
@@ -80,7 +127,8 @@ def get_user_readings(
 @router.get("/{reading_id}", response_model=ReadingResponse)
 def get_reading(
     reading_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取指定ID的占卜报告
@@ -89,7 +137,7 @@ def get_reading(
     """
     try:
         reading_service = ReadingService(db)
-        reading = reading_service.get_reading_by_id(reading_id)
+        reading = reading_service.get_reading_by_id(reading_id, user_id)
         
         if not reading:
             raise HTTPException(
@@ -110,7 +158,8 @@ def get_reading(
 @router.get("/{reading_id}/details", response_model=Dict[str, Any])
 def get_reading_with_sources(
     reading_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取带关联信息的占卜报告
@@ -121,7 +170,7 @@ def get_reading_with_sources(
     """
     try:
         reading_service = ReadingService(db)
-        result = reading_service.get_reading_with_sources(reading_id)
+        result = reading_service.get_reading_with_sources(reading_id, user_id)
         
         return result
         
@@ -136,11 +185,54 @@ def get_reading_with_sources(
             detail=f"获取占卜报告详情失败: {str(e)}"
         )
 
+@router.patch("/bulk", response_model=ReadingBulkUpdateResponse)
+def bulk_update_readings(
+    bulk_data: ReadingBulkUpdate,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    批量更新占卜报告（批量收藏、批量清除评分等）
+    
+    - **reading_ids**: 要更新的报告ID列表
+    - **persona_id** / **method**: 按过滤条件更新（可与ID列表组合）
+    - **update**: 要应用的字段（收藏、评分、反馈）
+    - 返回每个报告ID的更新结果；未更新的ID带错误原因：报告未找到，或（与过滤条件组合时）报告不符合筛选条件
+    """
+    try:
+        reading_service = ReadingService(db)
+        results = reading_service.bulk_update_readings(
+            bulk_data.update,
+            reading_ids=bulk_data.reading_ids,
+            persona_id=bulk_data.persona_id,
+            method=DivinationMethod(bulk_data.method.value) if bulk_data.method else None,
+            user_id=user_id
+        )
+        
+        return ReadingBulkUpdateResponse(
+            updated_count=len([r for r in results if r.success]),
+            results=results,
+            success=True,
+            message=SUCCESS_MESSAGES["BATCH_UPDATE_SUCCESS"]
+        )
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量更新占卜报告失败: {str(e)}"
+        )
+
 @router.put("/{reading_id}", response_model=ReadingResponse)
 def update_reading(
     reading_id: int,
     reading_data: ReadingUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     更新占卜报告
@@ -150,7 +242,7 @@ def update_reading(
     """
     try:
         reading_service = ReadingService(db)
-        reading = reading_service.update_reading(reading_id, reading_data)
+        reading = reading_service.update_reading(reading_id, reading_data, user_id)
         
         return ReadingResponse.from_orm(reading)
         
@@ -173,7 +265,8 @@ def update_reading(
 @router.delete("/{reading_id}", response_model=MessageResponse)
 def delete_reading(
     reading_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     删除占卜报告
@@ -182,7 +275,7 @@ def delete_reading(
     """
     try:
         reading_service = ReadingService(db)
-        success = reading_service.delete_reading(reading_id)
+        success = reading_service.delete_reading(reading_id, user_id)
         
         if success:
             return MessageResponse(
@@ -210,7 +303,8 @@ def delete_reading(
 def get_favorite_readings(
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取用户收藏的占卜报告
@@ -222,7 +316,7 @@ def get_favorite_readings(
         reading_service = ReadingService(db)
         
         # 获取用户所有报告，然后过滤收藏的
-        readings = reading_service.get_readings_by_user(limit=1000)  # 先获取足够多的报告
+        readings = reading_service.get_readings_by_user(user_id, limit=1000)  # 先获取足够多的报告
         favorite_readings = [r for r in readings if r.is_favorite]
         
         # 手动分页
@@ -241,7 +335,8 @@ def get_readings_by_method(
     method: DivinationMethod,
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
 ):
     """
     获取指定占卜方法的报告
@@ -253,6 +348,7 @@ def get_readings_by_method(
     try:
         reading_service = ReadingService(db)
         readings = reading_service.get_readings_by_user(
+            user_id=user_id,
             method=method,
             limit=limit,
             offset=offset
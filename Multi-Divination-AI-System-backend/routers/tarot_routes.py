@@ -0,0 +1,60 @@
+# routers/tarot_routes.py - 塔罗抽牌路由
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Dict, List
+
+from database import get_db
+from schemas import TarotDrawRequest, TarotDrawResponse, TarotCardStat
+from services.reading_service import ReadingService
+from services.auth import get_current_user_id
+from services.tarot import SPREADS, TarotDrawError, draw
+
+# 创建路由器
+router = APIRouter(
+    prefix="/tarot",
+    tags=["tarot"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.get("/spreads", response_model=Dict[str, List[str]])
+def get_spreads():
+    """
+    获取支持的牌阵及各位置含义
+    """
+    return {name: list(positions) for name, positions in SPREADS.items()}
+
+@router.post("/draws", response_model=TarotDrawResponse, dependencies=[Depends(get_current_user_id)])
+def create_draw(request: TarotDrawRequest):
+    """
+    服务端洗牌抽牌
+    
+    - **spread_type**: 牌阵
+    - **seed**: 不提供时生成新种子；提供时复现同一次抽牌
+    - **picks**: 用户从洗好的牌堆中选择的位置，默认取牌堆顶部
+    - 生成报告时在 input_data 中传入 tarot_seed、spread_type、card_positions，服务端会复现并保存这次抽牌
+    """
+    try:
+        return draw(request.spread_type, request.seed, request.picks)
+        
+    except TarotDrawError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"数据验证失败: {str(e)}"
+        )
+
+@router.get("/card-stats", response_model=List[TarotCardStat])
+def get_card_stats(
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    获取当前用户各张牌的抽取次数和逆位次数（按次数降序）
+    """
+    try:
+        return ReadingService(db).get_tarot_card_stats(user_id)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取抽牌统计失败: {str(e)}"
+        )
@@ -1,10 +1,12 @@
 # schemas.py - 清晰版本，按功能分组
 from pydantic import BaseModel, Field, validator
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 import re
 
+from services.tarot import resolve_draw
+
 # ===== 枚举类型 =====
 class DivinationMethodEnum(str, Enum):
     LIFEPATH = "LifePathNumber"
@@ -14,8 +16,16 @@ class DivinationMethodEnum(str, Enum):
     TAROT = "Tarot"
     INTEGRATED = "Integrated"
 
+class ChatSessionTypeEnum(str, Enum):
+    GENERAL = "general"
+    READING_DISCUSSION = "reading_discussion"
+    GUIDANCE = "guidance"
+
 class ReadingStatusEnum(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
     COMPLETED = "completed"
+    FAILED = "failed"
     SAVED = "saved"
 
 # ===== 用户相关 =====
@@ -125,6 +135,10 @@ class SingleReadingCreate(BaseModel):
     ai_model_used: str = "gemini-pro"
     processing_time: Optional[int] = None
     confidence_score: Optional[int] = Field(None, ge=1, le=100)
+    
+    @validator('input_data')
+    def validate_input_data(cls, v, values):
+        return validate_tarot_input(v, values)
 
 class ReadingUpdate(BaseModel):
     """更新占卜报告"""
@@ -132,6 +146,29 @@ class ReadingUpdate(BaseModel):
     user_rating: Optional[int] = Field(None, ge=1, le=5)
     user_feedback: Optional[str] = Field(None, max_length=1000)
 
+class ReadingBulkUpdate(BaseModel):
+    """批量更新占卜报告（按ID列表或按过滤条件）"""
+    reading_ids: Optional[List[int]] = Field(None, min_items=1, max_items=500)
+    persona_id: Optional[int] = None
+    method: Optional[DivinationMethodEnum] = None
+    update: ReadingUpdate
+
+class ReadingBulkUpdateItem(BaseModel):
+    """批量更新的单条结果"""
+    id: int
+    success: bool
+    is_favorite: Optional[bool] = None
+    user_rating: Optional[int] = None
+    user_feedback: Optional[str] = None
+    error: Optional[str] = None
+
+class ReadingBulkUpdateResponse(BaseModel):
+    """批量更新响应"""
+    updated_count: int
+    results: List[ReadingBulkUpdateItem]
+    success: bool = True
+    message: str = "批量更新成功"
+
 class ReadingResponse(BaseModel):
     """占卜报告响应"""
     id: int
@@ -143,6 +180,10 @@ class ReadingResponse(BaseModel):
     status: ReadingStatusEnum
     ai_model_used: Optional[str]
     processing_time: Optional[int]
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    latency_ms: Optional[int] = None
+    confidence_score: Optional[int] = None
     is_favorite: bool
     user_rating: Optional[int]
     created_at: datetime
@@ -175,6 +216,13 @@ class IntegratedReadingCreate(BaseModel):
     ai_model_used: str = "gemini-pro"
 
 # ===== 批量操作相关 =====
+def validate_tarot_input(input_data: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+    """选择了塔罗时校验 tarot_seed / spread_type / card_positions 能复现抽牌（TarotDrawError 是 ValueError）"""
+    methods = values.get('selected_methods') or [values.get('method')]
+    if input_data and DivinationMethodEnum.TAROT in methods:
+        resolve_draw(input_data)
+    return input_data
+
 class BatchReadingCreate(BaseModel):
     """批量创建报告（前端完成AI生成后一次性发送）"""
     user_name: str = Field(..., min_length=1, max_length=255)
@@ -186,6 +234,25 @@ class BatchReadingCreate(BaseModel):
     character_archetypes: Optional[List[str]] = None
     ai_model_used: str = "gemini-pro"
     total_processing_time: Optional[int] = None
+    # 各方法的用量 {方法名: {prompt_tokens, output_tokens, latency_ms}}，缺省时按提示词模板估算
+    token_usage: Optional[Dict[str, Dict[str, int]]] = None
+    
+    @validator('input_data')
+    def validate_input_data(cls, v, values):
+        return validate_tarot_input(v, values)
+
+class GenerationRequest(BaseModel):
+    """后端生成报告（由后端调用模型，生成后批量保存）"""
+    user_name: str = Field(..., min_length=1, max_length=255)
+    primary_question: str = Field(..., min_length=5, max_length=1000)
+    selected_methods: List[DivinationMethodEnum] = Field(..., min_items=1, max_items=5)
+    input_data: Dict[str, Any] = {}
+    generate_integrated: bool = True
+    use_cache: bool = True  # False 时跳过生成结果缓存，强制重新生成
+    
+    @validator('input_data')
+    def validate_input_data(cls, v, values):
+        return validate_tarot_input(v, values)
 
 class BatchReadingResponse(BaseModel):
     """批量创建响应"""
@@ -195,6 +262,168 @@ class BatchReadingResponse(BaseModel):
     success: bool = True
     message: str = "所有报告已保存成功"
 
+# ===== 本地计算引擎相关 =====
+class NumerologyInput(BaseModel):
+    """单个用户的数字学输入"""
+    birth_date: date
+    name: Optional[str] = Field(None, max_length=255)
+
+class NumerologyBatchRequest(BaseModel):
+    """批量数字学计算"""
+    items: List[NumerologyInput] = Field(..., min_items=1, max_items=10000)
+
+class NumerologyProfile(BaseModel):
+    """数字学计算结果"""
+    life_path_number: int
+    birthday_number: int
+    expression_number: Optional[int] = None
+    master_numbers: List[int] = []
+
+class NumerologyBatchResponse(BaseModel):
+    """批量数字学计算响应"""
+    results: List[NumerologyProfile]
+    count: int
+
+class AstrologyInput(BaseModel):
+    """单个星盘的出生信息"""
+    birth_date: date
+    birth_time: Optional[str] = Field(None, pattern=r'^\d{1,2}:\d{2}$')
+    birth_location: Optional[str] = Field(None, max_length=255)
+    birth_latitude: Optional[float] = Field(None, ge=-90, le=90)
+    birth_longitude: Optional[float] = Field(None, ge=-180, le=180)
+    birth_timezone: Optional[str] = Field(None, max_length=64)
+
+class AstrologyBatchRequest(BaseModel):
+    """批量星盘计算：直接给出出生信息，或给出角色档案ID"""
+    items: List[AstrologyInput] = Field([], max_items=10000)
+    persona_ids: List[int] = Field([], max_items=1000)
+
+class AstrologyBatchResponse(BaseModel):
+    """批量星盘计算响应；无法计算的条目为 null"""
+    results: List[Optional[Dict[str, Any]]]
+    persona_results: Dict[int, Optional[Dict[str, Any]]] = {}
+    count: int
+
+class TarotDrawRequest(BaseModel):
+    """服务端抽牌；提供 seed 时复现之前的抽牌"""
+    spread_type: str = "three_card"
+    seed: Optional[str] = Field(None, min_length=32, max_length=32)
+    picks: Optional[List[int]] = Field(None, max_items=10)  # 用户从牌堆中选择的位置
+
+class TarotCard(BaseModel):
+    position: str
+    card: int
+    name: str
+    reversed: bool
+
+class TarotDrawResponse(BaseModel):
+    """抽牌结果；生成报告时在 input_data 中传入 tarot_seed / spread_type / card_positions(=picks) 即可复现"""
+    spread_type: str
+    seed: str
+    picks: List[int]
+    code: str
+    cards: List[TarotCard]
+
+class TarotCardStat(BaseModel):
+    """单张牌的抽取统计"""
+    card: int
+    name: str
+    count: int
+    reversed_count: int
+
+class MBTIQuestion(BaseModel):
+    """MBTI 问卷题目；options[0] 对应 dimension 的第一个字母"""
+    id: str
+    text: str
+    dimension: str
+    options: List[str]
+
+class MBTIScoreRequest(BaseModel):
+    """批量 MBTI 计分：每份答卷为 {题号: 答案}，答案为维度字母或 -1 ~ 1 的数值"""
+    submissions: List[Dict[str, Any]] = Field(..., min_items=1, max_items=10000)
+
+class MBTIScore(BaseModel):
+    """单份答卷的计分结果"""
+    mbti_type: str
+    scores: Dict[str, float]
+    confidence: int
+    answered: int
+
+class MBTIScoreResponse(BaseModel):
+    """批量计分响应；未作答任何题目的答卷为 null"""
+    results: List[Optional[MBTIScore]]
+    count: int
+
+class PalmImageResponse(BaseModel):
+    """手相图片上传结果；生成报告时在 input_data 中传入 palm_image_ref=ref"""
+    ref: str
+    size: int
+    content_type: str
+    width: int
+    height: int
+    thumbnail_url: str
+    normalized_url: str
+
+# ===== 聊天相关 =====
+class ChatSessionCreate(BaseModel):
+    """创建聊天会话"""
+    title: Optional[str] = Field(None, max_length=255)
+    session_type: ChatSessionTypeEnum = ChatSessionTypeEnum.GENERAL
+    related_reading_id: Optional[int] = None
+    persona_id: Optional[int] = None
+    ai_personality: str = Field("aura", max_length=50)
+
+class ChatSessionResponse(BaseModel):
+    """聊天会话响应"""
+    id: int
+    title: Optional[str]
+    session_type: ChatSessionTypeEnum
+    related_reading_id: Optional[int]
+    persona_id: Optional[int]
+    ai_personality: Optional[str]
+    is_active: bool
+    message_count: int
+    token_total: int
+    created_at: datetime
+    last_message_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+class ChatMessageCreate(BaseModel):
+    """追加聊天消息"""
+    content: str = Field(..., min_length=1, max_length=20000)
+    is_user_message: bool = True
+    message_type: str = Field("text", max_length=50)
+    message_metadata: Optional[Dict[str, Any]] = None
+
+class ChatMessageResponse(BaseModel):
+    """聊天消息响应"""
+    id: int
+    session_id: int
+    content: str
+    is_user_message: bool
+    message_type: Optional[str]
+    message_metadata: Optional[Dict[str, Any]]
+    token_count: Optional[int]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ChatMessagePage(BaseModel):
+    """一页聊天记录（按时间正序）；next_before_id 为取更早一页的游标，没有更早的消息时为 null"""
+    messages: List[ChatMessageResponse]
+    next_before_id: Optional[int] = None
+
+class ChatContextResponse(BaseModel):
+    """最近 max_tokens 以内、压缩检查点之后的消息（按时间正序），以及更早对话的摘要"""
+    messages: List[ChatMessageResponse]
+    token_count: int
+    max_tokens: int
+    truncated: bool  # 是否还有更早的消息未包含
+    summary: Optional[str] = None
+
 # ===== 通用响应 =====
 class MessageResponse(BaseModel):
     """通用消息响应"""
@@ -0,0 +1,224 @@
+# services/astrology.py - 本地星盘计算（太阳/月亮/上升星座与行星位置，支持批量计算）
+"""
+- 行星黄经来自 services.ephemeris 的内存映射星历表（线性插值）
+- 上升点由地方恒星时、出生地纬度和黄赤交角直接计算
+- 出生地优先使用 input_data 中的 birth_latitude / birth_longitude / birth_timezone，
+  否则在内置城市表中查找（不访问网络）；找不到地点时按 UTC 计算，不给出上升星座
+- 未提供出生时间时按当地正午计算，不给出上升星座，月亮星座可能不准确（approximate=True）
+"""
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+from services.ephemeris import BODIES, DAYS, START_JD, get_ephemeris, obliquity
+from services.numerology import parse_birth_date
+
+ZODIAC_SIGNS = (
+    "Aries", "Taurus", "Gemini", "Cancer", "Leo", "Virgo",
+    "Libra", "Scorpio", "Sagittarius", "Capricorn", "Aquarius", "Pisces"
+)
+
+# 常见出生地：名称（小写） -> (纬度, 经度, IANA 时区)
+CITY_COORDINATES: Dict[str, Tuple[float, float, str]] = {
+    "beijing": (39.9042, 116.4074, "Asia/Shanghai"),
+    "shanghai": (31.2304, 121.4737, "Asia/Shanghai"),
+    "guangzhou": (23.1291, 113.2644, "Asia/Shanghai"),
+    "shenzhen": (22.5431, 114.0579, "Asia/Shanghai"),
+    "chengdu": (30.5728, 104.0668, "Asia/Shanghai"),
+    "chongqing": (29.5630, 106.5516, "Asia/Shanghai"),
+    "hangzhou": (30.2741, 120.1551, "Asia/Shanghai"),
+    "nanjing": (32.0603, 118.7969, "Asia/Shanghai"),
+    "wuhan": (30.5928, 114.3055, "Asia/Shanghai"),
+    "xi'an": (34.3416, 108.9398, "Asia/Shanghai"),
+    "tianjin": (39.3434, 117.3616, "Asia/Shanghai"),
+    "hong kong": (22.3193, 114.1694, "Asia/Hong_Kong"),
+    "macau": (22.1987, 113.5439, "Asia/Macau"),
+    "taipei": (25.0330, 121.5654, "Asia/Taipei"),
+    "kaohsiung": (22.6273, 120.3014, "Asia/Taipei"),
+    "singapore": (1.3521, 103.8198, "Asia/Singapore"),
+    "kuala lumpur": (3.1390, 101.6869, "Asia/Kuala_Lumpur"),
+    "tokyo": (35.6762, 139.6503, "Asia/Tokyo"),
+    "osaka": (34.6937, 135.5023, "Asia/Tokyo"),
+    "seoul": (37.5665, 126.9780, "Asia/Seoul"),
+    "bangkok": (13.7563, 100.5018, "Asia/Bangkok"),
+    "mumbai": (19.0760, 72.8777, "Asia/Kolkata"),
+    "new delhi": (28.6139, 77.2090, "Asia/Kolkata"),
+    "dubai": (25.2048, 55.2708, "Asia/Dubai"),
+    "london": (51.5074, -0.1278, "Europe/London"),
+    "paris": (48.8566, 2.3522, "Europe/Paris"),
+    "berlin": (52.5200, 13.4050, "Europe/Berlin"),
+    "madrid": (40.4168, -3.7038, "Europe/Madrid"),
+    "rome": (41.9028, 12.4964, "Europe/Rome"),
+    "moscow": (55.7558, 37.6173, "Europe/Moscow"),
+    "new york": (40.7128, -74.0060, "America/New_York"),
+    "boston": (42.3601, -71.0589, "America/New_York"),
+    "chicago": (41.8781, -87.6298, "America/Chicago"),
+    "los angeles": (34.0522, -118.2437, "America/Los_Angeles"),
+    "san francisco": (37.7749, -122.4194, "America/Los_Angeles"),
+    "seattle": (47.6062, -122.3321, "America/Los_Angeles"),
+    "toronto": (43.6532, -79.3832, "America/Toronto"),
+    "vancouver": (49.2827, -123.1207, "America/Vancouver"),
+    "mexico city": (19.4326, -99.1332, "America/Mexico_City"),
+    "sao paulo": (-23.5505, -46.6333, "America/Sao_Paulo"),
+    "sydney": (-33.8688, 151.2093, "Australia/Sydney"),
+    "melbourne": (-37.8136, 144.9631, "Australia/Melbourne"),
+    "auckland": (-36.8485, 174.7633, "Pacific/Auckland"),
+}
+
+CITY_ALIASES = {
+    "北京": "beijing", "上海": "shanghai", "广州": "guangzhou", "深圳": "shenzhen", "成都": "chengdu",
+    "重庆": "chongqing", "杭州": "hangzhou", "南京": "nanjing", "武汉": "wuhan", "西安": "xi'an",
+    "天津": "tianjin", "香港": "hong kong", "澳门": "macau", "台北": "taipei", "臺北": "taipei",
+    "高雄": "kaohsiung", "新加坡": "singapore", "吉隆坡": "kuala lumpur", "东京": "tokyo", "大阪": "osaka",
+    "首尔": "seoul", "曼谷": "bangkok", "伦敦": "london", "巴黎": "paris", "柏林": "berlin", "莫斯科": "moscow",
+    "纽约": "new york", "波士顿": "boston", "芝加哥": "chicago", "洛杉矶": "los angeles", "旧金山": "san francisco",
+    "西雅图": "seattle", "多伦多": "toronto", "温哥华": "vancouver", "悉尼": "sydney", "墨尔本": "melbourne",
+    "xian": "xi'an", "nyc": "new york", "la": "los angeles", "sf": "san francisco",
+}
+
+_UNIX_EPOCH_JD = 2440587.5
+
+
+def sign_of(longitude: float) -> str:
+    return ZODIAC_SIGNS[int(longitude // 30) % 12]
+
+
+# ===== 出生地与时间 =====
+
+def resolve_location(input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    解析出生地，返回 {"latitude", "longitude", "timezone", "source"}；无法解析返回 None
+
+    显式坐标优先，其次 birth_city / birth_location 在城市表中的匹配（取逗号前的部分）。
+    """
+    latitude, longitude = input_data.get("birth_latitude"), input_data.get("birth_longitude")
+    if latitude is not None and longitude is not None:
+        try:
+            return {
+                "latitude": float(latitude),
+                "longitude": float(longitude),
+                "timezone": input_data.get("birth_timezone"),
+                "source": "input"
+            }
+        except (TypeError, ValueError):
+            pass
+
+    for key in ("birth_city", "birth_location"):
+        value = input_data.get(key)
+        if not value:
+            continue
+        name = " ".join(str(value).replace("，", ",").split(",")[0].lower().split())
+        name = CITY_ALIASES.get(name, name)
+        if name in CITY_COORDINATES:
+            latitude, longitude, timezone = CITY_COORDINATES[name]
+            return {"latitude": latitude, "longitude": longitude, "timezone": timezone, "source": "city_table"}
+    return None
+
+
+def parse_birth_time(value: Any) -> Optional[dt_time]:
+    if not value:
+        return None
+    try:
+        hour, minute = str(value).strip().split(":")[:2]
+        return dt_time(int(hour), int(minute))
+    except (ValueError, TypeError):
+        return None
+
+
+def to_julian_day(
+    birth_date: date,
+    birth_time: Optional[dt_time],
+    location: Optional[Dict[str, Any]]
+) -> float:
+    """当地出生时间转为 UT 儒略日；没有时区时按经度近似（每 15° 一小时），没有地点时按 UTC"""
+    local = datetime.combine(birth_date, birth_time or dt_time(12, 0))
+    offset = timedelta(0)
+    if location is not None:
+        offset = timedelta(hours=round(location["longitude"] / 15))
+        if location.get("timezone"):
+            try:
+                offset = local.replace(tzinfo=ZoneInfo(location["timezone"])).utcoffset()
+            except (ZoneInfoNotFoundError, ValueError):
+                pass
+    utc = local - offset
+    return _UNIX_EPOCH_JD + (utc - datetime(1970, 1, 1)).total_seconds() / 86400
+
+
+def ascendants(jd: np.ndarray, latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """上升点黄经（度），参数均可为数组"""
+    gmst = 280.46061837 + 360.98564736629 * (jd - 2451545.0)
+    ramc = np.radians((gmst + longitude) % 360)
+    eps = np.radians(obliquity(jd))
+    lat = np.radians(latitude)
+    asc = np.arctan2(np.cos(ramc), -(np.sin(ramc) * np.cos(eps) + np.tan(lat) * np.sin(eps)))
+    return np.degrees(asc) % 360
+
+
+# ===== 星盘 =====
+
+def _chart(longitudes: np.ndarray, ascendant: Optional[float], time_known: bool, location: Optional[Dict[str, Any]]):
+    planets = {
+        body: {"longitude": round(float(lon), 2), "sign": sign_of(lon), "degree": round(float(lon % 30), 2)}
+        for body, lon in zip(BODIES, longitudes)
+    }
+    return {
+        "sun_sign": planets["Sun"]["sign"],
+        "moon_sign": planets["Moon"]["sign"],
+        "rising_sign": sign_of(ascendant) if ascendant is not None else None,
+        "ascendant": round(float(ascendant), 2) if ascendant is not None else None,
+        "planets": planets,
+        "approximate": not time_known or location is None,
+        "location_source": location["source"] if location else None,
+    }
+
+
+def _prepare(input_data: Dict[str, Any]):
+    birth_date = parse_birth_date(input_data.get("birth_date"))
+    if birth_date is None:
+        return None
+    birth_time = parse_birth_time(input_data.get("birth_time"))
+    location = resolve_location(input_data)
+    return to_julian_day(birth_date, birth_time, location), birth_time is not None, location
+
+
+def natal_chart(input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """根据 birth_date / birth_time / 出生地计算星盘；出生日期无效或超出 1900-2100 时返回 None"""
+    return natal_charts([input_data])[0]
+
+
+def natal_charts(items: Sequence[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    批量计算星盘，结果与输入一一对应
+
+    所有有效输入的星历插值和上升点计算各是一次数组运算。
+    """
+    prepared = [_prepare(item) for item in items]
+    valid = [
+        index for index, value in enumerate(prepared)
+        if value is not None and START_JD <= value[0] < START_JD + DAYS - 1
+    ]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    if not valid:
+        return results
+
+    jd = np.array([prepared[index][0] for index in valid])
+    longitudes = get_ephemeris().longitudes(jd)
+
+    # 有出生时间和地点的才计算上升点
+    with_asc = [row for row, index in enumerate(valid) if prepared[index][1] and prepared[index][2] is not None]
+    asc = np.full(len(valid), np.nan)
+    if with_asc:
+        asc[with_asc] = ascendants(
+            jd[with_asc],
+            np.array([prepared[valid[row]][2]["latitude"] for row in with_asc]),
+            np.array([prepared[valid[row]][2]["longitude"] for row in with_asc]),
+        )
+
+    for row, index in enumerate(valid):
+        _, time_known, location = prepared[index]
+        results[index] = _chart(
+            longitudes[row], None if np.isnan(asc[row]) else asc[row], time_known, location
+        )
+    return results
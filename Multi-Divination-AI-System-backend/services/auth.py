@@ -0,0 +1,264 @@
+# services/auth.py - JWT 认证：已验证令牌缓存与用户缓存
+"""
+- 请求携带 Authorization: Bearer <JWT>（settings.secret_key / algorithm 签名），sub 为用户ID
+- 验证通过的令牌按指纹缓存在进程内（LRU），直到令牌过期；同一令牌的后续请求不再验签、解析
+- 用户状态（是否启用、角色）按用户ID缓存 auth_user_cache_ttl 秒，不存在或已停用的用户同样缓存；
+  停用用户最迟在 TTL 后被拒绝
+- 认证实现可替换：set_authenticator() 注入其它实现（如外部身份服务），路由只依赖 get_current_user_id
+- 默认要求认证（auth_required=True），此时必须设置 SECRET_KEY，否则应用拒绝启动；
+  仅本地开发、测试和基准测试显式设置 AUTH_REQUIRED=false，没有令牌的请求按测试用户（TEST_USER_ID）处理，
+  携带的令牌照常校验
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, WebSocket, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+from config import settings
+from constants import TEST_USER_ID
+from database import SessionLocal
+from models import User, UserRole
+
+INVALID_TOKEN = "无效或已过期的访问令牌"
+USER_NOT_FOUND = "用户不存在"
+USER_DISABLED = "用户已停用"
+
+
+class AuthenticationError(Exception):
+    """认证失败；status_code 为对应的 HTTP 状态码"""
+
+    def __init__(self, message: str, status_code: int = status.HTTP_401_UNAUTHORIZED):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    id: int
+    role: UserRole = UserRole.FREE
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRole.ADMIN
+
+
+class TokenCache:
+    """已验证令牌 -> 用户ID（进程内 LRU，条目在令牌过期时失效）"""
+
+    def __init__(self, max_tokens: int = 10000, clock=time.time):
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(token: str) -> str:
+        # 不在内存中保留原始令牌
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[int]:
+        key = self.fingerprint(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, user_id: int, expires_at: float) -> None:
+        key = self.fingerprint(token)
+        with self._lock:
+            self._entries[key] = (expires_at, user_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_tokens:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class UserCache:
+    """用户ID -> AuthenticatedUser（None 表示不存在或已停用），进程内 LRU，带 TTL"""
+
+    def __init__(self, ttl: float = 60.0, max_users: int = 10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, Optional[AuthenticatedUser], Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[Tuple[Optional[AuthenticatedUser], Optional[str]]]:
+        """命中时返回 (用户, 拒绝原因)，未命中返回 None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= self.clock():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, user_id: int, user: Optional[AuthenticatedUser], reason: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries[user_id] = (self.clock() + self.ttl, user, reason)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """用户被停用或角色变更后调用，本进程立即生效"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class JWTAuthenticator:
+    def __init__(
+        self,
+        secret_key: str,
+        algorithm: str = "HS256",
+        expire_minutes: int = 60 * 24,
+        token_cache: Optional[TokenCache] = None,
+        user_cache: Optional[UserCache] = None,
+        session_factory=SessionLocal
+    ):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.expire_minutes = expire_minutes
+        self.tokens = token_cache or TokenCache()
+        self.users = user_cache or UserCache()
+        self.session_factory = session_factory
+
+    def create_access_token(self, user_id: int, expires_delta: Optional[timedelta] = None) -> str:
+        now = datetime.utcnow()
+        expire = now + (expires_delta or timedelta(minutes=self.expire_minutes))
+        return jwt.encode(
+            {"sub": str(user_id), "iat": now, "exp": expire},
+            self.secret_key,
+            algorithm=self.algorithm
+        )
+
+    def verify_token(self, token: str) -> int:
+        """验签并返回用户ID（命中缓存时不再验签）"""
+        user_id = self.tokens.get(token)
+        if user_id is not None:
+            return user_id
+        try:
+            claims = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            user_id = int(claims["sub"])
+            expires_at = float(claims["exp"])
+        except (JWTError, KeyError, TypeError, ValueError):
+            raise AuthenticationError(INVALID_TOKEN)
+        self.tokens.put(token, user_id, expires_at)
+        return user_id
+
+    def load_user(self, user_id: int) -> AuthenticatedUser:
+        """读取用户并写入缓存（同步调用，异步代码中放到线程里执行）"""
+        db = self.session_factory()
+        try:
+            row = db.query(User.id, User.role, User.is_active).filter(User.id == user_id).first()
+        finally:
+            db.close()
+
+        if row is None:
+            self.users.put(user_id, None, USER_NOT_FOUND)
+            raise AuthenticationError(USER_NOT_FOUND)
+        if not row.is_active:
+            self.users.put(user_id, None, USER_DISABLED)
+            raise AuthenticationError(USER_DISABLED, status.HTTP_403_FORBIDDEN)
+        user = AuthenticatedUser(row.id, row.role or UserRole.FREE)
+        self.users.put(user_id, user)
+        return user
+
+    async def authenticate(self, token: str) -> AuthenticatedUser:
+        """令牌和用户都命中缓存时不访问数据库、不切换线程"""
+        user_id = self.verify_token(token)
+        cached = self.users.get(user_id)
+        if cached is None:
+            return await asyncio.to_thread(self.load_user, user_id)
+        user, reason = cached
+        if user is None:
+            raise AuthenticationError(
+                reason,
+                status.HTTP_403_FORBIDDEN if reason == USER_DISABLED else status.HTTP_401_UNAUTHORIZED
+            )
+        return user
+
+
+_authenticator: Optional[JWTAuthenticator] = None
+
+
+def get_authenticator() -> JWTAuthenticator:
+    """全局共享的认证器"""
+    global _authenticator
+    if _authenticator is None:
+        _authenticator = JWTAuthenticator(
+            secret_key=settings.secret_key,
+            algorithm=settings.algorithm,
+            expire_minutes=settings.access_token_expire_minutes,
+            token_cache=TokenCache(settings.auth_token_cache_size),
+            user_cache=UserCache(settings.auth_user_cache_ttl, settings.auth_user_cache_size)
+        )
+    return _authenticator
+
+
+def set_authenticator(authenticator: Optional[JWTAuthenticator]) -> None:
+    """替换全局认证器（接入其它身份服务，或在测试中注入）"""
+    global _authenticator
+    _authenticator = authenticator
+
+
+async def authenticate_token(token: Optional[str]) -> AuthenticatedUser:
+    """没有令牌时按 auth_required 决定拒绝还是使用测试用户"""
+    if not token:
+        if settings.auth_required:
+            raise AuthenticationError(INVALID_TOKEN)
+        return AuthenticatedUser(TEST_USER_ID)
+    return await get_authenticator().authenticate(token)
+
+
+# ===== FastAPI 依赖 =====
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> AuthenticatedUser:
+    try:
+        return await authenticate_token(credentials.credentials if credentials else None)
+    except AuthenticationError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"} if e.status_code == status.HTTP_401_UNAUTHORIZED else None
+        )
+
+
+async def get_current_user_id(user: AuthenticatedUser = Depends(get_current_user)) -> int:
+    return user.id
+
+
+async def authenticate_websocket(websocket: WebSocket) -> AuthenticatedUser:
+    """WebSocket 连接的认证：浏览器无法设置请求头，也接受查询参数 ?token="""
+    authorization = websocket.headers.get("authorization", "")
+    token = authorization[7:].strip() if authorization[:7].lower() == "bearer " else None
+    return await authenticate_token(token or websocket.query_params.get("token"))
@@ -1,13 +1,23 @@
 # services/batch_service.py - 批量操作业务逻辑（优化同步版本）
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from models import User, Persona, Reading, ReadingSource, DivinationMethod, ReadingStatus
-from schemas import BatchReadingCreate, BatchReadingResponse, PersonaResponse, ReadingResponse
+from schemas import BatchReadingCreate, BatchReadingResponse, GenerationRequest, PersonaResponse, ReadingResponse
 from constants import TEST_USER_ID, SUCCESS_MESSAGES, ERROR_MESSAGES
+from config import settings
 from services.persona_service import PersonaService
 from services.reading_service import ReadingService
+from monitoring.metrics import record_reading_created
+from services.token_budget import estimate_usage
+from services.numerology import numerology_profile
+from services.astrology import natal_chart
+from services.tarot import resolve_draw
+from services.mbti import resolve_scores
+from services.input_fields import indexed_fields
+from services.write_buffer import reading_write_buffer
 
 class BatchService:
     def __init__(self, db: Session):
@@ -15,28 +25,31 @@ class BatchService:
         self.persona_service = PersonaService(db)
         self.reading_service = ReadingService(db)
     
-    def create_batch_readings(self, batch_data: BatchReadingCreate) -> BatchReadingResponse:
+    def create_batch_readings(self, batch_data: BatchReadingCreate, user_id: int = TEST_USER_ID) -> BatchReadingResponse:
         """批量创建占卜报告"""
         try:
             # 开始数据库事务
             # 1. 创建或获取Persona
-            persona = self._create_or_get_persona(batch_data)
+            persona = self._create_or_get_persona(batch_data, user_id)
             
             # 2. 创建individual readings
             individual_readings = self._create_individual_readings(
-                persona.id, batch_data
+                persona.id, batch_data, user_id
             )
             
             # 3. 创建integrated reading（如果有）
             integrated_reading = None
             if batch_data.integrated_report:
                 integrated_reading = self._create_integrated_reading(
-                    persona.id, batch_data, individual_readings
+                    persona.id, batch_data, individual_readings, user_id
                 )
             
             # 4.提交事务
             self.db.commit()
             
+            for reading in individual_readings + ([integrated_reading] if integrated_reading else []):
+                record_reading_created(reading.method)
+            
             # 5. 构建响应
             return BatchReadingResponse(
                 persona=PersonaResponse.from_orm(persona),
@@ -51,11 +64,189 @@ class BatchService:
             self.db.rollback()
             raise Exception(f"批量保存失败: {str(e)}")
     
-    def _create_or_get_persona(self, batch_data: BatchReadingCreate) -> Persona:
+    # ===== 流式生成：先创建 PROCESSING 状态的报告，生成完成后再写入内容 =====
+    
+    def create_processing_readings(
+        self,
+        request: GenerationRequest,
+        methods: List[DivinationMethod],
+        ai_model_used: str,
+        user_id: int = TEST_USER_ID
+    ) -> Tuple[Persona, List[Reading]]:
+        """创建（或获取）Persona，并为每个方法创建一条 PROCESSING 状态的空报告"""
+        try:
+            persona = self._create_or_get_persona(request, user_id)
+            readings = []
+            for method in methods:
+                input_data = self._extract_method_input_data(method, request.input_data, request.user_name)
+                reading = Reading(
+                    user_id=user_id,
+                    persona_id=persona.id,
+                    method=method,
+                    main_question=request.primary_question,
+                    output_text="",
+                    input_data=input_data,
+                    **indexed_fields(input_data),
+                    status=ReadingStatus.PROCESSING,
+                    ai_model_used=ai_model_used,
+                    confidence_score=self._confidence_score(input_data),
+                    tarot_cards=self.reading_service.tarot_card_rows(input_data, user_id),
+                    mbti_result=self.reading_service.mbti_result_row(input_data, user_id)
+                )
+                self.db.add(reading)
+                readings.append(reading)
+            
+            self.db.commit()
+            return persona, readings
+            
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"创建报告失败: {str(e)}")
+    
+    def create_processing_integrated_reading(
+        self,
+        persona_id: int,
+        request: GenerationRequest,
+        source_readings: List[Reading],
+        ai_model_used: str,
+        token_budget: Optional[Dict[str, int]] = None,
+        user_id: int = TEST_USER_ID
+    ) -> Reading:
+        """为已完成的源报告创建一条 PROCESSING 状态的综合报告及关联关系"""
+        try:
+            integrated_reading = Reading(
+                user_id=user_id,
+                persona_id=persona_id,
+                method=DivinationMethod.INTEGRATED,
+                main_question=request.primary_question,
+                output_text="",
+                input_data={
+                    "source_methods": [r.method.value for r in source_readings],
+                    "total_individual_reports": len(source_readings),
+                    "character_archetypes": None,
+                    "token_budget": token_budget
+                },
+                status=ReadingStatus.PROCESSING,
+                ai_model_used=ai_model_used
+            )
+            self.db.add(integrated_reading)
+            self.db.flush()
+            
+            for source_reading in source_readings:
+                self.db.add(ReadingSource(
+                    integrated_reading_id=integrated_reading.id,
+                    source_reading_id=source_reading.id,
+                    weight=1
+                ))
+            
+            self.db.commit()
+            return integrated_reading
+            
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"创建综合报告失败: {str(e)}")
+    
+    def finish_reading(
+        self,
+        reading: Reading,
+        output_text: str,
+        processing_time: Optional[int] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> Reading:
+        """写入生成结果和 token 用量，状态 PROCESSING -> COMPLETED"""
+        try:
+            usage = usage or {}
+            reading.output_text = output_text
+            reading.status = ReadingStatus.COMPLETED
+            reading.processing_time = processing_time
+            reading.prompt_tokens = usage.get("prompt_tokens")
+            reading.output_tokens = usage.get("output_tokens")
+            reading.latency_ms = usage.get("latency_ms")
+            self.db.commit()
+            record_reading_created(reading.method)
+            return reading
+            
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"保存报告失败: {str(e)}")
+    
+    def fail_reading(self, reading: Reading, error: str) -> Reading:
+        """生成失败：状态 PROCESSING -> FAILED，错误信息记录在 input_data.generation_error"""
+        try:
+            reading.status = ReadingStatus.FAILED
+            reading.input_data = {**(reading.input_data or {}), "generation_error": error}
+            self.db.commit()
+            return reading
+            
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"更新报告状态失败: {str(e)}")
+    
+    def create_failed_readings(
+        self,
+        request: GenerationRequest,
+        errors: Dict[DivinationMethod, str],
+        ai_model_used: str,
+        user_id: int = TEST_USER_ID
+    ) -> List[Reading]:
+        """为生成失败的方法创建 FAILED 状态的报告，便于排查和重新生成"""
+        if not errors:
+            return []
+        try:
+            persona = self._create_or_get_persona(request, user_id)
+            readings = []
+            for method, error in errors.items():
+                input_data = (
+                    {} if method == DivinationMethod.INTEGRATED
+                    else self._extract_method_input_data(method, request.input_data, request.user_name)
+                )
+                input_data["generation_error"] = error
+                reading = Reading(
+                    user_id=user_id,
+                    persona_id=persona.id,
+                    method=method,
+                    main_question=request.primary_question,
+                    output_text="",
+                    input_data=input_data,
+                    **indexed_fields(input_data),
+                    status=ReadingStatus.FAILED,
+                    ai_model_used=ai_model_used
+                )
+                self.db.add(reading)
+                readings.append(reading)
+            
+            self.db.commit()
+            return readings
+            
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"保存失败记录失败: {str(e)}")
+    
+    def fail_readings(self, reading_ids: List[int]) -> int:
+        """把仍处于 PROCESSING 状态的报告标记为 FAILED（生成失败或客户端中途断开）"""
+        if not reading_ids:
+            return 0
+        try:
+            result = self.db.execute(
+                update(Reading)
+                .where(
+                    Reading.id.in_(reading_ids),
+                    Reading.status == ReadingStatus.PROCESSING
+                )
+                .values(status=ReadingStatus.FAILED, updated_at=datetime.utcnow())
+            )
+            self.db.commit()
+            return result.rowcount
+            
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"更新报告状态失败: {str(e)}")
+    
+    def _create_or_get_persona(self, batch_data: BatchReadingCreate, user_id: int = TEST_USER_ID) -> Persona:
         """创建或获取Persona"""
         # 检查是否已存在同名的persona
         existing_persona = self.db.query(Persona).filter(
-            Persona.user_id == TEST_USER_ID,
+            Persona.user_id == user_id,
             Persona.display_name == batch_data.user_name
         ).first()
         
@@ -64,7 +255,7 @@ class BatchService:
         
         # 创建新的persona
         persona = Persona(
-            user_id=TEST_USER_ID,
+            user_id=user_id,
             display_name=batch_data.user_name,
             description=f"通过AI占卜系统创建的角色档案"
         )
@@ -77,7 +268,8 @@ class BatchService:
     def _create_individual_readings(
         self, 
         persona_id: int, 
-        batch_data: BatchReadingCreate
+        batch_data: BatchReadingCreate,
+        user_id: int = TEST_USER_ID
     ) -> List[Reading]:
         """创建individual readings"""
         readings = []
@@ -90,24 +282,36 @@ class BatchService:
                 raise Exception(f"无效的占卜方法: {method_str}")
             
             # 提取该方法对应的输入数据
-            method_input_data = self._extract_method_input_data(method, batch_data.input_data)
+            method_input_data = self._extract_method_input_data(method, batch_data.input_data, batch_data.user_name)
             
             # 计算单个报告的处理时间（平均分配）
             individual_processing_time = None
             if batch_data.total_processing_time:
                 individual_processing_time = batch_data.total_processing_time // len(batch_data.individual_reports)
             
+            # token 用量（未提供时按提示词模板估算）
+            usage = (batch_data.token_usage or {}).get(method_str) or estimate_usage(
+                method, report_text, batch_data.input_data, batch_data.primary_question, batch_data.user_name
+            )
+            
             # 创建reading
             reading = Reading(
-                user_id=TEST_USER_ID,
+                user_id=user_id,
                 persona_id=persona_id,
                 method=method,
                 main_question=batch_data.primary_question,
                 output_text=report_text,
                 input_data=method_input_data,
+                **indexed_fields(method_input_data),
                 status=ReadingStatus.COMPLETED,
                 ai_model_used=batch_data.ai_model_used,
-                processing_time=individual_processing_time
+                processing_time=individual_processing_time,
+                prompt_tokens=usage.get("prompt_tokens"),
+                output_tokens=usage.get("output_tokens"),
+                latency_ms=usage.get("latency_ms"),
+                confidence_score=self._confidence_score(method_input_data),
+                tarot_cards=self.reading_service.tarot_card_rows(method_input_data, user_id),
+                mbti_result=self.reading_service.mbti_result_row(method_input_data, user_id)
             )
             
             self.db.add(reading)
@@ -120,24 +324,41 @@ class BatchService:
         self, 
         persona_id: int, 
         batch_data: BatchReadingCreate,
-        source_readings: List[Reading]
+        source_readings: List[Reading],
+        user_id: int = TEST_USER_ID
     ) -> Reading:
         """创建integrated reading"""
+        usage = (batch_data.token_usage or {}).get(DivinationMethod.INTEGRATED.value) or estimate_usage(
+            DivinationMethod.INTEGRATED,
+            batch_data.integrated_report,
+            main_question=batch_data.primary_question,
+            user_name=batch_data.user_name,
+            source_reports={r.method.value: r.output_text for r in source_readings}
+        )
+        input_data = {
+            "source_methods": [r.method.value for r in source_readings],
+            "total_individual_reports": len(source_readings),
+            "character_archetypes": batch_data.character_archetypes
+        }
+        if "source_tokens" in usage:
+            input_data["token_budget"] = {
+                key: usage[key] for key in ("source_tokens", "compressed_tokens", "budget") if key in usage
+            }
+        
         # 创建综合报告
         integrated_reading = Reading(
-            user_id=TEST_USER_ID,
+            user_id=user_id,
             persona_id=persona_id,
             method=DivinationMethod.INTEGRATED,
             main_question=batch_data.primary_question,
             output_text=batch_data.integrated_report,
-            input_data={
-                "source_methods": [r.method.value for r in source_readings],
-                "total_individual_reports": len(source_readings),
-                "character_archetypes": batch_data.character_archetypes
-            },
+            input_data=input_data,
             status=ReadingStatus.COMPLETED,
             ai_model_used=batch_data.ai_model_used,
-            processing_time=batch_data.total_processing_time
+            processing_time=batch_data.total_processing_time,
+            prompt_tokens=usage.get("prompt_tokens"),
+            output_tokens=usage.get("output_tokens"),
+            latency_ms=usage.get("latency_ms")
         )
         
         self.db.add(integrated_reading)
@@ -165,32 +386,44 @@ class BatchService:
             persona.character_archetypes = character_archetypes
             persona.updated_at = datetime.utcnow()
     
+    def _confidence_score(self, method_input_data: Dict[str, Any]) -> Optional[int]:
+        """目前只有 MBTI 问卷计分能给出置信度，其余方法不填"""
+        return (method_input_data.get("mbti_scores") or {}).get("confidence")
+    
     def _extract_method_input_data(
         self, 
         method: DivinationMethod, 
-        all_input_data: Dict[str, Any]
+        all_input_data: Dict[str, Any],
+        user_name: Optional[str] = None
     ) -> Dict[str, Any]:
         """根据占卜方法提取对应的输入数据"""
         method_data = {}
         
         if method == DivinationMethod.LIFEPATH:
-            # 生命数字相关数据
+            # 生命数字相关数据，附带本地计算的数字学结果
             if "birth_date" in all_input_data:
                 method_data["birth_date"] = all_input_data["birth_date"]
+                method_data["numerology"] = numerology_profile(all_input_data["birth_date"], user_name)
         
         elif method == DivinationMethod.PALMISTRY:
             # 手相相关数据
-            palmistry_keys = ["palm_image_url", "hand_type", "palm_analysis"]
+            # 图片只保存 blob 引用（palm_image_ref），不保存 base64 图片数据
+            palmistry_keys = ["palm_image_ref", "palm_image_url", "hand_type", "palm_analysis"]
             for key in palmistry_keys:
                 if key in all_input_data:
                     method_data[key] = all_input_data[key]
         
         elif method == DivinationMethod.ASTROLOGY:
             # 占星相关数据
-            astrology_keys = ["birth_date", "birth_time", "birth_location", "birth_city", "birth_country"]
+            astrology_keys = [
+                "birth_date", "birth_time", "birth_location", "birth_city", "birth_country",
+                "birth_latitude", "birth_longitude", "birth_timezone"
+            ]
             for key in astrology_keys:
                 if key in all_input_data:
                     method_data[key] = all_input_data[key]
+            # 本地计算的星盘
+            method_data["chart"] = natal_chart(all_input_data)
         
         elif method == DivinationMethod.MBTI:
             # MBTI相关数据
@@ -198,6 +431,11 @@ class BatchService:
             for key in mbti_keys:
                 if key in all_input_data:
                     method_data[key] = all_input_data[key]
+            # 有答卷时以计分结果为准
+            scored = resolve_scores(all_input_data)
+            if scored is not None:
+                method_data["mbti_type"] = scored["mbti_type"]
+                method_data["mbti_scores"] = scored
         
         elif method == DivinationMethod.TAROT:
             # 塔罗相关数据
@@ -205,6 +443,11 @@ class BatchService:
             for key in tarot_keys:
                 if key in all_input_data:
                     method_data[key] = all_input_data[key]
+            # 带种子的服务端抽牌：保存可复现的紧凑编码，牌名由编码得出
+            draw = resolve_draw(all_input_data)
+            if draw is not None:
+                method_data["tarot_draw"] = {key: draw[key] for key in ("spread_type", "seed", "picks", "code")}
+                method_data["selected_cards"] = [card["name"] for card in draw["cards"]]
         
         # 添加通用数据
         method_data["created_via"] = "batch_creation"
@@ -236,11 +479,18 @@ class BatchService:
                 Reading.user_id == user_id
             ).order_by(Reading.created_at.desc()).limit(5).all()
             
-            # 收藏的报告数量
-            favorite_count = self.db.query(Reading).filter(
+            # 收藏的报告数量（写回缓冲中尚未落库的收藏状态以缓冲为准）
+            buffered = {}
+            if settings.write_behind_enabled:
+                buffered = reading_write_buffer.buffered_values(user_id, "is_favorite")
+                reading_write_buffer.overlay(recent_readings)
+            favorite_query = self.db.query(Reading).filter(
                 Reading.user_id == user_id,
                 Reading.is_favorite == True
-            ).count()
+            )
+            if buffered:
+                favorite_query = favorite_query.filter(Reading.id.notin_(list(buffered)))
+            favorite_count = favorite_query.count() + sum(1 for value in buffered.values() if value)
             
             return {
                 "user_info": {
@@ -269,22 +519,24 @@ class BatchService:
         except Exception as e:
             raise Exception(f"获取汇总信息失败: {str(e)}")
     
-    def get_persona_reading_count(self, persona_id: int) -> int:
+    def get_persona_reading_count(self, persona_id: int, user_id: int = TEST_USER_ID) -> int:
         """获取某个persona的报告数量"""
         try:
             count = self.db.query(Reading).filter(
-                Reading.persona_id == persona_id
+                Reading.persona_id == persona_id,
+                Reading.user_id == user_id
             ).count()
             return count
         except Exception as e:
             raise Exception(f"获取报告数量失败: {str(e)}")
     
-    def delete_batch_readings(self, persona_id: int) -> Dict[str, Any]:
+    def delete_batch_readings(self, persona_id: int, user_id: int = TEST_USER_ID) -> Dict[str, Any]:
         """删除某个persona的所有报告（批量删除）"""
         try:
             # 查询要删除的报告
             readings_to_delete = self.db.query(Reading).filter(
-                Reading.persona_id == persona_id
+                Reading.persona_id == persona_id,
+                Reading.user_id == user_id
             ).all()
             
             if not readings_to_delete:
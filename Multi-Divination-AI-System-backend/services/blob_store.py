@@ -0,0 +1,104 @@
+# services/blob_store.py - 内容寻址的本地文件存储（按 SHA-256 去重，分块写入）
+"""
+- 文件按内容的 SHA-256 存放：{root}/{hash[:2]}/{hash[2:4]}/{hash}，相同内容只存一份
+- 写入时先分块写到 {root}/tmp 下的临时文件并同步计算哈希，完成后原子重命名到最终路径，
+  中途失败或超出大小限制时删除临时文件，不会留下不完整的文件
+- 派生文件（缩略图等）与原文件放在同一目录：{hash}.{variant}
+"""
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+from config import settings
+
+_REF_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobTooLargeError(ValueError):
+    """写入内容超过大小限制"""
+
+
+def is_valid_ref(ref: str) -> bool:
+    return bool(ref) and bool(_REF_PATTERN.match(ref))
+
+
+class BlobWriter:
+    """
+    分块写入一个文件：write() 追加数据，commit() 得到内容哈希，abort() 放弃
+
+    write() 为同步调用，适合在流式解析回调中直接使用。
+    """
+
+    def __init__(self, store: "BlobStore", max_bytes: Optional[int] = None):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self._temp_path = tempfile.mkstemp(dir=store.temp_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise BlobTooLargeError(f"文件超过 {self.max_bytes / 1024 / 1024:.1f} MB 限制")
+        self._hash.update(data)
+        self._file.write(data)
+
+    def commit(self) -> str:
+        """完成写入，返回内容哈希（blob 引用）；内容已存在时直接复用"""
+        self._file.close()
+        ref = self._hash.hexdigest()
+        path = self.store.path(ref)
+        if os.path.exists(path):
+            os.remove(self._temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._temp_path, path)
+        return ref
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.temp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path(self, ref: str, variant: Optional[str] = None) -> str:
+        if not is_valid_ref(ref):
+            raise ValueError(f"无效的文件引用: {ref}")
+        name = f"{ref}.{variant}" if variant else ref
+        return os.path.join(self.root, ref[:2], ref[2:4], name)
+
+    def exists(self, ref: str, variant: Optional[str] = None) -> bool:
+        return is_valid_ref(ref) and os.path.exists(self.path(ref, variant))
+
+    def writer(self, max_bytes: Optional[int] = None) -> BlobWriter:
+        return BlobWriter(self, max_bytes)
+
+    def read(self, ref: str, variant: Optional[str] = None) -> bytes:
+        with open(self.path(ref, variant), "rb") as file:
+            return file.read()
+
+    def delete(self, ref: str):
+        """删除原文件及其派生文件"""
+        directory = os.path.dirname(self.path(ref))
+        for name in os.listdir(directory):
+            if name == ref or name.startswith(f"{ref}."):
+                os.remove(os.path.join(directory, name))
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore(settings.blob_dir)
+    return _blob_store
@@ -0,0 +1,274 @@
+# services/chat_compaction.py - 长会话的上下文压缩（后台增量汇总）
+"""
+会话越长，每次回复要发送的上下文越多。检查点（ChatSession.summary_token_offset）之后未汇总的
+token 数超过 chat_compaction_threshold_tokens 时，后台任务把最近窗口（chat_context_max_tokens）
+之外的旧消息汇总进 ChatSession.context_data["summary"]。
+
+- 模型收到摘要 + 检查点之后的全部消息（context_messages），检查点之前的内容都在摘要中，
+  任何消息都不会既不在摘要里也不在上下文里；未汇总部分最多约为触发阈值加上压缩完成前新增的消息
+
+- 增量：每一步把上一版摘要和检查点之后的一批消息（不超过 chat_compaction_batch_tokens）合并成新摘要，
+  再推进检查点；一次压缩可以分多步完成，中途失败或进程退出时已提交的步骤不会丢失
+- 幂等：写入摘要时用 UPDATE ... WHERE summary_token_offset = 旧检查点 做条件更新，多个 worker
+  同时压缩同一会话时只有一个生效，重复执行不会重复汇总
+- 触发：本进程追加消息后按需排队；另外定期扫描数据库，接上其它进程遗留或中断的压缩
+- 其它 worker 缓存的会话上下文在 TTL 到期后才会看到新摘要，期间仍使用完整的最近窗口
+"""
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+
+from config import settings
+from database import SessionLocal
+from models import ChatMessage, ChatSession
+from services.model_client import get_model_client
+from services.prompts import build_chat_summary_prompt, format_chat_transcript
+from services.token_budget import truncate_to_tokens
+
+logger = logging.getLogger("divination.chat_compaction")
+
+SUMMARY_KEY = "summary"
+
+
+def session_summary(session: ChatSession) -> Optional[str]:
+    """会话当前的摘要文本（尚未压缩过时为 None）"""
+    summary = (session.context_data or {}).get(SUMMARY_KEY) or {}
+    return summary.get("text") or None
+
+
+def context_messages(chat_service, session: ChatSession, max_tokens: int, user_id: int) -> List[ChatMessage]:
+    """
+    构建模型上下文用的消息
+
+    开启压缩时为检查点之后的全部消息；未开启时只取最近 max_tokens 以内的消息（更早的对话被丢弃）。
+    """
+    if settings.chat_compaction_enabled:
+        return chat_service.get_messages_after(session.id, session.summary_token_offset, user_id)
+    return chat_service.get_context_window(session.id, max_tokens, user_id)
+
+
+@dataclass
+class CompactionStep:
+    """一步压缩的输入：旧检查点之后、目标位置之前的一批消息"""
+    session_id: int
+    checkpoint: int
+    previous_summary: Optional[str]
+    context_data: Dict[str, Any]
+    user_name: Optional[str]
+    messages: List[ChatMessage]
+
+    @property
+    def new_checkpoint(self) -> int:
+        return self.messages[-1].token_offset
+
+
+class ChatCompactor:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        threshold_tokens: int = 8000,
+        keep_tokens: int = 4000,
+        batch_tokens: int = 6000,
+        summary_max_tokens: int = 800,
+        sweep_interval: float = 300.0,
+        sweep_limit: int = 100
+    ):
+        self.session_factory = session_factory
+        self.threshold_tokens = threshold_tokens
+        self.keep_tokens = keep_tokens
+        self.batch_tokens = batch_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.sweep_interval = sweep_interval
+        self.sweep_limit = sweep_limit
+        self._pending: Set[int] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.steps = 0
+        self.conflicts = 0
+
+    def needs_compaction(self, token_total: int, summary_offset: int) -> bool:
+        return token_total - summary_offset > self.threshold_tokens
+
+    def request(self, session_id: int) -> None:
+        """把会话加入压缩队列（可在任意线程调用；后台任务未启动时忽略）"""
+        if self._loop is None:
+            return
+        with self._lock:
+            self._pending.add(session_id)
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ===== 单个会话 =====
+
+    async def compact(self, session_id: int) -> int:
+        """压缩一个会话直到检查点追上目标位置，返回完成的步数"""
+        steps = 0
+        while True:
+            step = await asyncio.to_thread(self._plan, session_id, steps > 0)
+            if step is None:
+                return steps
+
+            transcript = format_chat_transcript(
+                ((message.is_user_message, message.content) for message in step.messages), step.user_name
+            )
+            result = await get_model_client().generate(build_chat_summary_prompt(
+                step.previous_summary,
+                transcript,
+                step.user_name,
+                max_words=self.summary_max_tokens // 2
+            ))
+            summary = truncate_to_tokens(result.text.strip(), self.summary_max_tokens)
+
+            if not await asyncio.to_thread(self._save, step, summary):
+                # 其它 worker 已推进了检查点，以数据库中的结果为准
+                self.conflicts += 1
+                return steps
+            steps += 1
+            self.steps += 1
+
+            from services.chat_stream import chat_context_cache
+            chat_context_cache.invalidate(session_id)
+
+    def _plan(self, session_id: int, continuing: bool) -> Optional[CompactionStep]:
+        db = self.session_factory()
+        try:
+            session = db.get(ChatSession, session_id)
+            if session is None:
+                return None
+            checkpoint = session.summary_token_offset
+            target = session.token_total - self.keep_tokens
+            if target <= checkpoint or (not continuing and not self.needs_compaction(session.token_total, checkpoint)):
+                return None
+
+            # 检查点之后、窗口之前的一批完整消息，走 (session_id, token_offset) 索引
+            query = db.query(ChatMessage).filter(
+                ChatMessage.session_id == session_id,
+                ChatMessage.token_offset > checkpoint
+            ).order_by(ChatMessage.token_offset)
+            messages = query.filter(ChatMessage.token_offset <= min(target, checkpoint + self.batch_tokens)).all()
+            if not messages:
+                # 单条消息超过批量上限时单独汇总
+                messages = query.filter(ChatMessage.token_offset <= target).limit(1).all()
+            if not messages:
+                return None
+
+            for message in messages:
+                db.expunge(message)
+            return CompactionStep(
+                session_id=session_id,
+                checkpoint=checkpoint,
+                previous_summary=session_summary(session),
+                context_data=dict(session.context_data or {}),
+                user_name=session.persona.display_name if session.persona else None,
+                messages=messages
+            )
+        finally:
+            db.close()
+
+    def _save(self, step: CompactionStep, summary: str) -> bool:
+        """条件更新：检查点仍是压缩开始时的值才写入"""
+        context_data = dict(step.context_data)
+        previous = context_data.get(SUMMARY_KEY) or {}
+        context_data[SUMMARY_KEY] = {
+            "text": summary,
+            "through_message_id": step.messages[-1].id,
+            "through_token_offset": step.new_checkpoint,
+            "message_count": previous.get("message_count", 0) + len(step.messages),
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        db = self.session_factory()
+        try:
+            result = db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == step.session_id, ChatSession.summary_token_offset == step.checkpoint)
+                .values(
+                    summary_token_offset=step.new_checkpoint,
+                    context_data=context_data,
+                    updated_at=ChatSession.updated_at  # 后台压缩不算会话更新
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return result.rowcount == 1
+        except Exception as e:
+            db.rollback()
+            raise Exception(f"保存会话摘要失败: {str(e)}")
+        finally:
+            db.close()
+
+    def _sweep(self) -> List[int]:
+        """数据库中待压缩的会话（其它进程遗留或中断的）"""
+        db = self.session_factory()
+        try:
+            return list(db.execute(
+                select(ChatSession.id)
+                .where(ChatSession.token_total - ChatSession.summary_token_offset > self.threshold_tokens)
+                .limit(self.sweep_limit)
+            ).scalars())
+        finally:
+            db.close()
+
+    # ===== 后台任务 =====
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务；进行中的一步直接放弃，检查点保证下次从已提交的位置继续"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+    async def _run(self) -> None:
+        next_sweep = 0.0
+        while True:
+            if self._loop.time() >= next_sweep:
+                next_sweep = self._loop.time() + self.sweep_interval
+                try:
+                    swept = await asyncio.to_thread(self._sweep)
+                    with self._lock:
+                        self._pending.update(swept)
+                except Exception as e:
+                    logger.warning("扫描待压缩会话失败: %s", e)
+
+            with self._lock:
+                batch, self._pending = self._pending, set()
+            for session_id in sorted(batch):
+                try:
+                    await self.compact(session_id)
+                except Exception as e:
+                    logger.warning("会话 %s 上下文压缩失败，将在下次扫描时重试: %s", session_id, e)
+
+            self._wakeup.clear()
+            with self._lock:
+                if self._pending:
+                    continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, next_sweep - self._loop.time()))
+            except asyncio.TimeoutError:
+                pass
+
+
+# 全局压缩任务
+chat_compactor = ChatCompactor(
+    threshold_tokens=settings.chat_compaction_threshold_tokens,
+    keep_tokens=settings.chat_context_max_tokens,
+    batch_tokens=settings.chat_compaction_batch_tokens,
+    summary_max_tokens=settings.chat_summary_max_tokens,
+    sweep_interval=settings.chat_compaction_sweep_interval
+)
@@ -0,0 +1,235 @@
+# services/chat_service.py - 聊天会话与消息业务逻辑
+"""
+- 消息只追加不修改：每条消息保存估算 token 数（token_count）和会话内截至本条的累计 token 数
+  （token_offset），会话上保存 token_total / message_count
+- 追加消息时用一条 UPDATE ... RETURNING 同时累加会话统计、更新 last_message_at 并取回新的 token_total，
+  不需要先查询会话；PostgreSQL 下该 UPDATE 持有会话行锁，同一会话的并发追加按顺序得到连续的 token_offset
+- 历史记录按消息 ID 做 keyset 分页（before_id 游标），翻到多深都只读一页
+- "最近 N token" 上下文：token_offset 落在 (token_total - N, token_total] 内的消息，
+  走 (session_id, token_offset) 索引的范围扫描，不加载整个会话
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from models import ChatMessage, ChatSession, Persona, Reading, ChatSessionType
+from schemas import ChatMessageCreate, ChatSessionCreate
+from constants import TEST_USER_ID, ERROR_MESSAGES
+from services.token_budget import estimate_tokens
+
+SESSION_NOT_FOUND = "聊天会话不存在"
+
+
+class ChatService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ===== 会话 =====
+
+    def create_session(self, session_data: ChatSessionCreate, user_id: int = TEST_USER_ID) -> ChatSession:
+        """创建聊天会话"""
+        try:
+            if session_data.related_reading_id:
+                reading = self.db.query(Reading.id).filter(
+                    Reading.id == session_data.related_reading_id,
+                    Reading.user_id == user_id
+                ).first()
+                if not reading:
+                    raise ValueError(ERROR_MESSAGES["READING_NOT_FOUND"])
+
+            if session_data.persona_id:
+                persona = self.db.query(Persona.id).filter(
+                    Persona.id == session_data.persona_id,
+                    Persona.user_id == user_id
+                ).first()
+                if not persona:
+                    raise ValueError(ERROR_MESSAGES["PERSONA_NOT_FOUND"])
+
+            session = ChatSession(
+                user_id=user_id,
+                title=session_data.title,
+                session_type=ChatSessionType(session_data.session_type.value),
+                related_reading_id=session_data.related_reading_id,
+                persona_id=session_data.persona_id,
+                ai_personality=session_data.ai_personality,
+                message_count=0,
+                token_total=0,
+                summary_token_offset=0
+            )
+            self.db.add(session)
+            self.db.commit()
+            self.db.refresh(session)
+            return session
+
+        except ValueError:
+            self.db.rollback()
+            raise
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"创建聊天会话失败: {str(e)}")
+
+    def get_session(self, session_id: int, user_id: int = TEST_USER_ID) -> Optional[ChatSession]:
+        return self.db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id
+        ).first()
+
+    def get_sessions_by_user(
+        self,
+        user_id: int = TEST_USER_ID,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[ChatSession]:
+        """按最近消息时间倒序（没有消息的按创建时间）"""
+        return self.db.query(ChatSession).filter(
+            ChatSession.user_id == user_id,
+            ChatSession.is_archived == False
+        ).order_by(
+            func.coalesce(ChatSession.last_message_at, ChatSession.created_at).desc(),
+            ChatSession.id.desc()
+        ).offset(offset).limit(limit).all()
+
+    # ===== 消息写入 =====
+
+    def append_messages(
+        self,
+        session_id: int,
+        messages: List[ChatMessageCreate],
+        user_id: int = TEST_USER_ID
+    ) -> List[ChatMessage]:
+        """
+        追加一批消息（同一事务、一次提交）
+
+        会话不存在或不属于该用户时抛出 LookupError。
+        """
+        if not messages:
+            return []
+        try:
+            now = datetime.utcnow()
+            # 每条至少计 1 个 token，保证 token_offset 在会话内严格递增
+            counts = [max(1, estimate_tokens(message.content)) for message in messages]
+            stmt = (
+                update(ChatSession)
+                .where(ChatSession.id == session_id, ChatSession.user_id == user_id)
+                .values(
+                    message_count=ChatSession.message_count + len(messages),
+                    token_total=ChatSession.token_total + sum(counts),
+                    last_message_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if self.db.get_bind().dialect.update_returning:
+                token_total = self.db.execute(stmt.returning(ChatSession.token_total)).scalar_one_or_none()
+            else:
+                # 数据库不支持RETURNING时在同一事务中读回（行锁持有到提交，offset 不会与并发写入重叠）
+                token_total = None
+                if self.db.execute(stmt).rowcount == 1:
+                    token_total = self.db.query(ChatSession.token_total).filter(
+                        ChatSession.id == session_id
+                    ).scalar()
+            if token_total is None:
+                raise LookupError(SESSION_NOT_FOUND)
+
+            offset = token_total - sum(counts)
+            rows = []
+            for message, count in zip(messages, counts):
+                offset += count
+                rows.append(ChatMessage(
+                    session_id=session_id,
+                    content=message.content,
+                    is_user_message=message.is_user_message,
+                    message_type=message.message_type,
+                    message_metadata=message.message_metadata,
+                    token_count=count,
+                    token_offset=offset,
+                    created_at=now
+                ))
+            self.db.add_all(rows)
+            self.db.flush()
+
+            # 提交前脱离会话：提交后不会被过期，返回时无需逐条重新查询
+            for row in rows:
+                self.db.expunge(row)
+            self.db.commit()
+            return rows
+
+        except LookupError:
+            self.db.rollback()
+            raise
+        except Exception as e:
+            self.db.rollback()
+            raise Exception(f"保存聊天消息失败: {str(e)}")
+
+    def append_message(
+        self,
+        session_id: int,
+        message: ChatMessageCreate,
+        user_id: int = TEST_USER_ID
+    ) -> ChatMessage:
+        return self.append_messages(session_id, [message], user_id)[0]
+
+    # ===== 消息读取 =====
+
+    def get_messages(
+        self,
+        session_id: int,
+        before_id: Optional[int] = None,
+        limit: int = 50,
+        user_id: int = TEST_USER_ID
+    ) -> List[ChatMessage]:
+        """
+        keyset 分页读取历史：ID 小于 before_id 的最近 limit 条，按时间正序返回
+        """
+        query = self.db.query(ChatMessage).join(
+            ChatSession, ChatSession.id == ChatMessage.session_id
+        ).filter(
+            ChatMessage.session_id == session_id,
+            ChatSession.user_id == user_id
+        )
+        if before_id:
+            query = query.filter(ChatMessage.id < before_id)
+
+        messages = query.order_by(ChatMessage.id.desc()).limit(limit).all()
+        messages.reverse()
+        return messages
+
+    def get_context_window(
+        self,
+        session_id: int,
+        max_tokens: int,
+        user_id: int = TEST_USER_ID
+    ) -> List[ChatMessage]:
+        """
+        最近 max_tokens 以内的完整消息（按时间正序），一条语句完成
+
+        单条消息超过 max_tokens 时不会被包含。
+        """
+        window_start = select(ChatSession.token_total - max_tokens).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id
+        ).scalar_subquery()
+
+        return self.db.query(ChatMessage).filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.token_offset > window_start,
+            ChatMessage.token_offset - ChatMessage.token_count >= window_start
+        ).order_by(ChatMessage.token_offset).all()
+
+    def get_messages_after(
+        self,
+        session_id: int,
+        token_offset: int,
+        user_id: int = TEST_USER_ID
+    ) -> List[ChatMessage]:
+        """token_offset 之后的全部消息（按时间正序），走 (session_id, token_offset) 索引"""
+        owned = select(ChatSession.id).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id
+        ).scalar_subquery()
+
+        return self.db.query(ChatMessage).filter(
+            ChatMessage.session_id == owned,
+            ChatMessage.token_offset > token_offset
+        ).order_by(ChatMessage.token_offset).all()
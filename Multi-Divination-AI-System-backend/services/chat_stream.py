@@ -0,0 +1,272 @@
+# services/chat_stream.py - 流式聊天：会话上下文缓存与单轮对话
+"""
+- 每个会话的上下文（Aura 系统指令 + 关联报告摘要 + 未汇总的消息）在首次使用时从数据库加载，
+  缓存在进程内（LRU + TTL），之后每轮对话只在本地追加新消息，不再重新读取报告和历史
+- 模型回复逐段产出；一轮结束后用户消息和助手回复在同一事务中一次写入（ChatService.append_messages）
+- 多 worker / 其它接口也可能向同一会话追加消息：写入后比较新消息的起始 token_offset 与缓存中的
+  token_total，不连续说明缓存已过期，丢弃后下一轮重新加载
+- 会话较长时，检查点之前的消息由后台任务汇总为摘要（见 services/chat_compaction.py），
+  模型收到摘要 + 检查点之后的全部消息；未开启压缩时只保留最近 chat_context_max_tokens 的消息
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import anyio
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from constants import TEST_USER_ID
+from database import SessionLocal
+from models import ChatMessage, Reading
+from schemas import ChatMessageCreate
+from services.chat_service import ChatService, SESSION_NOT_FOUND
+from services.model_client import get_model_client
+from services.chat_compaction import chat_compactor, context_messages, session_summary
+from services.prompts import CHAT_ASSISTANT_NAME, build_chat_instruction, format_chat_transcript
+from services.token_budget import estimate_tokens, estimate_prompt_tokens, fit_reports_to_budget
+
+@dataclass
+class HistoryEntry:
+    is_user_message: bool
+    content: str
+    token_count: int
+    token_offset: int
+
+
+@dataclass
+class ChatContext:
+    """一个会话构建模型提示词所需的全部内容"""
+    session_id: int
+    user_id: int
+    instruction: str
+    user_name: str
+    max_tokens: Optional[int]           # 历史窗口上限；None 表示保留检查点之后的全部消息
+    token_total: int                    # 已知的会话 token 总数（最后一条消息的 token_offset）
+    summary: Optional[str] = None       # 检查点之前对话的摘要
+    summary_offset: int = 0             # 压缩检查点（token_offset）
+    history: Deque[HistoryEntry] = field(default_factory=deque)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def build_parts(self, content: str) -> List[Dict[str, Any]]:
+        """系统指令 + 早期对话摘要 + 最近的对话 + 本轮用户消息"""
+        with self.lock:
+            transcript = format_chat_transcript(
+                ((entry.is_user_message, entry.content) for entry in self.history), self.user_name
+            )
+        summary = f"Summary of the earlier conversation:\n{self.summary}\n\n" if self.summary else ""
+        conversation = f"Conversation so far:\n{transcript}\n\n" if transcript else ""
+        return [{"text": (
+            f"{self.instruction}\n\n{summary}{conversation}{self.user_name}: {content}\n{CHAT_ASSISTANT_NAME}:"
+        )}]
+
+    def extend(self, messages: List[ChatMessage]) -> bool:
+        """
+        追加刚写入的消息并按 token 窗口裁剪；返回 False 表示会话中有缓存之外的新消息（缓存已过期）
+        """
+        if not messages:
+            return True
+        with self.lock:
+            first = messages[0]
+            if first.token_offset - first.token_count != self.token_total:
+                return False
+            for message in messages:
+                self.history.append(HistoryEntry(
+                    message.is_user_message, message.content, message.token_count, message.token_offset
+                ))
+            self.token_total = messages[-1].token_offset
+            if self.max_tokens is not None:
+                window_start = self.token_total - self.max_tokens
+                while self.history and self.history[0].token_offset - self.history[0].token_count < window_start:
+                    self.history.popleft()
+            return True
+
+
+def load_chat_context(
+    db: Session,
+    session_id: int,
+    user_id: int = TEST_USER_ID,
+    max_tokens: Optional[int] = None
+) -> ChatContext:
+    """从数据库构建会话上下文；会话不存在或不属于该用户时抛出 LookupError"""
+    chat_service = ChatService(db)
+    session = chat_service.get_session(session_id, user_id)
+    if not session:
+        raise LookupError(SESSION_NOT_FOUND)
+    max_tokens = max_tokens or settings.chat_context_max_tokens
+
+    reports: Dict[str, str] = {}
+    main_question = None
+    persona = session.persona
+    if session.related_reading_id:
+        reading = db.query(Reading).filter(
+            Reading.id == session.related_reading_id,
+            Reading.user_id == user_id
+        ).first()
+        if reading:
+            main_question = reading.main_question
+            persona = persona or reading.persona
+            # 综合报告连同其源报告一起作为背景
+            readings = [reading] + [source.source_reading for source in reading.source_readings]
+            reports = {r.method.value: r.output_text for r in readings if r.output_text}
+            reports, _ = fit_reports_to_budget(reports, settings.chat_report_token_budget)
+
+    user_name = persona.display_name if persona else None
+    instruction = build_chat_instruction(
+        reports,
+        persona.character_archetypes if persona else None,
+        user_name,
+        main_question
+    )
+    messages = context_messages(chat_service, session, max_tokens, user_id)
+    return ChatContext(
+        session_id=session_id,
+        user_id=user_id,
+        instruction=instruction,
+        user_name=user_name or "User",
+        # 开启压缩时窗口由检查点决定，缓存的上下文在压缩后失效重新加载
+        max_tokens=None if settings.chat_compaction_enabled else max_tokens,
+        token_total=session.token_total,
+        summary=session_summary(session),
+        summary_offset=session.summary_token_offset,
+        history=deque(HistoryEntry(m.is_user_message, m.content, m.token_count, m.token_offset) for m in messages)
+    )
+
+
+class ChatContextCache:
+    """按会话ID缓存 ChatContext（进程内 LRU，带 TTL）"""
+
+    def __init__(self, ttl: float = 600.0, max_sessions: int = 1000, session_factory=SessionLocal):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[int, Tuple[float, ChatContext]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: int, user_id: int = TEST_USER_ID) -> Optional[ChatContext]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] <= time.monotonic() or entry[1].user_id != user_id:
+                return None
+            self._entries.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, context: ChatContext) -> None:
+        with self._lock:
+            self._entries[context.session_id] = (time.monotonic() + self.ttl, context)
+            self._entries.move_to_end(context.session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: int) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def load(self, session_id: int, user_id: int = TEST_USER_ID) -> ChatContext:
+        """取缓存的上下文，未命中时从数据库加载（同步调用，异步代码中放到线程里执行）"""
+        context = self.get(session_id, user_id)
+        if context is not None:
+            self.hits += 1
+            return context
+        self.misses += 1
+        db = self.session_factory()
+        try:
+            context = load_chat_context(db, session_id, user_id)
+        finally:
+            db.close()
+        self.put(context)
+        return context
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局会话上下文缓存
+chat_context_cache = ChatContextCache(
+    ttl=settings.chat_context_cache_ttl,
+    max_sessions=settings.chat_context_cache_max_sessions
+)
+
+
+async def get_chat_context(session_id: int, user_id: int = TEST_USER_ID) -> ChatContext:
+    """命中缓存时直接返回，否则在线程中从数据库加载"""
+    context = chat_context_cache.get(session_id, user_id)
+    if context is not None:
+        chat_context_cache.hits += 1
+        return context
+    return await asyncio.to_thread(chat_context_cache.load, session_id, user_id)
+
+
+def save_turn(context: ChatContext, messages: List[ChatMessageCreate]) -> List[ChatMessage]:
+    """一次写入一轮对话并更新缓存；缓存与数据库不连续时丢弃缓存"""
+    db = chat_context_cache.session_factory()
+    try:
+        rows = ChatService(db).append_messages(context.session_id, messages, context.user_id)
+    finally:
+        db.close()
+    if not context.extend(rows):
+        chat_context_cache.invalidate(context.session_id)
+    if chat_compactor.needs_compaction(rows[-1].token_offset, context.summary_offset):
+        chat_compactor.request(context.session_id)
+    return rows
+
+
+async def stream_reply(context: ChatContext, content: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    生成一轮回复，产出 ("token", {...})，最后是 ("done", {...}) 或 ("error", {...})
+
+    模型出错时只保存用户消息；调用方中途停止迭代（如客户端断开）时，已生成的部分回复
+    带 interrupted 标记一并保存。
+    """
+    client = get_model_client()
+    parts = context.build_parts(content)
+    chunks: List[str] = []
+    start = time.perf_counter()
+    saved = False
+    try:
+        try:
+            async for chunk in client.stream_generate(parts):
+                chunks.append(chunk)
+                yield "token", {"text": chunk}
+        except Exception as e:
+            saved = True
+            rows = await asyncio.to_thread(save_turn, context, [ChatMessageCreate(content=content)])
+            yield "error", {"user_message_id": rows[0].id, "detail": f"回复生成失败: {str(e)}"}
+            return
+
+        text = "".join(chunks)
+        latency_ms = int((time.perf_counter() - start) * 1000)
+        usage = {
+            "prompt_tokens": estimate_prompt_tokens(parts),
+            "output_tokens": estimate_tokens(text),
+            "latency_ms": latency_ms
+        }
+        saved = True
+        rows = await asyncio.to_thread(save_turn, context, [
+            ChatMessageCreate(content=content),
+            ChatMessageCreate(
+                content=text or " ",
+                is_user_message=False,
+                message_metadata={"model": client.model, **usage}
+            )
+        ])
+        yield "done", {"user_message_id": rows[0].id, "message_id": rows[1].id, "usage": usage}
+    finally:
+        if not saved:
+            # 客户端断开时当前任务可能已被取消，屏蔽取消并在线程中写入，确保对话落库且不阻塞事件循环
+            messages = [ChatMessageCreate(content=content)]
+            if chunks:
+                messages.append(ChatMessageCreate(
+                    content="".join(chunks),
+                    is_user_message=False,
+                    message_metadata={"model": client.model, "interrupted": True}
+                ))
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(save_turn, context, messages)
@@ -0,0 +1,138 @@
+# services/coalescing.py - 相同请求的合并执行（single-flight），位于路由与生成/批量服务之间
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+from config import settings
+from constants import TEST_USER_ID
+from database import SessionLocal
+from monitoring.metrics import record_coalesced_request
+from schemas import BatchReadingCreate, BatchReadingResponse, GenerationRequest
+from services.batch_service import BatchService
+from services.generation_service import GenerationService
+from services.quota import reading_quota
+
+
+def request_key(operation: str, user_id: int, payload: Any) -> str:
+    """请求的规范哈希：操作名 + 用户 + 请求体（键排序后的 JSON）"""
+    canonical = json.dumps(
+        {"op": operation, "user_id": user_id, "payload": payload},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    同一个键同时只执行一次
+
+    - 第一个请求创建共享任务，之后到达的相同请求等待同一个任务并拿到同一个结果（或同一个异常）
+    - 共享任务与发起请求解耦：某个等待者被取消（如客户端断开）不会影响其他等待者
+    - cancel_when_abandoned=True 时，所有等待者都取消后共享任务也会被取消（用于可中止的模型调用）；
+      数据库写入应设为 False，让已开始的写入完成
+    - 任务结束后立即移除，之后的相同请求会重新执行
+    """
+
+    def __init__(self, operation: str, cancel_when_abandoned: bool = False):
+        self.operation = operation
+        self.cancel_when_abandoned = cancel_when_abandoned
+        self._flights: Dict[str, _Flight] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, task))
+        else:
+            record_coalesced_request(self.operation)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # 当前等待者被取消，共享任务本身仍在运行
+            flight.waiters -= 1
+            if flight.waiters == 0 and self.cancel_when_abandoned and not flight.task.done():
+                # 先移除再取消，之后到达的相同请求会重新执行，而不是等到一个已取消的任务
+                self._flights.pop(key, None)
+                flight.task.cancel()
+            raise
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._flights.get(key) is not None and self._flights[key].task is task:
+            del self._flights[key]
+        # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+generation_flights = SingleFlight("generation", cancel_when_abandoned=True)
+batch_save_flights = SingleFlight("batch_save")
+
+
+async def generate_batch(request: GenerationRequest, user_id: int = TEST_USER_ID) -> BatchReadingResponse:
+    """合并相同的生成请求：共享一次模型调用和一次保存"""
+    if not settings.request_coalescing_enabled:
+        return await _charged(user_id, lambda: _generate_batch(request, user_id))
+
+    key = request_key(generation_flights.operation, user_id, request.dict())
+    return await generation_flights.do(key, lambda: _charged(user_id, lambda: _generate_batch(request, user_id)))
+
+
+async def create_batch_readings(batch_data: BatchReadingCreate, user_id: int = TEST_USER_ID) -> BatchReadingResponse:
+    """合并相同的批量保存请求：共享一次数据库写入"""
+    if not settings.request_coalescing_enabled:
+        return await _charged(user_id, lambda: asyncio.to_thread(_create_batch_readings, batch_data, user_id))
+
+    key = request_key(batch_save_flights.operation, user_id, batch_data.dict())
+    return await batch_save_flights.do(
+        key, lambda: _charged(user_id, lambda: asyncio.to_thread(_create_batch_readings, batch_data, user_id))
+    )
+
+
+async def _charged(user_id: int, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    扣减一次占卜额度后执行；执行失败时退回
+
+    在共享任务内扣减，合并执行的相同请求只计一次。
+    """
+    if settings.quota_enabled:
+        await reading_quota.acquire(user_id)
+    try:
+        return await fn()
+    except BaseException:
+        if settings.quota_enabled:
+            reading_quota.refund(user_id)
+        raise
+
+
+# 共享任务可能比发起它的请求活得更久，因此使用独立会话，而不是请求级的 get_db 会话
+
+async def _generate_batch(request: GenerationRequest, user_id: int) -> BatchReadingResponse:
+    db = SessionLocal()
+    try:
+        return await GenerationService(db).generate_batch(request, user_id)
+    finally:
+        db.close()
+
+
+def _create_batch_readings(batch_data: BatchReadingCreate, user_id: int) -> BatchReadingResponse:
+    db = SessionLocal()
+    try:
+        return BatchService(db).create_batch_readings(batch_data, user_id)
+    finally:
+        db.close()
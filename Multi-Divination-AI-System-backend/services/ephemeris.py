@@ -0,0 +1,218 @@
+# services/ephemeris.py - 预计算星历表（内存映射二进制文件 + NumPy 插值）
+"""
+星历表按天存储 1900-01-01 至 2100-12-31 每天 0h UT 太阳、月亮和八大行星（不含冥王星）的
+地心黄经（当日春分点，度，float32），文件为 .npy 格式，运行时以 np.load(mmap_mode="r") 映射，
+只有实际访问到的页会被读入内存。查询时在相邻两天之间线性插值（处理 360° 回绕）。
+
+表由 Paul Schlyter《How to compute planetary positions》的轨道根数和主要摄动项生成，
+精度约为角分级，对星座、度数判断足够。生成只需要 NumPy，不访问网络：
+
+    python -m services.ephemeris            # 生成到 settings.ephemeris_dir
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger("divination.ephemeris")
+
+# 表结构变化时递增，旧文件会被忽略并重新生成
+EPHEMERIS_VERSION = 1
+BODIES = ("Sun", "Moon", "Mercury", "Venus", "Mars", "Jupiter", "Saturn", "Uranus", "Neptune")
+START_JD = 2415020.5  # 1900-01-01 0h UT
+DAYS = 73415          # 至 2100-12-31（含）
+# Schlyter 的日数以 2000-01-00 0h UT（JD 2451543.5）为零点
+_EPOCH_JD = 2451543.5
+
+# 轨道根数：(N, i, w, a, e, M)，每项为 (常数项, 每日变化)；角度单位为度
+_ELEMENTS: Dict[str, Tuple[Tuple[float, float], ...]] = {
+    "Sun": ((0.0, 0.0), (0.0, 0.0), (282.9404, 4.70935e-5), (1.0, 0.0), (0.016709, -1.151e-9), (356.0470, 0.9856002585)),
+    "Moon": ((125.1228, -0.0529538083), (5.1454, 0.0), (318.0634, 0.1643573223), (60.2666, 0.0), (0.054900, 0.0), (115.3654, 13.0649929509)),
+    "Mercury": ((48.3313, 3.24587e-5), (7.0047, 5.00e-8), (29.1241, 1.01444e-5), (0.387098, 0.0), (0.205635, 5.59e-10), (168.6562, 4.0923344368)),
+    "Venus": ((76.6799, 2.46590e-5), (3.3946, 2.75e-8), (54.8910, 1.38374e-5), (0.723330, 0.0), (0.006773, -1.302e-9), (48.0052, 1.6021302244)),
+    "Mars": ((49.5574, 2.11081e-5), (1.8497, -1.78e-8), (286.5016, 2.92961e-5), (1.523688, 0.0), (0.093405, 2.516e-9), (18.6021, 0.5240207766)),
+    "Jupiter": ((100.4542, 2.76854e-5), (1.3030, -1.557e-7), (273.8777, 1.64505e-5), (5.20256, 0.0), (0.048498, 4.469e-9), (19.8950, 0.0830853001)),
+    "Saturn": ((113.6634, 2.38980e-5), (2.4886, -1.081e-7), (339.3939, 2.97661e-5), (9.55475, 0.0), (0.055546, -9.499e-9), (316.9670, 0.0334442282)),
+    "Uranus": ((74.0005, 1.3978e-5), (0.7733, 1.9e-8), (96.6612, 3.0565e-5), (19.18171, -1.55e-8), (0.047318, 7.45e-9), (142.5905, 0.011725806)),
+    "Neptune": ((131.7806, 3.0173e-5), (1.7700, -2.55e-7), (272.8461, -6.027e-6), (30.05826, 3.313e-8), (0.008606, 2.15e-9), (260.2471, 0.005995147)),
+}
+
+ArrayLike = Union[float, np.ndarray]
+
+
+# ===== 解析计算（用于生成星历表） =====
+
+def _element(body: str, d: np.ndarray) -> Tuple[np.ndarray, ...]:
+    return tuple(base + rate * d for base, rate in _ELEMENTS[body])
+
+
+def _orbit(body: str, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """返回 (黄经, 黄纬, 距离, 平近点角)，黄经黄纬为度；太阳为其视黄经"""
+    N, i, w, a, e, M = _element(body, d)
+    N, i, w, M_rad = np.radians(N), np.radians(i), np.radians(w), np.radians(M % 360)
+
+    # 开普勒方程，牛顿迭代
+    E = M_rad + e * np.sin(M_rad) * (1 + e * np.cos(M_rad))
+    for _ in range(5):
+        E = E - (E - e * np.sin(E) - M_rad) / (1 - e * np.cos(E))
+
+    xv = a * (np.cos(E) - e)
+    yv = a * np.sqrt(1 - e * e) * np.sin(E)
+    v = np.arctan2(yv, xv)
+    r = np.hypot(xv, yv)
+
+    x = r * (np.cos(N) * np.cos(v + w) - np.sin(N) * np.sin(v + w) * np.cos(i))
+    y = r * (np.sin(N) * np.cos(v + w) + np.cos(N) * np.sin(v + w) * np.cos(i))
+    z = r * np.sin(v + w) * np.sin(i)
+    lon = np.degrees(np.arctan2(y, x)) % 360
+    lat = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    return lon, lat, r, M % 360
+
+
+def _perturbations(body: str, d: np.ndarray) -> np.ndarray:
+    """黄经主要摄动项（度）"""
+    sin = lambda deg: np.sin(np.radians(deg))
+    cos = lambda deg: np.cos(np.radians(deg))
+
+    if body == "Moon":
+        Ms = _element("Sun", d)[5]
+        ws = _element("Sun", d)[2]
+        Nm, _, wm, _, _, Mm = _element("Moon", d)
+        Ls, Lm = Ms + ws, Mm + wm + Nm
+        D, F = Lm - Ls, Lm - Nm
+        return (
+            -1.274 * sin(Mm - 2 * D) + 0.658 * sin(2 * D) - 0.186 * sin(Ms)
+            - 0.059 * sin(2 * Mm - 2 * D) - 0.057 * sin(Mm - 2 * D + Ms) + 0.053 * sin(Mm + 2 * D)
+            + 0.046 * sin(2 * D - Ms) + 0.041 * sin(Mm - Ms) - 0.035 * sin(D)
+            - 0.031 * sin(Mm + Ms) - 0.015 * sin(2 * F - 2 * D) + 0.011 * sin(Mm - 4 * D)
+        )
+
+    Mj, Msat, Mu = (_element(name, d)[5] for name in ("Jupiter", "Saturn", "Uranus"))
+    if body == "Jupiter":
+        return (
+            -0.332 * sin(2 * Mj - 5 * Msat - 67.6) - 0.056 * sin(2 * Mj - 2 * Msat + 21)
+            + 0.042 * sin(3 * Mj - 5 * Msat + 21) - 0.036 * sin(Mj - 2 * Msat)
+            + 0.022 * cos(Mj - Msat) + 0.023 * sin(2 * Mj - 3 * Msat + 52) - 0.016 * sin(Mj - 5 * Msat - 69)
+        )
+    if body == "Saturn":
+        return (
+            0.812 * sin(2 * Mj - 5 * Msat - 67.6) - 0.229 * cos(2 * Mj - 4 * Msat - 2)
+            + 0.119 * sin(Mj - 2 * Msat - 3) + 0.046 * sin(2 * Mj - 6 * Msat - 69) + 0.014 * sin(Mj - 3 * Msat + 32)
+        )
+    if body == "Uranus":
+        return 0.040 * sin(Msat - 2 * Mu + 6) + 0.035 * sin(Msat - 3 * Mu + 33) - 0.015 * sin(Mj - Mu + 20)
+    return np.zeros_like(d)
+
+
+def compute_longitudes(jd: ArrayLike) -> np.ndarray:
+    """解析计算地心黄经，返回形状 (len(jd), len(BODIES)) 的数组（度）"""
+    d = np.atleast_1d(np.asarray(jd, dtype=np.float64)) - _EPOCH_JD
+    sun_lon, _, sun_r, _ = _orbit("Sun", d)
+    xs, ys = sun_r * np.cos(np.radians(sun_lon)), sun_r * np.sin(np.radians(sun_lon))
+
+    columns = []
+    for body in BODIES:
+        if body == "Sun":
+            columns.append(sun_lon)
+            continue
+        lon, lat, r, _ = _orbit(body, d)
+        lon = lon + _perturbations(body, d)
+        if body == "Moon":
+            columns.append(lon % 360)  # 月球根数本身就是地心的
+            continue
+        # 日心 -> 地心
+        x = r * np.cos(np.radians(lon)) * np.cos(np.radians(lat)) + xs
+        y = r * np.sin(np.radians(lon)) * np.cos(np.radians(lat)) + ys
+        columns.append(np.degrees(np.arctan2(y, x)) % 360)
+    return np.stack(columns, axis=1)
+
+
+def obliquity(jd: ArrayLike) -> ArrayLike:
+    """黄赤交角（度）"""
+    return 23.4393 - 3.563e-7 * (np.asarray(jd, dtype=np.float64) - _EPOCH_JD)
+
+
+# ===== 星历表文件 =====
+
+def table_path(directory: Optional[str] = None) -> str:
+    return os.path.join(directory or settings.ephemeris_dir, f"ephemeris_v{EPHEMERIS_VERSION}_1900_2100.npy")
+
+
+def build_table(path: str) -> None:
+    """生成星历表并原子地写入 path（多个 worker 同时生成时后写入者覆盖，内容相同）"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    table = compute_longitudes(START_JD + np.arange(DAYS, dtype=np.float64)).astype(np.float32)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Ephemeris:
+    """内存映射的星历表，线性插值查询"""
+
+    def __init__(self, table: np.ndarray):
+        if table.shape != (DAYS, len(BODIES)):
+            raise ValueError(f"星历表形状不正确: {table.shape}")
+        self.table = table
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, build_if_missing: bool = True) -> "Ephemeris":
+        path = path or table_path()
+        if not os.path.exists(path):
+            if not build_if_missing:
+                raise FileNotFoundError(path)
+            logger.info("星历表不存在，正在生成: %s", path)
+            build_table(path)
+        return cls(np.load(path, mmap_mode="r"))
+
+    def longitudes(self, jd: ArrayLike) -> np.ndarray:
+        """jd（UT 儒略日，标量或数组）处各天体黄经，形状 (n, len(BODIES))；超出表范围抛出 ValueError"""
+        position = np.atleast_1d(np.asarray(jd, dtype=np.float64)) - START_JD
+        if position.size and (position.min() < 0 or position.max() >= DAYS - 1):
+            raise ValueError("日期超出星历表范围（1900-2100）")
+        index = position.astype(np.int64)
+        fraction = (position - index)[:, None]
+        before = self.table[index].astype(np.float64)
+        after = self.table[index + 1].astype(np.float64)
+        delta = (after - before + 180) % 360 - 180
+        return (before + fraction * delta) % 360
+
+
+_ephemeris: Optional[Ephemeris] = None
+_ephemeris_lock = threading.Lock()
+
+
+def get_ephemeris() -> Ephemeris:
+    """获取全局星历表（首次调用时映射文件，文件不存在则先生成）"""
+    global _ephemeris
+    if _ephemeris is None:
+        with _ephemeris_lock:
+            if _ephemeris is None:
+                _ephemeris = Ephemeris.load()
+    return _ephemeris
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成预计算星历表")
+    parser.add_argument("--dir", default=None, help="输出目录，默认 settings.ephemeris_dir")
+    args = parser.parse_args()
+    path = table_path(args.dir)
+    build_table(path)
+    print(f"已生成 {path}（{os.path.getsize(path) / 1024 / 1024:.1f} MB）")
+
+
+if __name__ == "__main__":
+    main()
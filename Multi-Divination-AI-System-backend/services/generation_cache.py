@@ -0,0 +1,251 @@
+# services/generation_cache.py - 模型生成结果缓存（按提示词哈希，进程内 LRU + 数据库持久层）
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from constants import GEMINI_CONFIG
+from database import SessionLocal
+from models import DivinationMethod, GenerationCacheEntry
+from monitoring.metrics import record_generation_cache_lookup, set_generation_cache_bytes
+from services.model_client import ModelResult, build_generation_config
+
+logger = logging.getLogger("divination.generation_cache")
+
+# 提示词模板或缓存格式变化时递增，使旧缓存自然失效
+CACHE_KEY_VERSION = 1
+
+
+def normalize_input(value: Any) -> Any:
+    """规范化用户输入：字符串去除首尾空白并合并连续空白，递归处理字典和列表"""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: normalize_input(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize_input(item) for item in value]
+    return value
+
+
+def build_cache_key(parts: List[Dict[str, Any]], model: str) -> str:
+    """
+    计算缓存键：提示词 parts + 模型 + 生成参数（GEMINI_CONFIG 中影响输出的部分）的规范 JSON 的 SHA-256
+
+    提示词由规范化后的方法、输入数据、问题和用户名构建，
+    因此与提示词无关的输入字段不会影响命中，输入中的空白差异也不会。
+    """
+    canonical = json.dumps(
+        {
+            "v": CACHE_KEY_VERSION,
+            "model": model,
+            "config": build_generation_config(),
+            "safety": GEMINI_CONFIG["SAFETY_THRESHOLD"],
+            "parts": parts
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    生成结果缓存
+
+    - 进程内层：OrderedDict 实现的 LRU，带 TTL，总占用按报告文本的 UTF-8 字节数限制
+    - 持久层（可选）：generation_cache 表，多个 worker 和重启之间共享；进程内未命中时查询，命中后回填进程内层
+    - 缓存读写失败只记录日志，不影响生成流程
+    """
+
+    def __init__(
+        self,
+        ttl: int = 7 * 24 * 3600,
+        max_bytes: int = 32 * 1024 * 1024,
+        persistent: bool = True,
+        session_factory=SessionLocal
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.persistent = persistent
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[str, Tuple[float, ModelResult, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ===== 查询 =====
+
+    async def get(self, key: str) -> Optional[ModelResult]:
+        result = self._get_memory(key)
+        record_generation_cache_lookup("memory", result is not None)
+        if result is None and self.persistent:
+            result = await asyncio.to_thread(self._load, key)
+            record_generation_cache_lookup("database", result is not None)
+            if result is not None:
+                self._put_memory(key, result)
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def _get_memory(self, key: str) -> Optional[ModelResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result, _ = entry
+            if expires_at <= time.monotonic():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def _load(self, key: str) -> Optional[ModelResult]:
+        db = None
+        try:
+            db = self.session_factory()
+            entry = db.get(GenerationCacheEntry, key)
+            if entry is None or entry.expires_at <= datetime.utcnow():
+                return None
+            return ModelResult(
+                text=entry.output_text,
+                model=entry.model,
+                latency=0.0,
+                prompt_tokens=entry.prompt_tokens,
+                output_tokens=entry.output_tokens,
+                cached=True
+            )
+        except Exception as e:
+            logger.warning("读取生成缓存失败: %s", e)
+            return None
+        finally:
+            if db is not None:
+                db.close()
+
+    # ===== 写入 =====
+
+    async def put(self, key: str, method: DivinationMethod, result: ModelResult) -> None:
+        cached = ModelResult(
+            text=result.text,
+            model=result.model,
+            latency=0.0,
+            prompt_tokens=result.prompt_tokens,
+            output_tokens=result.output_tokens,
+            cached=True
+        )
+        self._put_memory(key, cached)
+        if self.persistent:
+            await asyncio.to_thread(self._store, key, method, cached)
+
+    def _put_memory(self, key: str, result: ModelResult) -> None:
+        size = len(result.text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.monotonic() + self.ttl, result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+            set_generation_cache_bytes(self._bytes)
+
+    def _evict(self, key: str) -> None:
+        """调用方需持有 self._lock"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        set_generation_cache_bytes(self._bytes)
+
+    def _store(self, key: str, method: DivinationMethod, result: ModelResult) -> None:
+        db = None
+        try:
+            db = self.session_factory()
+            now = datetime.utcnow()
+            db.merge(GenerationCacheEntry(
+                cache_key=key,
+                method=method,
+                model=result.model,
+                output_text=result.text,
+                prompt_tokens=result.prompt_tokens,
+                output_tokens=result.output_tokens,
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.ttl)
+            ))
+            db.commit()
+        except IntegrityError:
+            # 其它 worker 同时写入了相同的键，内容等价，忽略即可
+            db.rollback()
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            logger.warning("写入生成缓存失败: %s", e)
+        finally:
+            if db is not None:
+                db.close()
+
+    # ===== 维护 =====
+
+    def purge_expired(self) -> int:
+        """删除数据库中已过期的缓存，返回删除条数"""
+        with self._lock:
+            now = time.monotonic()
+            for key in [k for k, (expires_at, _, _) in self._entries.items() if expires_at <= now]:
+                self._evict(key)
+
+        if not self.persistent:
+            return 0
+        db = self.session_factory()
+        try:
+            result = db.execute(
+                delete(GenerationCacheEntry).where(GenerationCacheEntry.expires_at <= datetime.utcnow())
+            )
+            db.commit()
+            return result.rowcount
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def clear(self) -> None:
+        """清空进程内缓存（不影响数据库）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            set_generation_cache_bytes(0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# 全局缓存实例
+generation_cache = GenerationCache(
+    ttl=settings.generation_cache_ttl,
+    max_bytes=settings.generation_cache_max_bytes,
+    persistent=settings.generation_cache_persistent
+)
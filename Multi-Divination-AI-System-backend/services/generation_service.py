@@ -0,0 +1,325 @@
+# services/generation_service.py - 后端报告生成（各方法并发生成，再生成综合报告并保存；支持流式输出）
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import anyio
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from models import DivinationMethod, Reading
+from schemas import GenerationRequest, BatchReadingCreate, BatchReadingResponse
+from constants import TEST_USER_ID, ERROR_MESSAGES
+from config import settings
+from services.batch_service import BatchService
+from services.model_client import GeminiClient, ModelResult, get_model_client
+from services.generation_cache import GenerationCache, generation_cache, build_cache_key, normalize_input
+from services.prompts import build_method_prompt
+from services.token_budget import integrated_prompt, usage_from_result
+from services.tarot import new_seed
+
+logger = logging.getLogger("divination.generation")
+
+
+class MethodGenerationResult:
+    """单个方法的生成结果（成功时有 result，失败时有 error）"""
+
+    def __init__(
+        self,
+        method: DivinationMethod,
+        result: Optional[ModelResult] = None,
+        error: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ):
+        self.method = method
+        self.result = result
+        self.error = error
+        self.usage = usage
+
+    @property
+    def ok(self) -> bool:
+        return self.result is not None
+
+
+class GenerationService:
+    def __init__(
+        self,
+        db: Session,
+        client: Optional[GeminiClient] = None,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[GenerationCache] = None
+    ):
+        self.db = db
+        self.client = client or get_model_client()
+        self.cache = cache or (generation_cache if settings.generation_cache_enabled else None)
+        self.semaphore = asyncio.Semaphore(max_concurrency or settings.generation_max_concurrency)
+
+    async def generate_batch(self, request: GenerationRequest, user_id: int = TEST_USER_ID) -> BatchReadingResponse:
+        """并发生成各方法报告，完成后生成综合报告，并通过 BatchService 一次性保存"""
+        start = time.perf_counter()
+        request = self.with_tarot_seed(request)
+
+        # 1. 各方法并发生成（受 semaphore 限制）
+        method_results = await self.generate_individual_reports(request)
+        succeeded = [r for r in method_results if r.ok]
+        errors = {r.method: r.error for r in method_results if not r.ok}
+        if not succeeded:
+            await self._record_failures(request, errors, user_id)
+            raise Exception(f"所有占卜方法生成失败: {'; '.join(f'{m.value}: {e}' for m, e in errors.items())}")
+
+        individual_reports = {r.method.value: r.result.text for r in succeeded}
+        token_usage = {r.method.value: r.usage for r in succeeded}
+
+        # 2. 综合报告（多于一个方法成功时）；失败时仍保存单项报告
+        integrated_report = None
+        if request.generate_integrated and len(succeeded) > 1:
+            try:
+                parts, budget_stats = integrated_prompt(
+                    individual_reports,
+                    normalize_input(request.primary_question),
+                    normalize_input(request.user_name)
+                )
+                integrated_result = await self._generate(DivinationMethod.INTEGRATED, parts, use_cache=request.use_cache)
+                integrated_report = integrated_result.text
+                token_usage[DivinationMethod.INTEGRATED.value] = {
+                    **usage_from_result(integrated_result, parts), **budget_stats
+                }
+            except Exception as e:
+                errors[DivinationMethod.INTEGRATED] = str(e)
+
+        # 3. 保存（同步数据库操作放到线程中执行）
+        batch_data = BatchReadingCreate(
+            user_name=request.user_name,
+            primary_question=request.primary_question,
+            selected_methods=[r.method.value for r in succeeded],
+            input_data=request.input_data,
+            individual_reports=individual_reports,
+            integrated_report=integrated_report,
+            ai_model_used=self.client.model,
+            total_processing_time=int(time.perf_counter() - start),
+            token_usage=token_usage
+        )
+        response = await asyncio.to_thread(BatchService(self.db).create_batch_readings, batch_data, user_id)
+
+        if errors:
+            await self._record_failures(request, errors, user_id)
+            response.message = f"{response.message}（以下方法生成失败: {', '.join(m.value for m in errors)}）"
+        return response
+
+    async def _record_failures(
+        self,
+        request: GenerationRequest,
+        errors: Dict[DivinationMethod, str],
+        user_id: int = TEST_USER_ID
+    ) -> None:
+        """失败的方法保存为 FAILED 状态的报告；记录失败本身出错时不影响已生成的结果"""
+        try:
+            await asyncio.to_thread(
+                BatchService(self.db).create_failed_readings, request, errors, self.client.model, user_id
+            )
+        except Exception as e:
+            logger.warning("保存生成失败记录失败: %s", e)
+
+    async def generate_individual_reports(self, request: GenerationRequest) -> List[MethodGenerationResult]:
+        methods = self.selected_methods(request)
+        return await asyncio.gather(*(self._generate_method(method, request) for method in methods))
+
+    @staticmethod
+    def selected_methods(request: GenerationRequest) -> List[DivinationMethod]:
+        """校验并返回所选的单项占卜方法（综合报告不能直接选择）"""
+        methods = [DivinationMethod(m.value) for m in request.selected_methods]
+        if DivinationMethod.INTEGRATED in methods:
+            raise ValueError(ERROR_MESSAGES["INVALID_METHOD"])
+        return methods
+
+    # ===== 流式生成 =====
+
+    async def stream_batch(
+        self,
+        request: GenerationRequest,
+        user_id: int = TEST_USER_ID
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        流式生成：各方法并发生成，文本片段到达即产出 (事件名, 数据)，最后生成综合报告
+
+        报告在开始时以 PROCESSING 状态保存，生成完成后写入内容并改为 COMPLETED；
+        生成失败或客户端中途断开时，未完成的报告标记为 FAILED。
+        事件: start, token, done, error, integrated_start, complete
+        """
+        start = time.perf_counter()
+        methods = self.selected_methods(request)
+        request = self.with_tarot_seed(request)
+        batch_service = BatchService(self.db)
+        # 报告对象在多次提交之间还要在事件循环中读取，避免提交后过期导致在事件循环线程中重新查询
+        self.db.expire_on_commit = False
+
+        persona, readings = await asyncio.to_thread(
+            batch_service.create_processing_readings, request, methods, self.client.model, user_id
+        )
+        pending_ids = {reading.id for reading in readings}
+        completed: List[Reading] = []
+        reports: Dict[str, str] = {}
+        yield "start", {
+            "persona_id": persona.id,
+            "readings": [{"method": r.method.value, "reading_id": r.id} for r in readings]
+        }
+
+        async def persist(
+            event: str,
+            data: Dict[str, Any],
+            reading: Reading,
+            outcome: Optional[Dict[str, Any]]
+        ) -> None:
+            if event == "done":
+                await asyncio.to_thread(
+                    batch_service.finish_reading,
+                    reading, outcome["text"], int(time.perf_counter() - start), outcome["usage"]
+                )
+                completed.append(reading)
+                reports[reading.method.value] = outcome["text"]
+            elif event == "error":
+                await asyncio.to_thread(batch_service.fail_reading, reading, data["detail"])
+            if event in ("done", "error"):
+                pending_ids.discard(reading.id)
+
+        try:
+            # aclosing 保证客户端断开时立即取消仍在进行的模型调用
+            items = [(reading, self._method_parts(reading.method, request)) for reading in readings]
+            async with aclosing(self._stream_readings(items, request.use_cache)) as events:
+                async for event, data, reading, outcome in events:
+                    await persist(event, data, reading, outcome)
+                    yield event, data
+
+            sources = list(completed)
+            integrated_reading = None
+            if request.generate_integrated and len(sources) > 1:
+                # 源报告按所选方法的顺序排列，使综合报告提示词（及缓存键）与完成顺序无关
+                sources.sort(key=lambda r: methods.index(r.method))
+                parts, budget_stats = integrated_prompt(
+                    {r.method.value: reports[r.method.value] for r in sources},
+                    normalize_input(request.primary_question),
+                    normalize_input(request.user_name)
+                )
+                integrated_reading = await asyncio.to_thread(
+                    batch_service.create_processing_integrated_reading,
+                    persona.id, request, sources, self.client.model, budget_stats, user_id
+                )
+                pending_ids.add(integrated_reading.id)
+                yield "integrated_start", {
+                    "reading_id": integrated_reading.id,
+                    "source_reading_ids": [r.id for r in sources]
+                }
+
+                async with aclosing(self._stream_readings([(integrated_reading, parts)], request.use_cache)) as events:
+                    async for event, data, reading, outcome in events:
+                        await persist(event, data, reading, outcome)
+                        yield event, data
+                if integrated_reading not in completed:
+                    integrated_reading = None
+
+            yield "complete", {
+                "persona_id": persona.id,
+                "reading_ids": [r.id for r in sources],
+                "integrated_reading_id": integrated_reading.id if integrated_reading else None,
+                "failed_methods": [r.method.value for r in readings if r not in completed],
+                "elapsed": round(time.perf_counter() - start, 3)
+            }
+        finally:
+            if pending_ids:
+                # 客户端断开时当前任务已被取消，屏蔽取消直到状态落库
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(batch_service.fail_readings, list(pending_ids))
+
+    async def _stream_readings(
+        self,
+        items: List[Tuple[Reading, list]],
+        use_cache: bool
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any], Reading, Optional[Dict[str, Any]]]]:
+        """并发流式生成多条报告，按到达顺序交错产出事件"""
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(self._stream_one(reading, parts, use_cache, queue))
+            for reading, parts in items
+        ]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item[0] in ("done", "error"):
+                    remaining -= 1
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _stream_one(self, reading: Reading, parts, use_cache: bool, queue: asyncio.Queue) -> None:
+        info = {"method": reading.method.value, "reading_id": reading.id}
+        try:
+            key = build_cache_key(parts, self.client.model) if self.cache is not None else None
+            cached = await self.cache.get(key) if key is not None and use_cache else None
+            if cached is not None:
+                await queue.put(("token", {**info, "text": cached.text}, reading, None))
+                result = cached
+            else:
+                start = time.perf_counter()
+                chunks = []
+                async with self.semaphore:
+                    async for chunk in self.client.stream_generate(parts):
+                        chunks.append(chunk)
+                        await queue.put(("token", {**info, "text": chunk}, reading, None))
+                result = ModelResult(text="".join(chunks), model=self.client.model, latency=time.perf_counter() - start)
+                if key is not None:
+                    await self.cache.put(key, reading.method, result)
+            outcome = {"text": result.text, "usage": usage_from_result(result, parts)}
+            await queue.put(("done", {**info, "length": len(result.text)}, reading, outcome))
+        except Exception as e:
+            await queue.put(("error", {**info, "detail": str(e)}, reading, None))
+
+    @staticmethod
+    def with_tarot_seed(request: GenerationRequest) -> GenerationRequest:
+        """
+        需要塔罗且客户端既没有提供种子、也没有自己选牌时由服务端抽牌：生成种子写入 input_data，
+        之后提示词和保存的报告都由同一种子复现同一次抽牌。
+        客户端传了 selected_cards / card_positions 时保持原样，不用服务端抽牌覆盖用户的选择
+        """
+        if DivinationMethod.TAROT.value not in request.selected_methods:
+            return request
+        if any(request.input_data.get(key) for key in ("tarot_seed", "selected_cards", "card_positions")):
+            return request
+        return request.copy(update={"input_data": {**request.input_data, "tarot_seed": new_seed()}})
+
+    @staticmethod
+    def _method_parts(method: DivinationMethod, request: GenerationRequest):
+        return build_method_prompt(
+            method,
+            normalize_input(request.input_data),
+            normalize_input(request.primary_question),
+            normalize_input(request.user_name)
+        )
+
+    async def _generate_method(self, method: DivinationMethod, request: GenerationRequest) -> MethodGenerationResult:
+        try:
+            parts = self._method_parts(method, request)
+            result = await self._generate(method, parts, request.use_cache)
+            return MethodGenerationResult(method, result=result, usage=usage_from_result(result, parts))
+        except Exception as e:
+            return MethodGenerationResult(method, error=str(e))
+
+    async def _generate(self, method: DivinationMethod, parts, use_cache: bool = True) -> ModelResult:
+        """先查生成结果缓存，未命中再调用模型并回写缓存"""
+        key = None
+        if self.cache is not None:
+            key = build_cache_key(parts, self.client.model)
+            if use_cache:
+                cached = await self.cache.get(key)
+                if cached is not None:
+                    return cached
+
+        async with self.semaphore:
+            result = await self.client.generate(parts)
+
+        if key is not None:
+            await self.cache.put(key, method, result)
+        return result
@@ -0,0 +1,97 @@
+# services/input_fields.py - input_data 中常用查询字段的提取与回填
+"""
+Reading.input_data 是无类型的 JSON，按其中的字段筛选需要逐行解析。常用的查询字段在写入报告时
+提取到 Reading 上有类型、有索引的列：
+
+- spread_type: 塔罗牌阵（优先取服务端抽牌记录中的牌阵）
+- mbti_type: MBTI 类型（问卷计分后的结果）
+- birth_date: 出生日期（生命数字、占星）
+- created_via: 创建途径
+
+已有数据通过回填任务补齐（按主键分批、每批单独提交，只更新值有变化的行，可重复执行）。
+回填不在应用启动时执行，作为部署步骤在数据库迁移之后运行一次：
+
+    python -m services.input_fields --batch-size 1000
+"""
+import argparse
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import Reading
+from services.mbti import MBTI_TYPES
+from services.numerology import parse_birth_date
+
+INDEXED_FIELDS = ("spread_type", "mbti_type", "birth_date", "created_via")
+
+
+def _short_string(value: Any, max_length: int) -> Optional[str]:
+    if not isinstance(value, str) or not value or len(value) > max_length:
+        return None
+    return value
+
+
+def indexed_fields(input_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """从 input_data 提取常用查询字段，缺失或无效的字段为 None"""
+    input_data = input_data or {}
+    draw = input_data.get("tarot_draw") or {}
+    mbti_type = str(input_data.get("mbti_type") or "").upper()
+    return {
+        "spread_type": _short_string(draw.get("spread_type") or input_data.get("spread_type"), 32),
+        "mbti_type": mbti_type if mbti_type in MBTI_TYPES else None,
+        "birth_date": parse_birth_date(input_data.get("birth_date")),
+        "created_via": _short_string(input_data.get("created_via"), 32),
+    }
+
+
+def backfill_indexed_fields(db: Session, batch_size: int = 1000) -> int:
+    """按主键分批回填已有报告的查询字段，返回更新的行数"""
+    columns = [getattr(Reading, field) for field in INDEXED_FIELDS]
+    updated = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.execute(
+                select(Reading.id, Reading.input_data, *columns)
+                .where(Reading.id > last_id)
+                .order_by(Reading.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            changes = []
+            for row in rows:
+                values = indexed_fields(row.input_data)
+                if any(getattr(row, field) != values[field] for field in INDEXED_FIELDS):
+                    changes.append({"id": row.id, **values})
+            if changes:
+                # 按主键的 ORM 批量更新（executemany）
+                db.execute(update(Reading), changes)
+                db.commit()
+                updated += len(changes)
+        return updated
+
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"回填报告查询字段失败: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填报告的常用查询字段")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        updated = backfill_indexed_fields(db, args.batch_size)
+        print(f"已回填 {updated} 条报告")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
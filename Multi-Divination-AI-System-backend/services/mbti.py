@@ -0,0 +1,218 @@
+# services/mbti.py - MBTI 问卷计分引擎（权重表 + NumPy 矩阵运算，支持批量计分）
+"""
+计分模型：
+
+- 每道题对四个维度（EI、SN、TF、JP）各有一个权重，组成权重表 W（题数 × 4）
+- 每份答卷转成一行答案向量：+1 偏向维度的第一极（E/S/T/J），-1 偏向第二极（I/N/F/P），
+  0 为中立，未作答为 NaN；多份答卷组成答案矩阵 A（份数 × 题数）
+- 维度得分 = (A·W) / (|W| 的已作答部分之和 + PRIOR_WEIGHT)，范围 (-1, 1)；
+  PRIOR_WEIGHT 相当于若干道中立题，答题越少得分越向 0 收缩
+- 类型取每个维度得分的符号（0 归第一极），置信度 = 四个维度 |得分| 的平均值 × 100
+
+题号与前端 MBTI_QUIZ_QUESTIONS 一致（q1_ei ... q4_jp），其余题目可由 GET /mbti/questions 获取。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DIMENSIONS = ("EI", "SN", "TF", "JP")
+MBTI_TYPES = tuple(a + b + c + d for a in "EI" for b in "SN" for c in "TF" for d in "JP")
+
+# 相当于每个维度额外 PRIOR_WEIGHT 道中立题
+PRIOR_WEIGHT = 2.0
+
+# 题库：题号 -> 题目、选项（第一极, 第二极）和各维度权重
+QUESTIONS: Dict[str, Dict[str, Any]] = {
+    "q1_ei": {
+        "text": "When you are at a social gathering, do you typically:",
+        "options": ("Feel energized by interacting with many people, including strangers.",
+                    "Prefer to spend time with a few people you know well, and feel drained by too much socializing."),
+        "weights": {"EI": 1.0},
+    },
+    "q2_sn": {
+        "text": "When learning something new, do you prefer to:",
+        "options": ("Focus on concrete facts, details, and practical applications.",
+                    "Look for patterns, connections, and future possibilities."),
+        "weights": {"SN": 1.0},
+    },
+    "q3_tf": {
+        "text": "When making important decisions, do you prioritize:",
+        "options": ("Logic, objective principles, and fairness.",
+                    "Harmony, empathy, and how the decision will affect others."),
+        "weights": {"TF": 1.0},
+    },
+    "q4_jp": {
+        "text": "Regarding your lifestyle and plans, do you prefer to:",
+        "options": ("Have things decided, organized, and planned out.",
+                    "Keep your options open and be spontaneous and flexible."),
+        "weights": {"JP": 1.0},
+    },
+    "q5_ei": {
+        "text": "After a long week, how do you prefer to recharge?",
+        "options": ("Going out and meeting friends.", "Spending quiet time alone or with one close person."),
+        "weights": {"EI": 1.0},
+    },
+    "q6_ei": {
+        "text": "In a group discussion, you usually:",
+        "options": ("Think out loud and speak up early.", "Listen first and speak once your thoughts are formed."),
+        "weights": {"EI": 0.8},
+    },
+    "q7_sn": {
+        "text": "When giving directions, you tend to:",
+        "options": ("Give exact street names and distances.", "Describe landmarks and the general picture."),
+        "weights": {"SN": 1.0},
+    },
+    "q8_sn": {
+        "text": "You trust more:",
+        "options": ("Experience and what has worked before.", "Hunches and what could work in the future."),
+        "weights": {"SN": 0.8, "JP": 0.2},
+    },
+    "q9_tf": {
+        "text": "When a friend shares a problem, your first reaction is to:",
+        "options": ("Analyse it and suggest a solution.", "Acknowledge their feelings and offer support."),
+        "weights": {"TF": 1.0},
+    },
+    "q10_tf": {
+        "text": "Which compliment would you value more?",
+        "options": ("You are very competent.", "You are very caring."),
+        "weights": {"TF": 0.8},
+    },
+    "q11_jp": {
+        "text": "With a deadline two weeks away, you usually:",
+        "options": ("Start early and work to a plan.", "Work in bursts and finish close to the deadline."),
+        "weights": {"JP": 1.0},
+    },
+    "q12_jp": {
+        "text": "Your workspace is usually:",
+        "options": ("Tidy, with everything in its place.", "Flexible, organised in a way only you understand."),
+        "weights": {"JP": 0.8, "SN": -0.2},
+    },
+}
+
+QUESTION_IDS = tuple(QUESTIONS)
+# 前端当前以维度为键保存答案（{"EI": "E", ...}），对应每个维度的第一道题
+ANSWER_ALIASES = {"EI": "q1_ei", "SN": "q2_sn", "TF": "q3_tf", "JP": "q4_jp"}
+
+WEIGHTS = np.array(
+    [[QUESTIONS[qid]["weights"].get(dim, 0.0) for dim in DIMENSIONS] for qid in QUESTION_IDS],
+    dtype=np.float64
+)
+_QUESTION_INDEX = {qid: index for index, qid in enumerate(QUESTION_IDS)}
+# 题目所属的主维度（权重绝对值最大的维度），用于把 E/I 等字母答案换算成 ±1
+_PRIMARY_DIMENSION = {qid: DIMENSIONS[int(np.argmax(np.abs(WEIGHTS[i])))] for qid, i in _QUESTION_INDEX.items()}
+
+
+class MBTIScoringError(ValueError):
+    """答卷中有无效的题号或答案"""
+
+
+def primary_dimension(question_id: str) -> str:
+    return _PRIMARY_DIMENSION[question_id]
+
+
+def _answer_value(question_id: str, value: Any) -> float:
+    """字母答案按题目主维度换算为 ±1，数字答案需在 [-1, 1] 内"""
+    if isinstance(value, str):
+        letter = value.strip().upper()
+        poles = primary_dimension(question_id)
+        if letter == poles[0]:
+            return 1.0
+        if letter == poles[1]:
+            return -1.0
+        raise MBTIScoringError(f"题目 {question_id} 的答案必须是 {poles[0]} 或 {poles[1]}")
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and -1 <= value <= 1:
+        return float(value)
+    raise MBTIScoringError(f"题目 {question_id} 的答案无效: {value!r}")
+
+
+def answer_matrix(submissions: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """答卷列表 -> 答案矩阵（份数 × 题数），未作答为 NaN"""
+    matrix = np.full((len(submissions), len(QUESTION_IDS)), np.nan)
+    for row, answers in enumerate(submissions):
+        for key, value in (answers or {}).items():
+            question_id = ANSWER_ALIASES.get(key, key)
+            if question_id not in _QUESTION_INDEX:
+                raise MBTIScoringError(f"未知的题目: {key}")
+            if value is None:
+                continue
+            matrix[row, _QUESTION_INDEX[question_id]] = _answer_value(question_id, value)
+    return matrix
+
+
+def score_matrix(answers: np.ndarray, weights: np.ndarray = WEIGHTS) -> Dict[str, np.ndarray]:
+    """
+    对答案矩阵计分，返回列式结果：
+    {"scores": (n, 4) 维度得分, "types": (n,) 类型, "confidence": (n,) 1-100, "answered": (n,) 作答题数}
+    """
+    answered = ~np.isnan(answers)
+    raw = np.where(answered, answers, 0.0) @ weights
+    capacity = answered.astype(np.float64) @ np.abs(weights)
+    scores = raw / (capacity + PRIOR_WEIGHT)
+
+    # 每个维度得分 >= 0 取第一极：按位组合成 0-15 的类型编号（与 MBTI_TYPES 顺序一致）
+    second_pole = (scores < 0).astype(np.int64)
+    type_index = second_pole @ np.array([8, 4, 2, 1])
+    confidence = np.clip(np.rint(np.abs(scores).mean(axis=1) * 100), 1, 100).astype(np.int64)
+    return {
+        "scores": scores,
+        "types": np.array(MBTI_TYPES)[type_index],
+        "confidence": confidence,
+        "answered": answered.sum(axis=1),
+    }
+
+
+def score_submissions(submissions: Sequence[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """批量计分，未作答任何题目的答卷为 None；其余为 score_answers 相同结构的字典"""
+    result = score_matrix(answer_matrix(submissions))
+    scored: List[Optional[Dict[str, Any]]] = []
+    for row in range(len(submissions)):
+        if not result["answered"][row]:
+            scored.append(None)
+            continue
+        scored.append({
+            "mbti_type": str(result["types"][row]),
+            "scores": {dim: round(float(value), 4) for dim, value in zip(DIMENSIONS, result["scores"][row])},
+            "confidence": int(result["confidence"][row]),
+            "answered": int(result["answered"][row]),
+        })
+    return scored
+
+
+def score_answers(answers: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    单份答卷计分，没有作答时返回 None
+
+    返回 {"mbti_type", "scores": {"EI": ..., ...}, "confidence", "answered"}
+    """
+    if not answers:
+        return None
+    return score_submissions([answers])[0]
+
+
+def resolve_scores(input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    从输入数据的 quiz_answers 计分
+
+    没有答卷或答卷无效时返回 None，此时沿用用户自填的 mbti_type；
+    得分为 0（未作答或两极持平）的维度也沿用自填类型的字母。
+    """
+    try:
+        result = score_answers(input_data.get("quiz_answers"))
+    except (MBTIScoringError, AttributeError):
+        return None
+    stated = str(input_data.get("mbti_type") or "").upper()
+    if result is not None and stated in MBTI_TYPES:
+        result["mbti_type"] = "".join(
+            stated[index] if result["scores"][dim] == 0 else letter
+            for index, (dim, letter) in enumerate(zip(DIMENSIONS, result["mbti_type"]))
+        )
+    return result
+
+
+def describe_scores(result: Dict[str, Any]) -> str:
+    """提示词用的维度倾向描述，如 "E 67% / I 33%" """
+    parts = []
+    for dim, score in result["scores"].items():
+        first = round((1 + score) / 2 * 100)
+        parts.append(f"{dim[0]} {first}% / {dim[1]} {100 - first}%")
+    return ", ".join(parts)
@@ -0,0 +1,176 @@
+# services/model_client.py - Gemini REST 客户端（可通过 gemini_base_url 指向本地假模型服务）
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from config import settings
+from constants import GEMINI_CONFIG
+
+
+class ModelError(Exception):
+    """模型调用失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ModelResult:
+    """一次模型调用的结果"""
+    text: str
+    model: str
+    latency: float                      # 秒
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached: bool = False                # 是否来自生成结果缓存
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+
+def build_generation_config() -> Dict[str, Any]:
+    return {
+        "temperature": GEMINI_CONFIG["TEMPERATURE"],
+        "topP": GEMINI_CONFIG["TOP_P"],
+        "topK": GEMINI_CONFIG["TOP_K"],
+        "maxOutputTokens": GEMINI_CONFIG["MAX_TOKENS"],
+    }
+
+
+SAFETY_CATEGORIES = [
+    "HARM_CATEGORY_HARASSMENT",
+    "HARM_CATEGORY_HATE_SPEECH",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+    "HARM_CATEGORY_DANGEROUS_CONTENT",
+]
+
+
+class GeminiClient:
+    """
+    调用 Gemini generateContent 接口
+
+    共享一个 httpx.AsyncClient 以复用连接；transport 参数可注入 httpx.ASGITransport，
+    在进程内直接调用本地假模型服务（见 benchmarks/fake_model_server.py）。
+    """
+
+    def __init__(
+        self,
+        api_key: str = "",
+        base_url: str = "https://generativelanguage.googleapis.com",
+        model: str = GEMINI_CONFIG["MODEL_NAME"],
+        timeout: float = 60.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_key = api_key
+        self.model = model
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            transport=transport,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+
+    def _request_body(self, parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "contents": [{"role": "user", "parts": parts}],
+            "generationConfig": build_generation_config(),
+            "safetySettings": [
+                {"category": category, "threshold": GEMINI_CONFIG["SAFETY_THRESHOLD"]}
+                for category in SAFETY_CATEGORIES
+            ],
+        }
+
+    async def generate(self, parts: List[Dict[str, Any]], model: Optional[str] = None) -> ModelResult:
+        model = model or self.model
+        start = time.perf_counter()
+        try:
+            response = await self._client.post(
+                f"/v1beta/models/{model}:generateContent",
+                params={"key": self.api_key},
+                json=self._request_body(parts)
+            )
+        except httpx.HTTPError as e:
+            raise ModelError(f"模型请求失败: {e}") from e
+
+        if response.status_code != 200:
+            raise ModelError(f"模型返回错误 {response.status_code}: {response.text[:200]}", response.status_code)
+
+        payload = response.json()
+        usage = payload.get("usageMetadata", {})
+        return ModelResult(
+            text=extract_text(payload),
+            model=model,
+            latency=time.perf_counter() - start,
+            prompt_tokens=usage.get("promptTokenCount"),
+            output_tokens=usage.get("candidatesTokenCount"),
+            raw=payload
+        )
+
+    async def stream_generate(self, parts: List[Dict[str, Any]], model: Optional[str] = None) -> AsyncIterator[str]:
+        """调用 streamGenerateContent（SSE），逐段产出文本"""
+        model = model or self.model
+        try:
+            async with self._client.stream(
+                "POST",
+                f"/v1beta/models/{model}:streamGenerateContent",
+                params={"key": self.api_key, "alt": "sse"},
+                json=self._request_body(parts)
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    raise ModelError(f"模型返回错误 {response.status_code}: {body[:200]}", response.status_code)
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    text = extract_text(json.loads(line[5:]))
+                    if text:
+                        yield text
+        except httpx.HTTPError as e:
+            raise ModelError(f"模型请求失败: {e}") from e
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def extract_text(payload: Dict[str, Any]) -> str:
+    """从 generateContent 响应中取出文本"""
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        raise ModelError("模型没有返回内容")
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+_model_client: Optional[GeminiClient] = None
+
+
+def get_model_client() -> GeminiClient:
+    """全局共享的模型客户端（默认包装重试/对冲/熔断策略，见 services/resilience.py）"""
+    global _model_client
+    if _model_client is None:
+        client = GeminiClient(
+            api_key=settings.gemini_api_key,
+            base_url=settings.gemini_base_url,
+            timeout=settings.generation_timeout
+        )
+        if settings.generation_resilience_enabled:
+            from services.resilience import build_resilient_client
+            client = build_resilient_client(client)
+        _model_client = client
+    return _model_client
+
+
+def set_model_client(client: Optional[GeminiClient]) -> None:
+    """替换全局模型客户端（测试和基准测试中注入假模型服务）"""
+    global _model_client
+    _model_client = client
+
+
+async def close_model_client() -> None:
+    global _model_client
+    if _model_client is not None:
+        await _model_client.aclose()
+        _model_client = None
@@ -0,0 +1,186 @@
+# services/numerology.py - 生命数字计算引擎（确定性计算，支持 NumPy 向量化批量计算）
+"""
+毕达哥拉斯数字学：
+
+- 生命灵数（Life Path）：月、日、年分别约简后相加再约简
+- 生日数（Birthday）：出生日约简
+- 表达数（Expression）：姓名中拉丁字母按 A=1 ... I=9, J=1 ... 循环取值后求和约简；
+  姓名不含拉丁字母（如中文名）时没有表达数
+- 约简过程中遇到 11、22、33 主数时保留，不再继续约简
+
+单个计算使用纯 Python，批量计算使用 NumPy 数组运算，两者结果一致。
+"""
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+MASTER_NUMBERS = (11, 22, 33)
+
+# 字节值 -> 字母数值，非拉丁字母为 0
+_LETTER_VALUES = np.zeros(256, dtype=np.int64)
+for _offset in range(26):
+    _LETTER_VALUES[ord("A") + _offset] = _LETTER_VALUES[ord("a") + _offset] = _offset % 9 + 1
+
+DateLike = Union[str, date, datetime]
+
+
+# ===== 单个计算 =====
+
+def reduce_number(value: int) -> int:
+    """各位数字反复相加直到只剩一位，主数保留"""
+    while value > 9 and value not in MASTER_NUMBERS:
+        value = sum(int(digit) for digit in str(value))
+    return value
+
+
+def parse_birth_date(value: Optional[DateLike]) -> Optional[date]:
+    """解析出生日期（date/datetime 或 YYYY-MM-DD 字符串），无法解析返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+
+def life_path_number(birth_date: date) -> int:
+    return reduce_number(
+        reduce_number(birth_date.month) + reduce_number(birth_date.day) + reduce_number(birth_date.year)
+    )
+
+
+def expression_number(name: Optional[str]) -> Optional[int]:
+    if not name:
+        return None
+    total = int(_LETTER_VALUES[np.frombuffer(name.encode("latin-1", "ignore"), dtype=np.uint8)].sum())
+    return reduce_number(total) if total else None
+
+
+def numerology_profile(birth_date: Optional[DateLike], name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    计算单个用户的数字学档案，出生日期无效时返回 None
+
+    返回 {"life_path_number", "birthday_number", "expression_number", "master_numbers"}
+    """
+    parsed = parse_birth_date(birth_date)
+    if parsed is None:
+        return None
+
+    numbers = {
+        "life_path_number": life_path_number(parsed),
+        "birthday_number": reduce_number(parsed.day),
+        "expression_number": expression_number(name)
+    }
+    numbers["master_numbers"] = sorted({value for value in numbers.values() if value in MASTER_NUMBERS})
+    return numbers
+
+
+# ===== 批量计算（NumPy） =====
+
+def _digit_sum(values: np.ndarray) -> np.ndarray:
+    total = np.zeros_like(values)
+    values = values.copy()
+    while values.any():
+        total += values % 10
+        values //= 10
+    return total
+
+
+def _reduce_numbers_iterative(values: np.ndarray) -> np.ndarray:
+    values = values.copy()
+    pending = (values > 9) & ~np.isin(values, MASTER_NUMBERS)
+    while pending.any():
+        values[pending] = _digit_sum(values[pending])
+        pending = (values > 9) & ~np.isin(values, MASTER_NUMBERS)
+    return values
+
+
+# 0-9999 的约简结果查表，覆盖所有年份及月日年之和，批量约简只需一次下标取值
+_REDUCED = _reduce_numbers_iterative(np.arange(10000, dtype=np.int64))
+
+
+def reduce_numbers(values: np.ndarray) -> np.ndarray:
+    """reduce_number 的向量化版本"""
+    values = np.asarray(values, dtype=np.int64)
+    if values.size and values.min() >= 0 and values.max() < len(_REDUCED):
+        return _REDUCED[values]
+    return _reduce_numbers_iterative(values)
+
+
+def to_date_array(birth_dates: Union[Sequence[DateLike], np.ndarray]) -> np.ndarray:
+    """转换为 datetime64[D] 数组；字符串需为 YYYY-MM-DD，无效日期抛出 ValueError"""
+    if isinstance(birth_dates, np.ndarray) and np.issubdtype(birth_dates.dtype, np.datetime64):
+        return birth_dates.astype("datetime64[D]")
+    return np.array(
+        [value.date() if isinstance(value, datetime) else value for value in birth_dates],
+        dtype="datetime64[D]"
+    )
+
+
+def life_path_numbers(birth_dates: Union[Sequence[DateLike], np.ndarray]) -> np.ndarray:
+    """批量计算生命灵数"""
+    dates = to_date_array(birth_dates)
+    months = dates.astype("datetime64[M]")
+    year = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (dates - months).astype(np.int64) + 1
+    return reduce_numbers(reduce_numbers(month) + reduce_numbers(day) + reduce_numbers(year))
+
+
+def expression_numbers(names: Sequence[Optional[str]]) -> np.ndarray:
+    """批量计算表达数；没有拉丁字母的姓名为 0"""
+    encoded = [(name or "").encode("latin-1", "ignore") for name in names]
+    lengths = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+    if not lengths.sum():
+        return np.zeros(len(encoded), dtype=np.int64)
+
+    # 末尾补一个 0，使末尾空姓名的起点仍是合法下标
+    letters = np.append(_LETTER_VALUES[np.frombuffer(b"".join(encoded), dtype=np.uint8)], 0)
+    # 每个姓名在拼接数组中的起点；reduceat 对空姓名会取下一个元素，需要单独置 0
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    totals = np.add.reduceat(letters, starts)
+    totals[lengths == 0] = 0
+    return reduce_numbers(totals)
+
+
+def compute_numbers(
+    birth_dates: Union[Sequence[DateLike], np.ndarray],
+    names: Optional[Sequence[Optional[str]]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    批量计算，返回列式结果 {"life_path_number", "birthday_number", "expression_number"}
+
+    表达数为 0 表示不可用；names 为 None 时表达数全部为 0。
+    """
+    dates = to_date_array(birth_dates)
+    if names is not None and len(names) != len(dates):
+        raise ValueError("names 与 birth_dates 长度不一致")
+    return {
+        "life_path_number": life_path_numbers(dates),
+        "birthday_number": reduce_numbers((dates - dates.astype("datetime64[M]")).astype(np.int64) + 1),
+        "expression_number": (
+            expression_numbers(names) if names is not None else np.zeros(len(dates), dtype=np.int64)
+        )
+    }
+
+
+def numerology_profiles(
+    birth_dates: Sequence[DateLike],
+    names: Optional[Sequence[Optional[str]]] = None
+) -> List[Dict[str, Any]]:
+    """批量计算并转换为与 numerology_profile 相同结构的字典列表"""
+    columns = compute_numbers(birth_dates, names)
+    profiles = []
+    for life_path, birthday, expression in zip(*(column.tolist() for column in columns.values())):
+        profiles.append({
+            "life_path_number": life_path,
+            "birthday_number": birthday,
+            "expression_number": expression or None,
+            "master_numbers": sorted({value for value in (life_path, birthday, expression) if value in MASTER_NUMBERS})
+        })
+    return profiles
@@ -0,0 +1,244 @@
+# services/palm_images.py - 手相图片上传：multipart 流式写入 blob 存储，进程池生成缩略图和标准化裁剪图
+"""
+- 上传：直接解析请求体流（python-multipart 的流式解析器），文件部分逐块写入 blob 存储，
+  内存占用与图片大小无关（只有当前数据块）；非文件表单字段限制在 MAX_FIELD_BYTES 以内
+- 处理：在进程池中用 Pillow 生成缩略图（列表展示）和标准化裁剪图（修正 EXIF 方向、RGB、
+  按横竖方向裁成 3:4 并缩放，作为发送给模型的图片）；JPEG 通过 draft 模式按缩小比例解码
+- 报告只保存 blob 引用（input_data["palm_image_ref"]），生成提示词时再读取标准化裁剪图
+"""
+import asyncio
+import base64
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from multipart.multipart import MultipartParser, parse_options_header
+from PIL import Image, ImageOps
+
+from config import settings
+from services.blob_store import BlobStore, BlobTooLargeError, get_blob_store
+
+ALLOWED_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+THUMBNAIL_SIZE = (256, 256)
+NORMALIZED_LONG_SIDE = 1024
+VARIANTS = {"thumbnail": "thumb.jpg", "normalized": "normalized.jpg"}
+FILE_FIELD = "file"
+MAX_FIELD_BYTES = 1024
+
+
+class ImageUploadError(ValueError):
+    """上传内容不是有效的图片或请求格式错误"""
+
+
+# ===== 图片处理（在进程池中执行） =====
+
+def _save_jpeg(image: Image.Image, path: str, quality: int):
+    """先写临时文件再重命名，并发处理同一图片时不会读到半个文件"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".jpg")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            image.save(file, "JPEG", quality=quality, optimize=True)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def derive_images(original_path: str, max_pixels: int) -> Dict[str, Any]:
+    """
+    校验图片并生成派生图，返回 {"content_type", "width", "height"}
+
+    派生图已存在时不重复生成（相同内容的图片只处理一次）。
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    thumbnail_path = f"{original_path}.{VARIANTS['thumbnail']}"
+    normalized_path = f"{original_path}.{VARIANTS['normalized']}"
+    try:
+        with Image.open(original_path) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ImageUploadError(f"不支持的图片格式: {image.format}")
+            content_type = ALLOWED_FORMATS[image.format]
+            width, height = image.size
+            if os.path.exists(thumbnail_path) and os.path.exists(normalized_path):
+                return {"content_type": content_type, "width": width, "height": height}
+
+            # JPEG 按不小于目标尺寸的 1/2、1/4、1/8 比例解码，大图不必完整解码
+            image.draft("RGB", (NORMALIZED_LONG_SIDE, NORMALIZED_LONG_SIDE))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            if image.width >= image.height:
+                target = (NORMALIZED_LONG_SIDE, NORMALIZED_LONG_SIDE * 3 // 4)
+            else:
+                target = (NORMALIZED_LONG_SIDE * 3 // 4, NORMALIZED_LONG_SIDE)
+            normalized = ImageOps.fit(image, target, Image.LANCZOS)
+            _save_jpeg(normalized, normalized_path, quality=85)
+
+            normalized.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+            _save_jpeg(normalized, thumbnail_path, quality=80)
+    except ImageUploadError:
+        raise
+    except Image.DecompressionBombError:
+        raise ImageUploadError("图片像素数超过限制")
+    except Exception:
+        # PIL 的异常不一定能跨进程传递，且消息中带有服务器路径，统一转换
+        raise ImageUploadError("无法识别的图片文件")
+    return {"content_type": content_type, "width": width, "height": height}
+
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        # spawn：不从带事件循环和数据库连接的主进程 fork
+        _image_pool = ProcessPoolExecutor(
+            max_workers=settings.image_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=True, cancel_futures=True)
+        _image_pool = None
+
+
+async def process_image(ref: str, store: Optional[BlobStore] = None) -> Dict[str, Any]:
+    store = store or get_blob_store()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_image_pool(), derive_images, store.path(ref), settings.palm_upload_max_pixels
+    )
+
+
+# ===== 流式上传 =====
+
+class _UploadParser:
+    """multipart 解析回调：文件部分写入 BlobWriter，其余字段收集为短字符串"""
+
+    def __init__(self, store: BlobStore, max_bytes: int):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.fields: Dict[str, str] = {}
+        self.ref: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.size = 0
+        self.writer = None
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name: Optional[str] = None
+        self._value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._name = None
+        self._value = b""
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        if self._name == FILE_FIELD and b"filename" in options:
+            if self.writer is not None or self.ref is not None:
+                raise ImageUploadError("每次只能上传一张图片")
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.writer = self.store.writer(self.max_bytes)
+
+    def on_part_data(self, data, start, end):
+        if self.writer is not None:
+            self.writer.write(data[start:end])
+        else:
+            self._value += data[start:end]
+            if len(self._value) > MAX_FIELD_BYTES:
+                raise ImageUploadError(f"表单字段 {self._name} 过长")
+
+    def on_part_end(self):
+        if self.writer is not None:
+            self.size = self.writer.size
+            self.ref = self.writer.commit()
+            self.writer = None
+        elif self._name:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+
+async def receive_upload(request, store: Optional[BlobStore] = None) -> Dict[str, Any]:
+    """
+    流式接收 multipart 上传（文件字段名为 file）并生成派生图
+
+    返回 {"ref", "size", "filename", "content_type", "width", "height", "fields"}；
+    超过大小限制抛出 BlobTooLargeError，格式错误或不是图片抛出 ImageUploadError。
+    """
+    store = store or get_blob_store()
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise ImageUploadError("请使用 multipart/form-data 上传图片")
+
+    upload = _UploadParser(store, settings.palm_upload_max_bytes)
+    parser = MultipartParser(options[b"boundary"], upload.callbacks())
+    # 解析回调中的文件写入、哈希和提交都是阻塞操作，放到线程中执行，避免大文件上传阻塞事件循环
+    try:
+        async for chunk in request.stream():
+            await asyncio.to_thread(parser.write, chunk)
+        await asyncio.to_thread(parser.finalize)
+    except (BlobTooLargeError, ImageUploadError):
+        await asyncio.to_thread(upload.abort)
+        raise
+    except Exception as e:
+        await asyncio.to_thread(upload.abort)
+        raise ImageUploadError(f"上传数据解析失败: {str(e)}")
+
+    if upload.ref is None:
+        raise ImageUploadError(f"缺少图片文件字段: {FILE_FIELD}")
+
+    try:
+        info = await process_image(upload.ref, store)
+    except ImageUploadError:
+        await asyncio.to_thread(store.delete, upload.ref)
+        raise
+    return {
+        "ref": upload.ref,
+        "size": upload.size,
+        "filename": upload.filename,
+        "fields": upload.fields,
+        **info
+    }
+
+
+def model_image(ref: Optional[str]) -> Optional[str]:
+    """发送给模型的标准化图片（base64）；引用无效或图片不存在时返回 None"""
+    store = get_blob_store()
+    if not ref or not store.exists(ref, VARIANTS["normalized"]):
+        return None
+    return base64.b64encode(store.read(ref, VARIANTS["normalized"])).decode("ascii")
@@ -1,11 +1,14 @@
 # services/persona_service.py - Persona业务逻辑
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from models import Persona, User
+from models import Persona, User, Reading, DivinationMethod
 from schemas import PersonaCreate, PersonaUpdate, PersonaResponse
 from constants import TEST_USER_ID, SUCCESS_MESSAGES, ERROR_MESSAGES
+from config import settings
+from services.write_buffer import reading_write_buffer
 
 class PersonaService:
     def __init__(self, db: Session):
@@ -56,6 +59,46 @@ class PersonaService:
             Persona.user_id == user_id
         ).order_by(Persona.created_at.desc()).all()
     
+    def get_birth_data(self, persona_ids: List[int], user_id: int = TEST_USER_ID) -> Dict[int, Dict[str, Any]]:
+        """
+        批量获取Persona的出生信息，返回 {persona_id: input_data 形式的出生信息}
+        
+        优先使用Persona自身的出生字段，缺失时使用该Persona最近一次占星报告的输入数据；
+        不属于该用户或没有出生日期的Persona不出现在结果中。
+        每个Persona只按 (persona_id, created_at) 索引倒序取一条占星报告，不随历史报告数增长。
+        """
+        latest_reading_id = (
+            select(Reading.id)
+            .where(
+                Reading.persona_id == Persona.id,
+                Reading.user_id == user_id,
+                Reading.method == DivinationMethod.ASTROLOGY
+            )
+            .order_by(Reading.created_at.desc(), Reading.id.desc())
+            .limit(1)
+            .correlate(Persona)
+            .scalar_subquery()
+        )
+        rows = self.db.query(Persona, Reading.input_data).outerjoin(
+            Reading, Reading.id == latest_reading_id
+        ).filter(
+            Persona.id.in_(persona_ids),
+            Persona.user_id == user_id
+        ).all()
+        
+        birth_data = {}
+        for persona, latest_input in rows:
+            data = dict(latest_input or {})
+            if persona.birth_date:
+                data["birth_date"] = persona.birth_date.date().isoformat()
+            if persona.birth_time:
+                data["birth_time"] = persona.birth_time
+            if persona.birth_location:
+                data["birth_location"] = persona.birth_location
+            if data.get("birth_date"):
+                birth_data[persona.id] = data
+        return birth_data
+    
     def find_persona_by_name(self, name: str, user_id: int = TEST_USER_ID) -> Optional[Persona]:
         """根据姓名查找Persona"""
         return self.db.query(Persona).filter(
@@ -121,6 +164,10 @@ class PersonaService:
         if not persona:
             raise Exception(ERROR_MESSAGES["PERSONA_NOT_FOUND"])
         
+        if settings.write_behind_enabled:
+            # 收藏状态以写回缓冲中尚未落库的值为准
+            reading_write_buffer.overlay(persona.readings)
+        
         # 统计信息
         total_readings = len(persona.readings)
         completed_readings = len([r for r in persona.readings if r.status.value == "completed"])
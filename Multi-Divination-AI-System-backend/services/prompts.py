@@ -0,0 +1,228 @@
+# services/prompts.py - 各占卜方法的提示词模板（与前端 geminiService.ts 保持一致）
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models import DivinationMethod
+from services.numerology import numerology_profile
+from services.astrology import natal_chart
+from services.tarot import resolve_draw, describe
+from services.mbti import resolve_scores, describe_scores
+from services.palm_images import model_image
+
+LANGUAGE_INSTRUCTION = (
+    "IMPORTANT: Respond in the same language as the user's input. If the user's name or question is in Chinese, "
+    "respond in Chinese. If in English, respond in English. If mixed or unclear, use the primary language of "
+    "their question or name."
+)
+
+COMMON_INSTRUCTIONS = (
+    f"{LANGUAGE_INSTRUCTION} Format as a professional divination report. Use markdown for structure. "
+    "Keep the report concise and focused on the most impactful insights."
+)
+
+INTEGRATED_LANGUAGE_INSTRUCTION = (
+    "IMPORTANT: Respond in the same language as the user's input. If the user's name or question suggests "
+    "Chinese, respond in Chinese. If English, respond in English. Match the user's primary language."
+)
+
+
+def numerology_context(input_data: Dict[str, Any], user_name: Optional[str] = None) -> str:
+    """本地计算好的数字学结果，让模型只做解读而不做计算"""
+    numbers = numerology_profile(input_data.get("birth_date"), user_name)
+    if numbers is None:
+        return ""
+    facts = [f"Life Path Number {numbers['life_path_number']}", f"Birthday Number {numbers['birthday_number']}"]
+    if numbers["expression_number"] is not None:
+        facts.append(f"Expression Number {numbers['expression_number']}")
+    masters = ", ".join(str(value) for value in numbers["master_numbers"]) or "none"
+    return (
+        f"The numbers have already been calculated and are authoritative, do not recalculate them: "
+        f"{', '.join(facts)}; master numbers: {masters}. "
+    )
+
+
+def chart_context(input_data: Dict[str, Any]) -> str:
+    """本地星历表计算的星盘（回归黄道），让模型只做解读而不做推算"""
+    chart = natal_chart(input_data)
+    if chart is None:
+        return ""
+    placements = [f"{body} {int(position['degree'])}° {position['sign']}" for body, position in chart["planets"].items()]
+    rising = f"Ascendant {int(chart['ascendant'] % 30)}° {chart['rising_sign']}" if chart["rising_sign"] else (
+        "Ascendant unknown (birth time or place missing)"
+    )
+    return (
+        f"The natal chart has already been calculated (tropical zodiac) and is authoritative, do not recalculate "
+        f"it: {', '.join(placements)}; {rising}. "
+    )
+
+
+def mbti_context(input_data: Dict[str, Any]) -> str:
+    """问卷计分得到的维度倾向，让模型按计分结果解读"""
+    result = resolve_scores(input_data)
+    if result is None:
+        return ""
+    return (
+        f"The type was scored from a {result['answered']}-question quiz and is authoritative: "
+        f"{describe_scores(result)} (confidence {result['confidence']}/100). "
+    )
+
+
+def build_method_prompt(
+    method: DivinationMethod,
+    input_data: Dict[str, Any],
+    main_question: Optional[str] = None,
+    user_name: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """构建单个占卜方法的提示词，返回 Gemini contents.parts 结构"""
+    user_context = f"The user's name is {user_name}. " if user_name else ""
+    question_context = f'They are generally seeking insights related to: "{main_question}". ' if main_question else ""
+    who = user_name or "the user"
+
+    if method == DivinationMethod.LIFEPATH:
+        text = (
+            f"{user_context}{question_context}Analyze the Life Path Number derived from the birth date "
+            f"{input_data.get('birth_date')}. {numerology_context(input_data, user_name)}Provide a detailed "
+            f"personality analysis, strengths, weaknesses, life purpose, and career suggestions. "
+            f"{COMMON_INSTRUCTIONS} Aim for approximately 200-300 words."
+        )
+        return [{"text": text}]
+
+    if method == DivinationMethod.PALMISTRY:
+        text = (
+            f"{user_context}{question_context}Analyze the uploaded palm image. Provide insights into personality, "
+            f"potential future trends, and key life areas based on traditional palmistry. Focus on major lines and "
+            f"overall hand shape. {COMMON_INSTRUCTIONS} Deliver a concise reading, around 200-300 words, "
+            f"highlighting key palm features and their meanings."
+        )
+        parts: List[Dict[str, Any]] = [{"text": text}]
+        palm_image = model_image(input_data.get("palm_image_ref"))
+        if palm_image:
+            parts.append({"inlineData": {"mimeType": "image/jpeg", "data": palm_image}})
+        elif input_data.get("palm_image_data"):
+            parts.append({"inlineData": {"mimeType": "image/jpeg", "data": input_data["palm_image_data"]}})
+        elif input_data.get("palm_analysis"):
+            parts.append({"text": f"Palm description: {input_data['palm_analysis']}"})
+        return parts
+
+    if method == DivinationMethod.ASTROLOGY:
+        text = (
+            f"{user_context}{question_context}Generate an astrological profile for {who} based on: "
+            f"Date of Birth {input_data.get('birth_date')}, Time of Birth {input_data.get('birth_time')}, "
+            f"Place of Birth {input_data.get('birth_location')}. {chart_context(input_data)}"
+            f"Focus on core personality traits, potential "
+            f"challenges, life themes. {COMMON_INSTRUCTIONS} Generate a concise astrological summary, "
+            f"around 200-300 words."
+        )
+        return [{"text": text}]
+
+    if method == DivinationMethod.MBTI:
+        scored = resolve_scores(input_data)
+        mbti_type = scored["mbti_type"] if scored else input_data.get("mbti_type")
+        text = (
+            f"{user_context}{question_context}Provide a detailed analysis of the MBTI type: "
+            f"{mbti_type} for {who}. {mbti_context(input_data)}Include common traits, cognitive functions (briefly), "
+            f"strengths, weaknesses, career inclinations, and relationship patterns. {COMMON_INSTRUCTIONS} "
+            f"Offer a brief yet insightful overview, around 200-300 words."
+        )
+        return [{"text": text}]
+
+    if method == DivinationMethod.TAROT:
+        draw = resolve_draw(input_data)
+        cards = input_data.get("selected_cards")
+        if draw is not None:
+            cards_context = f"The cards drawn in a {draw['spread_type']} spread are: {describe(draw)}. "
+        else:
+            cards_context = f"The drawn cards are: {cards}. " if cards else ""
+        text = (
+            f"{user_context}Perform a conceptual tarot reading for {who} regarding their primary question: "
+            f'"{main_question}". {cards_context}Interpret the cards to provide guidance, insights, potential '
+            f"outcomes, and advice. {COMMON_INSTRUCTIONS} Deliver a brief, focused tarot interpretation "
+            f"(around 150-250 words) directly addressing the user's question with actionable advice."
+        )
+        return [{"text": text}]
+
+    raise ValueError(f"无效的占卜方法: {method}")
+
+
+def build_integrated_prompt(
+    reports: Dict[str, str],
+    main_question: Optional[str] = None,
+    user_name: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """构建综合报告提示词；reports 为 {方法名: 报告内容}"""
+    user_context = f"This report is for {user_name}. " if user_name else ""
+    question_context = f'They are seeking insights on: "{main_question}". ' if main_question else ""
+    combined_inputs = "\n\n---\n\n".join(f"## {method}\n{content}" for method, content in reports.items())
+    text = (
+        f"{user_context}{question_context}You are a Multi-Divination AI. Synthesize the following divination "
+        f"results into a single, **concise yet impactful** comprehensive report (around 300-400 words). Identify "
+        f"common themes, highlight synergies, explain potential contradictions briefly, and provide an overarching "
+        f"narrative about the user's personality, strengths, challenges, and potential life path. Conclude with "
+        f"**3 key actionable pieces of advice.** Format as a professional, empathetic, and empowering comprehensive "
+        f"analysis. Use markdown. {INTEGRATED_LANGUAGE_INSTRUCTION}\n\n{combined_inputs}\n\n"
+        f"Begin the Integrated Comprehensive Analysis:"
+    )
+    return [{"text": text}]
+
+
+CHAT_ASSISTANT_NAME = "Aura"
+
+
+def format_chat_transcript(messages: Iterable[Tuple[bool, str]], user_name: Optional[str] = None) -> str:
+    """把 (是否用户消息, 内容) 序列排成对话文本"""
+    user_name = user_name or "User"
+    return "\n".join(
+        f"{user_name if is_user_message else CHAT_ASSISTANT_NAME}: {content}"
+        for is_user_message, content in messages
+    )
+
+
+def build_chat_instruction(
+    reports: Dict[str, str],
+    character_tags: Optional[List[str]] = None,
+    user_name: Optional[str] = None,
+    main_question: Optional[str] = None
+) -> str:
+    """聊天助手 Aura 的系统指令；reports 为 {方法名: 报告内容（已按预算压缩）}"""
+    user_name = user_name or "the user"
+    tags = ", ".join(character_tags or [])
+    question = f' based on their question: "{main_question}"' if main_question else ""
+    report_summary = "\n\n".join(f"### {method}\n{content}" for method, content in reports.items())
+    report_context = (
+        f"Their character archetypes have been identified as: [{tags}].\n"
+        f"A summary of their reports is:\n---\n{report_summary}\n---\n\n"
+    ) if reports else ""
+    return (
+        f'You are "Aura", an insightful, empathetic, and supportive AI companion. Your approach should be grounded '
+        f"in principles of psychology and compassionate counseling, like a supportive therapist or counselor.\n\n"
+        f"The user, {user_name}, has received a set of divination reports{question}.\n{report_context}"
+        f"Your role is to discuss these reports with {user_name}. While you acknowledge the divinatory context, your "
+        f"primary focus is to help them understand the insights through a lens of psychological understanding and "
+        f"personal growth. Help them explore their feelings about the readings, offer comfort if needed, and offer "
+        f"actionable, psychologically-informed suggestions that can empower them to navigate their challenges.\n\n"
+        f"CRITICAL: Always respond in the same language as the user's messages. If the language is mixed or "
+        f"unclear, match the language of their name or main question.\n"
+        f"Be gentle, understanding, curious, and encouraging. Do not use markdown formatting in your chat "
+        f"responses; provide plain text suitable for a chat bubble. If this is the start of the conversation, "
+        f"warmly greet {user_name} before answering."
+    )
+
+
+def build_chat_summary_prompt(
+    previous_summary: Optional[str],
+    transcript: str,
+    user_name: Optional[str] = None,
+    max_words: int = 400
+) -> List[Dict[str, Any]]:
+    """把较早的对话汇总进会话摘要（增量：在上一版摘要的基础上合并新的对话）"""
+    user_name = user_name or "the user"
+    previous = f"Existing summary of the earlier conversation:\n{previous_summary}\n\n" if previous_summary else ""
+    text = (
+        f'You maintain the running memory of a counseling conversation between {user_name} and "Aura", a '
+        f"supportive AI companion discussing {user_name}'s divination reports. {previous}"
+        f"Update the summary with the following messages. Keep what Aura needs to continue the conversation: "
+        f"{user_name}'s situation, feelings and concerns, facts they shared, questions still open, and the advice "
+        f"and interpretations already given. Drop greetings and repetition. Write plain text without markdown, "
+        f"at most {max_words} words, in the same language as the conversation.\n\n"
+        f"New messages:\n{transcript}\n\nUpdated summary:"
+    )
+    return [{"text": text}]
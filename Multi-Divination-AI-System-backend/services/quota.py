@@ -0,0 +1,329 @@
+# services/quota.py - 订阅的每月占卜次数额度
+"""
+额度以 subscriptions 表为准（monthly_reading_limit / current_monthly_usage），但不是每次请求都写数据库：
+
+- 每个 worker 为每个用户维护一个进程内的令牌桶。桶空时用一条条件 UPDATE 向数据库预占一小批次数
+  （current_monthly_usage + n <= monthly_reading_limit 时才累加），之后的请求在进程内扣减
+- 多个 worker 各自预占，数据库中的累加是原子的条件更新，所有 worker 实际放行的总次数不会超过上限
+- 剩余次数不足一批时只按本次需要预占，接近上限时各 worker 之间不会互相占着额度
+- 定期对账：把未用完的预占次数还给数据库并丢弃桶，下次请求重新读取订阅（上限调整、取消订阅随之生效）
+- 额度用尽后，该用户在一个对账周期内直接拒绝，不再访问数据库
+- 计费月按 UTC 自然月；进入新的月份时由第一个请求用条件 UPDATE 把用量清零
+- 没有有效订阅或 monthly_reading_limit 为空的用户不受限制
+- worker 异常退出时最多损失每个用户一批未用完的预占次数（记为已用）
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func, or_, update
+
+from config import settings
+from constants import ERROR_MESSAGES
+from database import SessionLocal
+from models import Subscription, SubscriptionStatus
+from monitoring.metrics import record_quota_check
+
+
+def period_start(now: datetime) -> datetime:
+    return datetime(now.year, now.month, 1)
+
+
+def next_period_start(now: datetime) -> datetime:
+    return datetime(now.year + 1, 1, 1) if now.month == 12 else datetime(now.year, now.month + 1, 1)
+
+
+class QuotaExceededError(Exception):
+    """额度不足；retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, limit: int, remaining: int, reset_at: datetime, retry_after: int):
+        super().__init__(ERROR_MESSAGES["QUOTA_EXCEEDED"])
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Retry-After": str(self.retry_after),
+            "X-Quota-Limit": str(self.limit),
+            "X-Quota-Remaining": str(self.remaining),
+            "X-Quota-Reset": self.reset_at.isoformat() + "Z"
+        }
+
+
+@dataclass
+class _Bucket:
+    subscription_id: Optional[int]      # None 表示不受限制
+    limit: Optional[int]
+    period: datetime
+    loaded_at: float
+    tokens: int = 0                     # 已从数据库预占、尚未使用的次数
+    remaining: int = 0                  # 最近一次访问数据库时未被预占的剩余次数（用于响应头）
+    blocked_until: float = 0.0
+    retired: bool = False               # 已对账归还，持有旧引用的请求需重新取桶
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class ReadingQuota:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        lease_size: int = 5,
+        reconcile_interval: float = 30.0,
+        clock=time.monotonic,
+        now=datetime.utcnow
+    ):
+        self.session_factory = session_factory
+        self.lease_size = lease_size
+        self.reconcile_interval = reconcile_interval
+        self.clock = clock
+        self.now = now
+        self._buckets: Dict[int, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    # ===== 扣减 =====
+
+    def consume(self, user_id: int, cost: int = 1) -> None:
+        """扣减 cost 次额度，不足时抛出 QuotaExceededError（可能访问数据库，异步代码中用 acquire）"""
+        while True:
+            bucket = self._bucket(user_id)
+            with bucket.lock:
+                if bucket.retired:
+                    continue
+                if self._consume_local(bucket, cost):
+                    return
+                self._lease(bucket, cost - bucket.tokens)
+                bucket.tokens -= cost
+                record_quota_check("lease")
+                return
+
+    async def acquire(self, user_id: int, cost: int = 1) -> None:
+        """consume 的异步版本：进程内额度足够时不切换线程"""
+        bucket = self._buckets.get(user_id)
+        if bucket is not None and self._bucket_current(bucket):
+            with bucket.lock:
+                if not bucket.retired and self._consume_local(bucket, cost):
+                    return
+        await asyncio.to_thread(self.consume, user_id, cost)
+
+    def refund(self, user_id: int, cost: int = 1) -> None:
+        """操作失败时退回额度（放回进程内的桶，对账时归还数据库）"""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            return
+        with bucket.lock:
+            if not bucket.retired and bucket.limit is not None and self._bucket_current(bucket):
+                bucket.tokens += cost
+                bucket.blocked_until = 0.0
+
+    def _consume_local(self, bucket: _Bucket, cost: int) -> bool:
+        """进程内扣减；额度不足且处于拒绝期时直接抛出，返回 False 表示需要向数据库预占"""
+        if bucket.limit is None:
+            record_quota_check("unlimited")
+            return True
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            record_quota_check("local")
+            return True
+        if self.clock() < bucket.blocked_until:
+            record_quota_check("rejected")
+            raise self._exceeded(bucket)
+        return False
+
+    def _exceeded(self, bucket: _Bucket) -> QuotaExceededError:
+        now = self.now()
+        reset_at = next_period_start(now)
+        return QuotaExceededError(
+            limit=bucket.limit,
+            remaining=bucket.remaining + bucket.tokens,
+            reset_at=reset_at,
+            retry_after=max(1, int((reset_at - now).total_seconds()))
+        )
+
+    # ===== 数据库 =====
+
+    def _bucket(self, user_id: int) -> _Bucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is not None and self._bucket_current(bucket):
+            return bucket
+        if bucket is not None:
+            # 到了对账时间先归还；跨月时上个月预占的次数作废，不再归还
+            self._retire(user_id, bucket, give_back=bucket.period == period_start(self.now()))
+
+        loaded = self._load(user_id)
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None or bucket.retired or not self._bucket_current(bucket):
+                self._buckets[user_id] = bucket = loaded
+        return bucket
+
+    def _bucket_current(self, bucket: _Bucket) -> bool:
+        return bucket.period == period_start(self.now()) and self.clock() - bucket.loaded_at < self.reconcile_interval
+
+    def _load(self, user_id: int) -> _Bucket:
+        """读取用户当前有效的订阅；进入新计费月时把用量清零"""
+        now = self.now()
+        period = period_start(now)
+        db = self.session_factory()
+        try:
+            subscription = db.query(Subscription).filter(
+                Subscription.user_id == user_id,
+                Subscription.status == SubscriptionStatus.ACTIVE,
+                or_(Subscription.end_date.is_(None), Subscription.end_date > now)
+            ).order_by(Subscription.id.desc()).first()
+            if subscription is None or subscription.monthly_reading_limit is None:
+                return _Bucket(None, None, period, self.clock())
+
+            if subscription.usage_period_start is None or subscription.usage_period_start < period:
+                # 多个 worker 同时进入新月份时只有一个清零生效
+                db.execute(
+                    update(Subscription)
+                    .where(
+                        Subscription.id == subscription.id,
+                        or_(Subscription.usage_period_start.is_(None), Subscription.usage_period_start < period)
+                    )
+                    .values(current_monthly_usage=0, usage_period_start=period)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+            return _Bucket(subscription.id, subscription.monthly_reading_limit, period, self.clock())
+
+        except Exception as e:
+            db.rollback()
+            raise Exception(f"读取订阅额度失败: {str(e)}")
+        finally:
+            db.close()
+
+    def _lease(self, bucket: _Bucket, needed: int) -> None:
+        """向数据库预占次数（先按批量，不足时按实际需要）；都不够时进入拒绝期并抛出"""
+        usage = func.coalesce(Subscription.current_monthly_usage, 0)
+        returned_columns = (Subscription.current_monthly_usage, Subscription.monthly_reading_limit)
+        db = self.session_factory()
+        try:
+            for amount in dict.fromkeys((max(needed, self.lease_size), needed)):
+                stmt = (
+                    update(Subscription)
+                    .where(
+                        Subscription.id == bucket.subscription_id,
+                        Subscription.usage_period_start == bucket.period,
+                        usage + amount <= Subscription.monthly_reading_limit
+                    )
+                    .values(current_monthly_usage=usage + amount)
+                    .execution_options(synchronize_session=False)
+                )
+                if db.get_bind().dialect.update_returning:
+                    row = db.execute(stmt.returning(*returned_columns)).first()
+                else:
+                    # 数据库不支持RETURNING时在同一事务中读回（行锁持有到提交）
+                    row = None
+                    if db.execute(stmt).rowcount == 1:
+                        row = db.query(*returned_columns).filter(Subscription.id == bucket.subscription_id).first()
+                db.commit()
+                if row is not None:
+                    bucket.tokens += amount
+                    bucket.limit = row.monthly_reading_limit
+                    bucket.remaining = row.monthly_reading_limit - row.current_monthly_usage
+                    return
+
+            current = db.query(*returned_columns).filter(
+                Subscription.id == bucket.subscription_id
+            ).first()
+        except Exception as e:
+            db.rollback()
+            raise Exception(f"预占订阅额度失败: {str(e)}")
+        finally:
+            db.close()
+
+        if current is not None:
+            bucket.limit = current.monthly_reading_limit
+            bucket.remaining = max(0, (current.monthly_reading_limit or 0) - (current.current_monthly_usage or 0))
+        # 其它 worker 对账时可能归还预占的次数，拒绝期到对账周期为止
+        bucket.blocked_until = self.clock() + self.reconcile_interval
+        record_quota_check("rejected")
+        raise self._exceeded(bucket)
+
+    # ===== 对账 =====
+
+    def reconcile(self, force: bool = False) -> int:
+        """归还到期（force 时为全部）桶中未用完的预占次数并丢弃这些桶，返回归还的次数"""
+        with self._lock:
+            expired = [
+                (user_id, bucket) for user_id, bucket in self._buckets.items()
+                if force or not self._bucket_current(bucket)
+            ]
+        returned = 0
+        for user_id, bucket in expired:
+            returned += self._retire(user_id, bucket, give_back=bucket.period == period_start(self.now()))
+        return returned
+
+    def _retire(self, user_id: int, bucket: _Bucket, give_back: bool) -> int:
+        with bucket.lock:
+            if bucket.retired:
+                return 0
+            bucket.retired = True
+            tokens, bucket.tokens = bucket.tokens, 0
+        with self._lock:
+            if self._buckets.get(user_id) is bucket:
+                del self._buckets[user_id]
+        if not give_back or not tokens or bucket.subscription_id is None:
+            return 0
+
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(Subscription)
+                .where(
+                    Subscription.id == bucket.subscription_id,
+                    Subscription.usage_period_start == bucket.period,
+                    Subscription.current_monthly_usage >= tokens
+                )
+                .values(current_monthly_usage=Subscription.current_monthly_usage - tokens)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return tokens
+        except Exception as e:
+            db.rollback()
+            raise Exception(f"归还订阅额度失败: {str(e)}")
+        finally:
+            db.close()
+
+    # ===== 后台任务 =====
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台对账并归还全部预占次数"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.reconcile, True)
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception as e:
+                print(f"⚠️  额度对账失败，将在下次重试: {e}")
+
+
+# 全局额度实例
+reading_quota = ReadingQuota(
+    lease_size=settings.quota_lease_size,
+    reconcile_interval=settings.quota_reconcile_interval
+)
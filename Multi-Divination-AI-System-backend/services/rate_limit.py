@@ -0,0 +1,257 @@
+# services/rate_limit.py - 按客户端限流与准入控制（ASGI 中间件）
+"""
+- 限流：GCRA（generic cell rate algorithm），每个客户端每个路由类别只保存一个"理论到达时间"，
+  按 速率/分钟 + 突发上限 放行，超出时返回 429 和 Retry-After
+- 客户端：验签通过的 Bearer 令牌按用户ID，否则按客户端 IP（可信任反向代理的 X-Forwarded-For）；
+  未经验证的请求头不作为标识，避免客户端每次换一个值绕过限额或挤掉其它客户端的计数
+- 路由类别：generation（模型生成、批量保存、图片上传、聊天 WebSocket 连接）/ write / read，各自独立限额
+- 准入控制：每个类别限制同时处理的请求数，超出的请求排队；排队超过目标时间或队列已满时返回 503，
+  避免突发流量占满线程池和数据库连接池后所有请求一起变慢
+- 计数在每个 worker 进程内，多 worker 部署时整体限额约为配置值 × worker 数
+- 拒绝次数、排队时间、并发数通过 Prometheus 指标暴露（见 monitoring/metrics.py）
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from monitoring.metrics import (
+    ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, record_admission_wait, record_request_rejected
+)
+
+GENERATION = "generation"
+WRITE = "write"
+READ = "read"
+
+# 需要调用模型或一次写入多条数据的接口
+GENERATION_PREFIXES = ("/generation/", "/batch/readings", "/palm/images")
+
+EXEMPT_PATHS = frozenset({"/", "/health", "/metrics", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"})
+
+RATE_LIMITED_MESSAGE = "请求过于频繁，请稍后再试"
+OVERLOADED_MESSAGE = "服务繁忙，请稍后再试"
+
+
+def route_class(scope) -> str:
+    if scope["type"] == "websocket":
+        return GENERATION
+    if scope["method"] in ("GET", "HEAD"):
+        return READ
+    if scope["path"].startswith(GENERATION_PREFIXES):
+        return GENERATION
+    return WRITE
+
+
+def _verify_token(token: str) -> int:
+    from services.auth import get_authenticator
+    return get_authenticator().verify_token(token)
+
+
+def client_key(
+    scope,
+    trust_forwarded_for: bool = False,
+    verify_token: Optional[Callable[[str], int]] = _verify_token
+) -> str:
+    """限流用的客户端标识：令牌验签通过时为用户ID（只验签，命中令牌缓存时不重复验签），否则为 IP"""
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization", b"")
+    if verify_token is not None and authorization[:7].lower() == b"bearer " and len(authorization) > 7:
+        try:
+            return f"user:{verify_token(authorization[7:].strip().decode('latin-1'))}"
+        except Exception:
+            pass
+    if trust_forwarded_for and b"x-forwarded-for" in headers:
+        return f"ip:{headers[b'x-forwarded-for'].split(b',')[0].strip().decode('latin-1')}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class GCRALimiter:
+    """
+    GCRA 限流器：per_minute 为持续速率，burst 为可以一次性连续放行的请求数
+
+    只在事件循环线程中调用，不加锁。
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 100_000, clock=time.monotonic):
+        self.per_minute = per_minute
+        self.burst = max(1, burst)
+        self.interval = 60.0 / per_minute
+        self.tolerance = self.interval * (self.burst - 1)
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    def check(self, key: str) -> Tuple[bool, float, int]:
+        """返回 (是否放行, 需等待的秒数, 剩余可连续放行的请求数)"""
+        now = self.clock()
+        tat = max(self._tat.get(key, now), now)
+        if tat - now > self.tolerance:
+            return False, tat - self.tolerance - now, 0
+
+        new_tat = tat + self.interval
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_keys:
+            # 最久未访问的客户端，其到达时间早已过去，丢弃等同于重置
+            self._tat.popitem(last=False)
+        remaining = int((self.tolerance - (new_tat - now)) / self.interval) + 1
+        return True, 0.0, max(0, remaining)
+
+
+class AdmissionController:
+    """限制同时处理的请求数；排队等待超过 queue_target 秒或队列已满时拒绝"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int = 100, queue_target: float = 0.5):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_target = queue_target
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def admit(self) -> Optional[str]:
+        """准入成功返回 None（之后必须调用 release），否则返回拒绝原因"""
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            record_admission_wait(self.name, 0.0)
+            return None
+        if self.queued >= self.max_queue:
+            return "queue_full"
+
+        self.queued += 1
+        ADMISSION_QUEUED.labels(route_class=self.name).inc()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_target)
+            return None
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+        finally:
+            self.queued -= 1
+            ADMISSION_QUEUED.labels(route_class=self.name).dec()
+            record_admission_wait(self.name, time.perf_counter() - start)
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+def _error_response(scope, status_code: int, message: str, headers: Dict[str, str]) -> JSONResponse:
+    """与全局异常处理器相同的错误格式"""
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "error": message,
+            "status_code": status_code,
+            "timestamp": datetime.utcnow().isoformat(),
+            "path": str(Request(scope).url)
+        },
+        headers=headers
+    )
+
+
+class RateLimitMiddleware:
+    """
+    ASGI中间件：先按客户端限流（429），再做准入控制（503）
+
+    limiters / admission 按路由类别配置，缺少某个类别时该类别不做对应检查。
+    WebSocket 只对建立连接限流，被拒绝时在握手阶段关闭（HTTP 403）。
+    """
+
+    def __init__(
+        self,
+        app,
+        limiters: Dict[str, GCRALimiter],
+        admission: Optional[Dict[str, AdmissionController]] = None,
+        trust_forwarded_for: bool = False,
+        exempt_paths=EXEMPT_PATHS
+    ):
+        self.app = app
+        self.limiters = limiters
+        self.admission = admission or {}
+        self.trust_forwarded_for = trust_forwarded_for
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"] in self.exempt_paths or \
+                scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope)
+        limiter = self.limiters.get(name)
+        headers: Dict[str, str] = {}
+        if limiter is not None:
+            allowed, retry_after, remaining = limiter.check(client_key(scope, self.trust_forwarded_for))
+            headers = {"X-RateLimit-Limit": f"{limiter.per_minute:g}/min", "X-RateLimit-Remaining": str(remaining)}
+            if not allowed:
+                record_request_rejected(name, "rate_limited")
+                if scope["type"] == "websocket":
+                    await send({"type": "websocket.close", "code": 1008})
+                    return
+                headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+                await _error_response(scope, 429, RATE_LIMITED_MESSAGE, headers)(scope, receive, send)
+                return
+
+        controller = self.admission.get(name) if scope["type"] == "http" else None
+        if controller is None:
+            await self.app(scope, receive, self._with_headers(send, headers))
+            return
+
+        reason = await controller.admit()
+        if reason is not None:
+            record_request_rejected(name, reason)
+            await _error_response(scope, 503, OVERLOADED_MESSAGE, {"Retry-After": "1"})(scope, receive, send)
+            return
+
+        in_flight = ADMISSION_IN_FLIGHT.labels(route_class=name)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, self._with_headers(send, headers))
+        finally:
+            in_flight.dec()
+            controller.release()
+
+    @staticmethod
+    def _with_headers(send, headers: Dict[str, str]):
+        if not headers:
+            return send
+        encoded = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + encoded)
+            await send(message)
+
+        return send_with_headers
+
+
+def build_limiters(settings) -> Dict[str, GCRALimiter]:
+    return {
+        GENERATION: GCRALimiter(
+            settings.rate_limit_generation_per_minute, settings.rate_limit_generation_burst, settings.rate_limit_max_clients
+        ),
+        WRITE: GCRALimiter(
+            settings.rate_limit_write_per_minute, settings.rate_limit_write_burst, settings.rate_limit_max_clients
+        ),
+        READ: GCRALimiter(
+            settings.rate_limit_read_per_minute, settings.rate_limit_read_burst, settings.rate_limit_max_clients
+        ),
+    }
+
+
+def build_admission(settings) -> Dict[str, AdmissionController]:
+    """generation 单独一组并发名额，避免长时间的生成请求挤占普通读写"""
+    queue_target = settings.admission_queue_target_ms / 1000
+    default = AdmissionController("default", settings.admission_default_concurrency, settings.admission_max_queue, queue_target)
+    return {
+        GENERATION: AdmissionController(
+            GENERATION, settings.admission_generation_concurrency, settings.admission_max_queue, queue_target
+        ),
+        WRITE: default,
+        READ: default,
+    }
@@ -1,11 +1,21 @@
 # services/reading_service.py - Reading业务逻辑
+from contextlib import nullcontext
+
+from sqlalchemy import update, func, case
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-from models import Reading, Persona, DivinationMethod, ReadingStatus
-from schemas import SingleReadingCreate, ReadingUpdate, ReadingResponse
+from models import Reading, ReadingSource, Persona, TarotCardDraw, MBTIResult, DivinationMethod, ReadingStatus
+from schemas import SingleReadingCreate, ReadingUpdate, ReadingResponse, ReadingBulkUpdateItem
 from constants import TEST_USER_ID, SUCCESS_MESSAGES, ERROR_MESSAGES
+from config import settings
+from services.write_buffer import reading_write_buffer
+from monitoring.metrics import record_reading_created
+from services.token_budget import estimate_cost
+from services.tarot import CARD_NAMES, resolve_draw, decode as decode_draw
+from services.mbti import resolve_scores
+from services.input_fields import indexed_fields
 
 class ReadingService:
     def __init__(self, db: Session):
@@ -23,7 +33,9 @@ class ReadingService:
                 if not persona:
                     raise Exception("指定的角色档案不存在")
             
-            # 创建reading
+            input_data = reading_data.input_data or {}
+            
+            # 创建reading（塔罗/MBTI同时写入逐张牌和维度得分记录，计入统计）
             reading = Reading(
                 user_id=user_id,
                 persona_id=reading_data.persona_id,
@@ -31,28 +43,72 @@ class ReadingService:
                 main_question=reading_data.main_question,
                 output_text=reading_data.output_text,
                 input_data=reading_data.input_data,
+                **indexed_fields(reading_data.input_data),
                 status=ReadingStatus.COMPLETED,
                 ai_model_used=reading_data.ai_model_used,
                 processing_time=reading_data.processing_time,
-                confidence_score=reading_data.confidence_score
+                confidence_score=reading_data.confidence_score,
+                tarot_cards=self.tarot_card_rows(input_data, user_id)
+                if reading_data.method == DivinationMethod.TAROT else [],
+                mbti_result=self.mbti_result_row(input_data, user_id)
+                if reading_data.method == DivinationMethod.MBTI else None
             )
             
             self.db.add(reading)
             self.db.commit()
             self.db.refresh(reading)
             
+            record_reading_created(reading.method)
+            
             return reading
             
         except Exception as e:
             self.db.rollback()
             raise Exception(f"创建占卜报告失败: {str(e)}")
     
-    def get_reading_by_id(self, reading_id: int, user_id: int = TEST_USER_ID) -> Optional[Reading]:
-        """根据ID获取Reading"""
-        return self.db.query(Reading).filter(
+    def tarot_card_rows(self, input_data: Dict[str, Any], user_id: int = TEST_USER_ID) -> List[TarotCardDraw]:
+        """由抽牌编码生成逐张牌的记录（没有编码时由 tarot_seed 复现抽牌）"""
+        draw = input_data.get("tarot_draw") or resolve_draw(input_data)
+        if not draw:
+            return []
+        return [
+            TarotCardDraw(user_id=user_id, position=position, card=card, is_reversed=is_reversed)
+            for position, (card, is_reversed) in enumerate(decode_draw(draw["code"]))
+        ]
+    
+    def mbti_result_row(self, input_data: Dict[str, Any], user_id: int = TEST_USER_ID) -> Optional[MBTIResult]:
+        """由问卷计分结果生成类型与维度得分记录（没有计分结果时由 quiz_answers 计分）"""
+        scored = input_data.get("mbti_scores") or resolve_scores(input_data)
+        if not scored:
+            return None
+        scores = scored["scores"]
+        return MBTIResult(
+            user_id=user_id,
+            mbti_type=scored["mbti_type"],
+            ei_score=scores["EI"],
+            sn_score=scores["SN"],
+            tf_score=scores["TF"],
+            jp_score=scores["JP"],
+            confidence=scored["confidence"],
+            answered=scored["answered"]
+        )
+    
+    def get_reading_by_id(
+        self,
+        reading_id: int,
+        user_id: int = TEST_USER_ID,
+        include_buffered: bool = True
+    ) -> Optional[Reading]:
+        """根据ID获取Reading（默认叠加写回缓冲中尚未落库的更新）"""
+        reading = self.db.query(Reading).filter(
             Reading.id == reading_id,
             Reading.user_id == user_id
         ).first()
+        
+        if reading and include_buffered and settings.write_behind_enabled:
+            reading_write_buffer.overlay([reading])
+        
+        return reading
     
     def get_readings_by_user(
         self, 
@@ -60,9 +116,14 @@ class ReadingService:
         persona_id: Optional[int] = None,
         method: Optional[DivinationMethod] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        spread_type: Optional[str] = None,
+        mbti_type: Optional[str] = None,
+        birth_date_from: Optional[date] = None,
+        birth_date_to: Optional[date] = None,
+        created_via: Optional[str] = None
     ) -> List[Reading]:
-        """获取用户的占卜报告列表"""
+        """获取用户的占卜报告列表（input_data 中的常用字段按提取出的索引列过滤）"""
         query = self.db.query(Reading).filter(Reading.user_id == user_id)
         
         if persona_id:
@@ -71,32 +132,177 @@ class ReadingService:
         if method:
             query = query.filter(Reading.method == method)
         
-        return query.order_by(Reading.created_at.desc()).offset(offset).limit(limit).all()
+        if spread_type:
+            query = query.filter(Reading.spread_type == spread_type)
+        
+        if mbti_type:
+            query = query.filter(Reading.mbti_type == mbti_type.upper())
+        
+        if birth_date_from:
+            query = query.filter(Reading.birth_date >= birth_date_from)
+        
+        if birth_date_to:
+            query = query.filter(Reading.birth_date <= birth_date_to)
+        
+        if created_via:
+            query = query.filter(Reading.created_via == created_via)
+        
+        readings = query.order_by(Reading.created_at.desc()).offset(offset).limit(limit).all()
+        
+        if settings.write_behind_enabled:
+            reading_write_buffer.overlay(readings)
+        
+        return readings
     
     def update_reading(self, reading_id: int, reading_data: ReadingUpdate, user_id: int = TEST_USER_ID) -> Reading:
         """更新占卜报告"""
         try:
-            reading = self.get_reading_by_id(reading_id, user_id)
+            reading = self.get_reading_by_id(reading_id, user_id, include_buffered=False)
             if not reading:
                 raise Exception(ERROR_MESSAGES["READING_NOT_FOUND"])
             
-            # 更新字段
             update_data = reading_data.dict(exclude_unset=True)
-            for field, value in update_data.items():
-                if hasattr(reading, field):
-                    setattr(reading, field, value)
             
-            reading.updated_at = datetime.utcnow()
+            if not settings.write_behind_enabled:
+                return self._apply_update(reading, update_data)
             
-            self.db.commit()
-            self.db.refresh(reading)
+            # 收藏/评分只写入缓冲，由后台任务合并落库
+            if reading_write_buffer.is_bufferable(update_data) and \
+                    reading_write_buffer.enqueue(user_id, reading_id, update_data):
+                reading_write_buffer.overlay([reading])
+                return reading
             
-            return reading
+            # 同步写入时把尚未落库的缓冲值并入同一事务，避免之后被旧值覆盖；期间不会刷新该报告
+            with reading_write_buffer.exclusive(user_id, [reading_id]):
+                # 等待期间可能有刷新落库，重新读取，否则与旧值相同的字段不会写入
+                self.db.refresh(reading)
+                buffered = reading_write_buffer.pop(user_id, reading_id)
+                try:
+                    return self._apply_update(reading, dict(buffered, **update_data))
+                except Exception:
+                    reading_write_buffer.restore(user_id, reading_id, buffered)
+                    raise
             
         except Exception as e:
             self.db.rollback()
             raise Exception(f"更新占卜报告失败: {str(e)}")
     
+    @staticmethod
+    def _buffer_exclusive(user_id: int, reading_ids: Optional[List[int]] = None):
+        """开启写回缓冲时，同步写入期间与这些报告的缓冲刷新互斥"""
+        if not settings.write_behind_enabled:
+            return nullcontext()
+        return reading_write_buffer.exclusive(user_id, reading_ids)
+    
+    def _apply_update(self, reading: Reading, update_data: Dict[str, Any]) -> Reading:
+        for field, value in update_data.items():
+            if hasattr(reading, field):
+                setattr(reading, field, value)
+        
+        reading.updated_at = datetime.utcnow()
+        
+        self.db.commit()
+        self.db.refresh(reading)
+        
+        return reading
+    
+    def bulk_update_readings(
+        self,
+        reading_data: ReadingUpdate,
+        reading_ids: Optional[List[int]] = None,
+        persona_id: Optional[int] = None,
+        method: Optional[DivinationMethod] = None,
+        user_id: int = TEST_USER_ID
+    ) -> List[ReadingBulkUpdateItem]:
+        """批量更新占卜报告：单条 UPDATE ... RETURNING，按user_id隔离"""
+        update_data = reading_data.dict(exclude_unset=True)
+        if not update_data:
+            raise ValueError(ERROR_MESSAGES["BULK_UPDATE_EMPTY"])
+        if not reading_ids and persona_id is None and method is None:
+            raise ValueError(ERROR_MESSAGES["BULK_TARGET_REQUIRED"])
+        
+        # 与写回缓冲的刷新互斥，避免刷新中的旧值覆盖本次更新
+        with self._buffer_exclusive(user_id, reading_ids or None):
+            try:
+                conditions = [Reading.user_id == user_id]
+                if reading_ids:
+                    conditions.append(Reading.id.in_(set(reading_ids)))
+                if persona_id is not None:
+                    conditions.append(Reading.persona_id == persona_id)
+                if method is not None:
+                    conditions.append(Reading.method == method)
+                
+                values = dict(update_data, updated_at=datetime.utcnow())
+                returned_columns = (
+                    Reading.id, Reading.is_favorite, Reading.user_rating, Reading.user_feedback
+                )
+                
+                if self.db.get_bind().dialect.update_returning:
+                    stmt = (
+                        update(Reading)
+                        .where(*conditions)
+                        .values(**values)
+                        .returning(*returned_columns)
+                        .execution_options(synchronize_session=False)
+                    )
+                    rows = self.db.execute(stmt).all()
+                else:
+                    # 数据库不支持RETURNING时退化为 UPDATE + SELECT
+                    self.db.execute(
+                        update(Reading)
+                        .where(*conditions)
+                        .values(**values)
+                        .execution_options(synchronize_session=False)
+                    )
+                    rows = self.db.query(*returned_columns).filter(*conditions).all()
+                
+                # 按ID并带过滤条件更新时，区分不存在的ID和存在但被过滤条件排除的ID
+                filtered_out = set()
+                if reading_ids and (persona_id is not None or method is not None):
+                    missing = set(reading_ids) - {row.id for row in rows}
+                    if missing:
+                        filtered_out = {
+                            row.id for row in self.db.query(Reading.id).filter(
+                                Reading.user_id == user_id, Reading.id.in_(missing)
+                            )
+                        }
+                
+                self.db.commit()
+                
+            except Exception as e:
+                self.db.rollback()
+                raise Exception(f"批量更新占卜报告失败: {str(e)}")
+            
+            if settings.write_behind_enabled:
+                # 批量更新的值更新，丢弃缓冲中被覆盖的字段
+                reading_write_buffer.discard(user_id, [row.id for row in rows], fields=update_data.keys())
+        
+        results = {
+            row.id: ReadingBulkUpdateItem(
+                id=row.id,
+                success=True,
+                is_favorite=row.is_favorite,
+                user_rating=row.user_rating,
+                user_feedback=row.user_feedback
+            )
+            for row in rows
+        }
+        
+        # 按ID更新时，未命中的ID也返回结果
+        if reading_ids:
+            for reading_id in reading_ids:
+                if reading_id not in results:
+                    results[reading_id] = ReadingBulkUpdateItem(
+                        id=reading_id,
+                        success=False,
+                        error=ERROR_MESSAGES[
+                            "READING_FILTERED_OUT" if reading_id in filtered_out else "READING_NOT_FOUND"
+                        ]
+                    )
+            return [results[reading_id] for reading_id in dict.fromkeys(reading_ids)]
+        
+        return sorted(results.values(), key=lambda item: item.id)
+    
     def delete_reading(self, reading_id: int, user_id: int = TEST_USER_ID) -> bool:
         """删除占卜报告"""
         try:
@@ -104,8 +310,12 @@ class ReadingService:
             if not reading:
                 raise Exception(ERROR_MESSAGES["READING_NOT_FOUND"])
             
-            self.db.delete(reading)
-            self.db.commit()
+            with self._buffer_exclusive(user_id, [reading_id]):
+                self.db.delete(reading)
+                self.db.commit()
+                
+                if settings.write_behind_enabled:
+                    reading_write_buffer.discard(user_id, [reading_id])
             
             return True
             
@@ -125,29 +335,95 @@ class ReadingService:
             "integrated_readings": []
         }
         
-        # 如果是综合报告，获取源报告
+        # 如果是综合报告，获取源报告（关联表与报告一次联表查询，不逐条加载）
         if reading.method == DivinationMethod.INTEGRATED:
-            source_readings = []
-            for source_relation in reading.source_readings:
-                source_reading = source_relation.source_reading
-                source_readings.append({
-                    "id": source_reading.id,
-                    "method": source_reading.method.value,
-                    "question": source_reading.main_question,
-                    "weight": source_relation.weight
-                })
-            result["source_readings"] = source_readings
+            rows = self.db.query(
+                Reading.id, Reading.method, Reading.main_question, ReadingSource.weight
+            ).join(
+                ReadingSource, ReadingSource.source_reading_id == Reading.id
+            ).filter(
+                ReadingSource.integrated_reading_id == reading.id
+            ).order_by(ReadingSource.id).all()
+            result["source_readings"] = [
+                {
+                    "id": row.id,
+                    "method": row.method.value,
+                    "question": row.main_question,
+                    "weight": row.weight
+                }
+                for row in rows
+            ]
         
         # 如果是individual报告，获取相关的综合报告
         else:
-            integrated_readings = []
-            for integrated_relation in reading.integrated_readings:
-                integrated_reading = integrated_relation.integrated_reading
-                integrated_readings.append({
-                    "id": integrated_reading.id,
-                    "question": integrated_reading.main_question,
-                    "created_at": integrated_reading.created_at
-                })
-            result["integrated_readings"] = integrated_readings
-        
-        return result
\ No newline at end of file
+            rows = self.db.query(
+                Reading.id, Reading.main_question, Reading.created_at
+            ).join(
+                ReadingSource, ReadingSource.integrated_reading_id == Reading.id
+            ).filter(
+                ReadingSource.source_reading_id == reading.id
+            ).order_by(ReadingSource.id).all()
+            result["integrated_readings"] = [
+                {
+                    "id": row.id,
+                    "question": row.main_question,
+                    "created_at": row.created_at
+                }
+                for row in rows
+            ]
+        
+        return result
+    
+    def get_token_usage_summary(self, days: int = 30) -> Dict[str, Any]:
+        """按占卜方法和模型汇总最近 days 天已完成报告的 token 用量、平均延迟和估算成本（全部用户）"""
+        since = datetime.utcnow() - timedelta(days=days)
+        rows = self.db.query(
+            Reading.method,
+            Reading.ai_model_used,
+            func.count(Reading.id),
+            func.coalesce(func.sum(Reading.prompt_tokens), 0),
+            func.coalesce(func.sum(Reading.output_tokens), 0),
+            func.avg(Reading.latency_ms)
+        ).filter(
+            Reading.status == ReadingStatus.COMPLETED,
+            Reading.created_at >= since
+        ).group_by(Reading.method, Reading.ai_model_used).all()
+        
+        items = []
+        total_cost = 0.0
+        for method, model, count, prompt_tokens, output_tokens, avg_latency in rows:
+            cost = estimate_cost(model, prompt_tokens, output_tokens)
+            total_cost += cost or 0.0
+            items.append({
+                "method": method.value,
+                "ai_model_used": model,
+                "readings": count,
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "avg_latency_ms": round(avg_latency) if avg_latency is not None else None,
+                "estimated_cost_usd": round(cost, 6) if cost is not None else None
+            })
+        
+        return {
+            "days": days,
+            "since": since,
+            "items": items,
+            "total_prompt_tokens": sum(item["prompt_tokens"] for item in items),
+            "total_output_tokens": sum(item["output_tokens"] for item in items),
+            "total_estimated_cost_usd": round(total_cost, 6)
+        }
+    
+    def get_tarot_card_stats(self, user_id: int = TEST_USER_ID) -> List[Dict[str, Any]]:
+        """按牌统计用户的塔罗抽牌次数和逆位次数，按次数降序"""
+        rows = self.db.query(
+            TarotCardDraw.card,
+            func.count(TarotCardDraw.id),
+            func.sum(case((TarotCardDraw.is_reversed == True, 1), else_=0))
+        ).filter(
+            TarotCardDraw.user_id == user_id
+        ).group_by(TarotCardDraw.card).order_by(func.count(TarotCardDraw.id).desc()).all()
+        
+        return [
+            {"card": card, "name": CARD_NAMES[card], "count": count, "reversed_count": int(reversed_count or 0)}
+            for card, count, reversed_count in rows
+        ]
@@ -0,0 +1,289 @@
+# services/resilience.py - 模型调用容错：指数退避重试、对冲请求、按模型熔断、并发限制
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import settings
+from constants import GEMINI_CONFIG
+from monitoring.metrics import record_model_call, set_model_circuit_state
+from services.model_client import ModelError, ModelResult
+
+# 可重试的上游状态码；status_code 为 None 表示网络错误或超时，同样可重试
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def is_retryable(error: ModelError) -> bool:
+    return error.status_code is None or error.status_code in RETRYABLE_STATUS_CODES
+
+
+class CircuitOpenError(ModelError):
+    """熔断器打开期间直接拒绝请求"""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"模型 {model} 暂时不可用（熔断中），请在 {retry_after:.0f} 秒后重试", 503)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    单个模型的熔断器
+
+    - 关闭：正常放行，连续失败达到 failure_threshold 后打开
+    - 打开：直接拒绝，reset_timeout 之后进入半开
+    - 半开：只放行一个试探请求，成功则关闭，失败则重新打开
+    只有可重试的错误（5xx、429、超时）计为失败，4xx 参数错误不影响熔断状态。
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, model: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                record_model_call(self.model, "circuit_open")
+                raise CircuitOpenError(self.model, self.reset_timeout - elapsed)
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                record_model_call(self.model, "circuit_open")
+                raise CircuitOpenError(self.model, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def release(self) -> None:
+        """调用因其它原因（取消、不可重试错误）结束时释放试探名额"""
+        self._probe_in_flight = False
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        set_model_circuit_state(self.model, state)
+
+
+class LatencyTracker:
+    """最近 window 次成功调用的延迟，用于计算对冲延迟"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ResilientModelClient:
+    """
+    在 GeminiClient 外层加上容错策略，对外接口与 GeminiClient 相同（generate / stream_generate / aclose）
+
+    - 重试：可重试错误按指数退避 + 全抖动（full jitter）等待后重试
+    - 对冲：非流式请求超过该模型近期 p95 延迟仍未返回时，再发出一个相同请求，取先成功者
+    - 熔断：每个模型独立的熔断器，上游持续故障时快速失败，不占用 worker
+    - 并发限制：进程内同时进行的模型请求不超过 GEMINI_CONFIG["MAX_CONCURRENT_REQUESTS"]（对冲请求在没有空闲名额时跳过）
+    - 流式请求只在尚未产出任何文本时重试
+    """
+
+    def __init__(
+        self,
+        client,
+        max_retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge_enabled: bool = True,
+        hedge_initial_delay: float = 10.0,
+        hedge_min_delay: float = 0.5,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_concurrency: int = GEMINI_CONFIG["MAX_CONCURRENT_REQUESTS"],
+        rng: Optional[random.Random] = None
+    ):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_initial_delay = hedge_initial_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.limiter = asyncio.Semaphore(max_concurrency)
+        self.rng = rng or random.Random()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        # model、fake_config 等属性直接取自内层客户端
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(model, self.failure_threshold, self.reset_timeout)
+        return self._breakers[model]
+
+    def latency_tracker(self, model: str) -> LatencyTracker:
+        return self._latencies.setdefault(model, LatencyTracker())
+
+    def backoff_delay(self, retry: int) -> float:
+        """第 retry 次重试前的等待时间（full jitter）"""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def hedge_delay(self, model: str) -> float:
+        p95 = self.latency_tracker(model).p95()
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_initial_delay)
+
+    # ===== 非流式 =====
+
+    async def generate(self, parts: List[Dict[str, Any]], model: Optional[str] = None) -> ModelResult:
+        model = model or self.client.model
+        breaker = self.breaker(model)
+        last_error: Optional[ModelError] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                record_model_call(model, "retry")
+                await asyncio.sleep(self.backoff_delay(attempt))
+
+            breaker.before_call()
+            try:
+                result = await self._hedged(parts, model)
+            except ModelError as e:
+                if not is_retryable(e):
+                    breaker.release()
+                    record_model_call(model, "error")
+                    raise
+                breaker.record_failure()
+                record_model_call(model, "error")
+                last_error = e
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+
+            breaker.record_success()
+            self.latency_tracker(model).add(result.latency)
+            record_model_call(model, "success", result.latency)
+            return result
+
+        raise last_error
+
+    async def _hedged(self, parts: List[Dict[str, Any]], model: str) -> ModelResult:
+        primary = asyncio.create_task(self._call(parts, model))
+        tasks = [primary]
+        try:
+            if not self.hedge_enabled:
+                return await primary
+
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(model))
+            if done or self.limiter.locked():
+                return await primary
+
+            record_model_call(model, "hedge")
+            tasks.append(asyncio.create_task(self._call(parts, model)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()  # 标记落败请求的异常已处理
+                else:
+                    task.cancel()
+
+    async def _call(self, parts: List[Dict[str, Any]], model: str) -> ModelResult:
+        async with self.limiter:
+            return await self.client.generate(parts, model)
+
+    # ===== 流式 =====
+
+    async def stream_generate(self, parts: List[Dict[str, Any]], model: Optional[str] = None) -> AsyncIterator[str]:
+        model = model or self.client.model
+        breaker = self.breaker(model)
+        last_error: Optional[ModelError] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                record_model_call(model, "retry")
+                await asyncio.sleep(self.backoff_delay(attempt))
+
+            breaker.before_call()
+            started = False
+            start = time.perf_counter()
+            try:
+                async with self.limiter:
+                    async for chunk in self.client.stream_generate(parts, model):
+                        started = True
+                        yield chunk
+            except ModelError as e:
+                record_model_call(model, "error")
+                if not is_retryable(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if started:
+                    # 已经向调用方输出了部分文本，重试会导致内容重复
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+
+            breaker.record_success()
+            record_model_call(model, "success", time.perf_counter() - start)
+            return
+
+        raise last_error
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def build_resilient_client(client) -> ResilientModelClient:
+    """按 settings 中的容错参数包装模型客户端"""
+    return ResilientModelClient(
+        client,
+        max_retries=settings.generation_max_retries,
+        base_delay=settings.generation_retry_base_delay,
+        max_delay=settings.generation_retry_max_delay,
+        hedge_enabled=settings.generation_hedge_enabled,
+        hedge_initial_delay=settings.generation_hedge_initial_delay,
+        hedge_min_delay=settings.generation_hedge_min_delay,
+        failure_threshold=settings.generation_circuit_failure_threshold,
+        reset_timeout=settings.generation_circuit_reset_timeout
+    )
@@ -0,0 +1,165 @@
+# services/tarot.py - 塔罗抽牌引擎（数组表示的 78 张牌、牌阵定义、带种子的可复现密码学洗牌）
+"""
+- 牌组用下标 0-77 表示：0-21 大阿卡纳，22-77 为权杖/圣杯/宝剑/星币各 14 张（Ace ... King）
+- 洗牌：以 16 字节随机种子（secrets 生成）为输入，SHAKE-256 输出每张牌一个 64 位排序键，
+  按键排序得到排列；再取一段输出作为每个位置的正逆位。相同种子总能复现同一次抽牌，
+  种子不可预测时排列也不可预测
+- 抽牌结果的紧凑编码：每张牌 1 字节 = 牌下标 << 1 | 逆位，按牌阵位置顺序拼接后以十六进制保存
+- 批量抽牌对 n 个种子的排序键组成 (n, 78) 矩阵，一次 argsort 完成
+"""
+import hashlib
+import secrets
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAJOR_ARCANA = (
+    "The Fool", "The Magician", "The High Priestess", "The Empress", "The Emperor", "The Hierophant",
+    "The Lovers", "The Chariot", "Strength", "The Hermit", "Wheel of Fortune", "Justice", "The Hanged Man",
+    "Death", "Temperance", "The Devil", "The Tower", "The Star", "The Moon", "The Sun", "Judgement", "The World"
+)
+SUITS = ("Wands", "Cups", "Swords", "Pentacles")
+RANKS = ("Ace", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine", "Ten",
+         "Page", "Knight", "Queen", "King")
+
+DECK_SIZE = 78
+CARD_NAMES: Tuple[str, ...] = MAJOR_ARCANA + tuple(f"{rank} of {suit}" for suit in SUITS for rank in RANKS)
+# 0 为大阿卡纳，1-4 对应 SUITS
+CARD_SUITS = np.array([0] * len(MAJOR_ARCANA) + [s + 1 for s in range(len(SUITS)) for _ in RANKS], dtype=np.int8)
+# 大阿卡纳为牌号 0-21，小阿卡纳为 1-14
+CARD_RANKS = np.array(list(range(len(MAJOR_ARCANA))) + list(range(1, len(RANKS) + 1)) * len(SUITS), dtype=np.int8)
+
+# 牌阵：名称 -> 各位置含义
+SPREADS: Dict[str, Tuple[str, ...]] = {
+    "single": ("Guidance",),
+    "three_card": ("Past", "Present", "Future"),
+    "five_card": ("Present", "Challenge", "Past", "Future", "Outcome"),
+    "celtic_cross": (
+        "Present", "Challenge", "Foundation", "Recent Past", "Crown", "Near Future",
+        "Self", "Environment", "Hopes and Fears", "Outcome"
+    ),
+}
+DEFAULT_SPREAD = "three_card"
+
+SEED_BYTES = 16
+_KEY_BYTES = DECK_SIZE * 8
+
+
+class TarotDrawError(ValueError):
+    """牌阵、种子或选牌位置无效"""
+
+
+def new_seed() -> str:
+    return secrets.token_hex(SEED_BYTES)
+
+
+def _stream(seed: str) -> bytes:
+    try:
+        raw = bytes.fromhex(seed)
+    except (TypeError, ValueError):
+        raise TarotDrawError("种子必须是十六进制字符串")
+    if len(raw) != SEED_BYTES:
+        raise TarotDrawError(f"种子长度必须为 {SEED_BYTES} 字节")
+    # 排序键 + 每个位置 1 字节的正逆位
+    return hashlib.shake_256(b"tarot-shuffle-v1" + raw).digest(_KEY_BYTES + DECK_SIZE)
+
+
+def _spread_positions(spread_type: str, picks: Optional[Sequence[int]]) -> Tuple[Tuple[str, ...], List[int]]:
+    if not isinstance(spread_type, str) or spread_type not in SPREADS:
+        raise TarotDrawError(f"不支持的牌阵: {spread_type}")
+    positions = SPREADS[spread_type]
+    if picks is None:
+        return positions, list(range(len(positions)))
+    try:
+        picks = [int(pick) for pick in picks]
+    except (TypeError, ValueError):
+        picks = []
+    if len(picks) != len(positions) or len(set(picks)) != len(picks) or not all(0 <= p < DECK_SIZE for p in picks):
+        raise TarotDrawError(f"{spread_type} 需要 {len(positions)} 个不重复的选牌位置（0-{DECK_SIZE - 1}）")
+    return positions, picks
+
+
+def _order(stream: bytes) -> np.ndarray:
+    return np.argsort(np.frombuffer(stream[:_KEY_BYTES], dtype=">u8"), kind="stable")
+
+
+def shuffle(seed: str) -> np.ndarray:
+    """种子确定的 78 张牌排列"""
+    return _order(_stream(seed))
+
+
+def encode(cards: Sequence[int], reversed_flags: Sequence[bool]) -> str:
+    return bytes((int(card) << 1) | int(bool(flag)) for card, flag in zip(cards, reversed_flags)).hex()
+
+
+def decode(code: str) -> List[Tuple[int, bool]]:
+    """紧凑编码 -> [(牌下标, 是否逆位)]"""
+    values = bytes.fromhex(code)
+    if any(value >> 1 >= DECK_SIZE for value in values):
+        raise TarotDrawError("无效的抽牌编码")
+    return [(value >> 1, bool(value & 1)) for value in values]
+
+
+def draw(
+    spread_type: str = DEFAULT_SPREAD,
+    seed: Optional[str] = None,
+    picks: Optional[Sequence[int]] = None
+) -> Dict[str, Any]:
+    """
+    按牌阵抽牌
+
+    - seed: 不提供时生成新种子；提供时复现同一次抽牌
+    - picks: 用户从洗好的牌堆中选择的位置（与牌阵张数相同），默认取牌堆顶部
+    返回 {"spread_type", "seed", "picks", "code", "cards": [{"position", "card", "name", "reversed"}]}
+    """
+    seed = seed or new_seed()
+    positions, picks = _spread_positions(spread_type, picks)
+    stream = _stream(seed)
+    cards = _order(stream)[picks].tolist()
+    reversed_flags = [bool(stream[_KEY_BYTES + pick] & 1) for pick in picks]
+    return {
+        "spread_type": spread_type,
+        "seed": seed,
+        "picks": picks,
+        "code": encode(cards, reversed_flags),
+        "cards": [
+            {"position": position, "card": card, "name": CARD_NAMES[card], "reversed": flag}
+            for position, card, flag in zip(positions, cards, reversed_flags)
+        ]
+    }
+
+
+def draw_batch(count: int, spread_type: str = DEFAULT_SPREAD, seeds: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    批量抽牌（取牌堆顶部），返回列式结果 {"seeds", "cards": (n, k) 牌下标, "reversed": (n, k) bool}
+
+    用于模拟、统计检验等需要大量抽牌的场景。
+    """
+    seeds = list(seeds) if seeds is not None else [new_seed() for _ in range(count)]
+    positions, _ = _spread_positions(spread_type, None)
+    size = len(positions)
+    streams = np.frombuffer(b"".join(_stream(seed) for seed in seeds), dtype=np.uint8).reshape(len(seeds), -1)
+    keys = streams[:, :_KEY_BYTES].copy().view(">u8")
+    cards = np.argsort(keys, axis=1, kind="stable")[:, :size]
+    reversed_flags = (streams[:, _KEY_BYTES:_KEY_BYTES + size] & 1).astype(bool)
+    return {"spread_type": spread_type, "seeds": seeds, "cards": cards, "reversed": reversed_flags}
+
+
+def resolve_draw(input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    从输入数据复现抽牌：需要 tarot_seed（可选 spread_type、card_positions 作为选牌位置）
+
+    没有种子时返回 None（兼容前端只传 selected_cards 的旧数据）。
+    """
+    seed = input_data.get("tarot_seed")
+    if not seed:
+        return None
+    return draw(input_data.get("spread_type") or DEFAULT_SPREAD, seed, input_data.get("card_positions"))
+
+
+def describe(draw_result: Dict[str, Any]) -> str:
+    """提示词用的抽牌描述"""
+    return "; ".join(
+        f"{card['position']}: {card['name']}{' (reversed)' if card['reversed'] else ''}"
+        for card in draw_result["cards"]
+    )
@@ -0,0 +1,194 @@
+# services/token_budget.py - token 估算、综合报告源文本压缩与成本计算
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from constants import GEMINI_CONFIG, MODEL_PRICING, EXPECTED_OUTPUT_TOKENS
+from models import DivinationMethod
+from services.prompts import build_method_prompt, build_integrated_prompt
+
+# Gemini 对每张图片按固定 token 数计费
+IMAGE_TOKENS = 258
+
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    估算文本 token 数（不调用 countTokens 接口）
+
+    中日韩字符大约每字 1 个 token，其余文本大约每 4 个字符 1 个 token。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_prompt_tokens(parts: List[Dict[str, Any]]) -> int:
+    return sum(
+        IMAGE_TOKENS if "inlineData" in part else estimate_tokens(part.get("text"))
+        for part in parts
+    )
+
+
+def expected_output_tokens(method: str) -> int:
+    return EXPECTED_OUTPUT_TOKENS.get(method, GEMINI_CONFIG["MAX_TOKENS"])
+
+
+def integrated_source_budget(overhead_tokens: int) -> int:
+    """综合报告提示词中源报告可用的 token 数：配置的预算，且整体不超过 MAX_TOKENS"""
+    hard_limit = GEMINI_CONFIG["MAX_TOKENS"] - expected_output_tokens("Integrated") - overhead_tokens
+    return max(0, min(settings.integrated_source_token_budget, hard_limit))
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, output_tokens: int) -> Optional[float]:
+    """按 MODEL_PRICING 估算成本（美元）；未知模型返回 None"""
+    pricing = MODEL_PRICING.get(model or "")
+    if pricing is None:
+        return None
+    return (
+        prompt_tokens * pricing["INPUT_PER_MILLION"] + output_tokens * pricing["OUTPUT_PER_MILLION"]
+    ) / 1_000_000
+
+
+# ===== 源报告压缩 =====
+
+def compress_report(text: str, max_tokens: int) -> str:
+    """
+    抽取式压缩：保留标题和每段首句，剩余预算按原文顺序补充其它句子，输出保持原有顺序
+
+    不额外调用模型，压缩后的文本仍是原报告中的原句。
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # (段落序号, 句子序号, 文本, 优先级)；优先级 0 为标题和段首句
+    sentences = []
+    for p_index, paragraph in enumerate(p for p in re.split(r"\n\s*\n|\n(?=#)", text) if p.strip()):
+        paragraph = paragraph.strip()
+        if paragraph.startswith("#"):
+            sentences.append((p_index, 0, paragraph.split("\n")[0], 0))
+            paragraph = "\n".join(paragraph.split("\n")[1:]).strip()
+            if not paragraph:
+                continue
+        parts = [s.strip() for s in _SENTENCE_END.split(paragraph) if s and s.strip()]
+        for s_index, sentence in enumerate(parts, start=1):
+            sentences.append((p_index, s_index, sentence, 0 if s_index == 1 else 1))
+
+    kept = set()
+    used = 0
+    for priority in (0, 1):
+        for index, (_, _, sentence, level) in enumerate(sentences):
+            if level != priority:
+                continue
+            cost = estimate_tokens(sentence) + 1
+            if used + cost > max_tokens:
+                continue
+            kept.add(index)
+            used += cost
+
+    if not kept:
+        # 连首句都放不下（如无标点的长段落）时按预算截断
+        return truncate_to_tokens(text, max_tokens)
+
+    lines: List[str] = []
+    current_paragraph = None
+    for index, (p_index, _, sentence, _) in enumerate(sentences):
+        if index not in kept:
+            continue
+        if p_index != current_paragraph:
+            lines.append(sentence)
+            current_paragraph = p_index
+        else:
+            separator = "" if lines[-1][-1] in "。！？；" else " "
+            lines[-1] = f"{lines[-1]}{separator}{sentence}"
+    return "\n\n".join(lines)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本使估算 token 数不超过 max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip()
+
+
+def fit_reports_to_budget(reports: Dict[str, str], budget: int) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    把多份源报告压缩到总预算内
+
+    先按平均份额分配，短于份额的报告原样保留，多出的份额再分给较长的报告（注水分配）。
+    返回 (压缩后的报告, 统计信息)。
+    """
+    sizes = {method: estimate_tokens(text) for method, text in reports.items()}
+    original = sum(sizes.values())
+    if original <= budget:
+        return dict(reports), {"source_tokens": original, "compressed_tokens": original, "budget": budget}
+
+    allocation: Dict[str, int] = {}
+    remaining_methods = sorted(reports, key=lambda m: sizes[m])
+    remaining_budget = budget
+    while remaining_methods:
+        share = remaining_budget // len(remaining_methods)
+        method = remaining_methods.pop(0)
+        allocation[method] = min(sizes[method], share)
+        remaining_budget -= allocation[method]
+
+    compressed = {method: compress_report(text, allocation[method]) for method, text in reports.items()}
+    return compressed, {
+        "source_tokens": original,
+        "compressed_tokens": sum(estimate_tokens(text) for text in compressed.values()),
+        "budget": budget
+    }
+
+
+def estimate_usage(
+    method: DivinationMethod,
+    output_text: str,
+    input_data: Optional[Dict[str, Any]] = None,
+    main_question: Optional[str] = None,
+    user_name: Optional[str] = None,
+    source_reports: Optional[Dict[str, str]] = None
+) -> Dict[str, int]:
+    """没有上游用量数据时（如前端生成后保存），按对应的提示词模板估算用量"""
+    if method == DivinationMethod.INTEGRATED:
+        parts = build_integrated_prompt(source_reports or {}, main_question, user_name)
+    else:
+        parts = build_method_prompt(method, input_data or {}, main_question, user_name)
+    return {"prompt_tokens": estimate_prompt_tokens(parts), "output_tokens": estimate_tokens(output_text)}
+
+
+def integrated_prompt(
+    reports: Dict[str, str],
+    main_question: Optional[str] = None,
+    user_name: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """构建综合报告提示词，源报告超出预算时先压缩；返回 (parts, 压缩统计)"""
+    overhead = estimate_prompt_tokens(build_integrated_prompt({}, main_question, user_name))
+    # 每份源报告的分隔符和标题
+    overhead += sum(estimate_tokens(f"\n\n---\n\n## {method}\n") for method in reports)
+    compressed, stats = fit_reports_to_budget(reports, integrated_source_budget(overhead))
+    return build_integrated_prompt(compressed, main_question, user_name), stats
+
+
+def usage_from_result(result, parts: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    一次生成的 token 用量与延迟；上游未返回用量（如流式）时使用估算值
+
+    命中生成缓存的结果没有产生模型调用，用量记为 0。
+    """
+    if result.cached:
+        return {"prompt_tokens": 0, "output_tokens": 0, "latency_ms": 0}
+    return {
+        "prompt_tokens": result.prompt_tokens if result.prompt_tokens is not None else estimate_prompt_tokens(parts),
+        "output_tokens": result.output_tokens if result.output_tokens is not None else estimate_tokens(result.text),
+        "latency_ms": int(result.latency * 1000)
+    }
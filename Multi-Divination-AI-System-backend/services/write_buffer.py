@@ -0,0 +1,266 @@
+# services/write_buffer.py - 高频交互更新的写回缓冲
+import asyncio
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import settings
+from database import SessionLocal
+from models import Reading
+
+logger = logging.getLogger("divination.write_buffer")
+
+# 允许走写回缓冲的字段；其它字段（如 user_feedback）仍走同步事务
+BUFFERABLE_FIELDS = frozenset({"is_favorite", "user_rating"})
+
+BufferKey = Tuple[int, int]  # (user_id, reading_id)
+
+
+class ReadingWriteBuffer:
+    """
+    Reading 交互字段的写回缓冲
+
+    - 同一报告在一个刷新窗口内的多次更新会被合并，只保留最新值
+    - 后台任务按字段组合分组，用 executemany 的 UPDATE 批量落库
+    - 刷新失败时条目会放回缓冲区（较新的值优先），等待下一次刷新
+    - 刷新只在取出批次时加锁，数据库写入在锁外进行
+    - 同步写入报告时持有 exclusive()：只等待包含同一报告的进行中刷新，刷新中的旧值不会覆盖
+      同步写入的结果，失败放回的旧值也会在同步写入开始前归位，由同步写入合并或丢弃
+    - 正在刷新的批次在提交前仍对读取可见（overlay / buffered_values）
+    - 进程崩溃时最多丢失一个刷新窗口内尚未落库的更新；正常关闭时由 lifespan 调用 stop() 刷新
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[BufferKey, Dict[str, Any]] = {}
+        self._flushing: Dict[BufferKey, Dict[str, Any]] = {}  # 已取出、尚未提交的批次
+        self._lock = threading.Lock()
+        self._flush_done = threading.Condition(self._lock)  # 正在刷新的批次提交或放回后通知
+        self._write_lock = threading.Lock()  # 同步写入的事务与取出批次互斥
+        self._flush_lock = threading.Lock()  # 刷新之间串行
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    # ===== 写入 =====
+
+    @staticmethod
+    def is_bufferable(update_data: Dict[str, Any]) -> bool:
+        """判断一次更新是否只涉及可缓冲字段"""
+        return bool(update_data) and set(update_data) <= BUFFERABLE_FIELDS
+
+    def enqueue(self, user_id: int, reading_id: int, update_data: Dict[str, Any]) -> bool:
+        """合并一次更新；缓冲区已满时返回False，由调用方同步写入"""
+        key = (user_id, reading_id)
+        with self._lock:
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                return False
+            self._pending.setdefault(key, {}).update(update_data)
+        return True
+
+    def pop(self, user_id: int, reading_id: int) -> Dict[str, Any]:
+        """取出并移除某报告的缓冲更新（同步写入路径会把它合并进同一事务）"""
+        with self._lock:
+            return self._pending.pop((user_id, reading_id), {})
+
+    def restore(self, user_id: int, reading_id: int, update_data: Dict[str, Any]) -> None:
+        """放回之前 pop 出的更新（同步事务失败时调用），缓冲中更新的值优先"""
+        if update_data:
+            self._requeue({(user_id, reading_id): update_data})
+
+    def discard(self, user_id: int, reading_ids: Iterable[int], fields: Optional[Iterable[str]] = None) -> None:
+        """丢弃缓冲中的字段（报告被删除或被批量更新覆盖时调用）"""
+        fields = set(fields) if fields is not None else None
+        with self._lock:
+            for reading_id in reading_ids:
+                key = (user_id, reading_id)
+                if key not in self._pending:
+                    continue
+                if fields is None:
+                    del self._pending[key]
+                    continue
+                for field in fields:
+                    self._pending[key].pop(field, None)
+                if not self._pending[key]:
+                    del self._pending[key]
+
+    @contextmanager
+    def exclusive(self, user_id: int, reading_ids: Optional[Iterable[int]] = None):
+        """
+        同步写入报告（单条更新、批量更新、删除）的事务期间持有
+
+        只等待包含这些报告（reading_ids 为 None 时为该用户的任一报告）的进行中刷新；
+        持有期间刷新不会取出新批次
+        """
+        reading_ids = set(reading_ids) if reading_ids is not None else None
+
+        def in_flight() -> bool:
+            return any(
+                key[0] == user_id and (reading_ids is None or key[1] in reading_ids)
+                for key in self._flushing
+            )
+
+        while True:
+            with self._lock:
+                self._flush_done.wait_for(lambda: not in_flight())
+            self._write_lock.acquire()
+            with self._lock:
+                if not in_flight():
+                    break
+            # 等待期间又有刷新取出了相关报告，放开后重新等待
+            self._write_lock.release()
+        try:
+            yield
+        finally:
+            self._write_lock.release()
+
+    # ===== 读取 =====
+
+    def _buffered(self, key: BufferKey) -> Dict[str, Any]:
+        """尚未落库的值：正在刷新的批次，再叠加之后写入的缓冲（调用方持有 _lock）"""
+        flushing = self._flushing.get(key)
+        pending = self._pending.get(key)
+        if flushing is None:
+            return pending or {}
+        return dict(flushing, **pending) if pending else flushing
+
+    def get(self, user_id: int, reading_id: int) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._buffered((user_id, reading_id)))
+
+    def buffered_values(self, user_id: int, field: str) -> Dict[int, Any]:
+        """该用户所有尚未落库的某字段值 {reading_id: value}（用于统计时修正数据库中的旧值）"""
+        with self._lock:
+            keys = set(self._flushing) | set(self._pending)
+            values = {}
+            for key in keys:
+                buffered = self._buffered(key)
+                if key[0] == user_id and field in buffered:
+                    values[key[1]] = buffered[field]
+            return values
+
+    def overlay(self, readings: Iterable[Reading]) -> None:
+        """把缓冲值覆盖到查询结果上，使读取能看到尚未落库的更新（不会把对象标记为脏）"""
+        with self._lock:
+            if not self._pending and not self._flushing:
+                return
+            for reading in readings:
+                buffered = self._buffered((reading.user_id, reading.id))
+                for field, value in buffered.items():
+                    set_committed_value(reading, field, value)
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # ===== 刷新 =====
+
+    def flush(self) -> int:
+        """把当前缓冲全部落库，返回写入的报告数"""
+        with self._flush_lock:
+            # 只在取出批次时与同步写入互斥，数据库写入期间不持有锁
+            with self._write_lock, self._lock:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            if not batch:
+                return 0
+
+            # 按字段组合分组，每组一条 executemany UPDATE
+            groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+            now = datetime.utcnow()
+            for (user_id, reading_id), fields in batch.items():
+                params = {"b_id": reading_id, "b_user_id": user_id, "b_updated_at": now}
+                params.update({f"b_{field}": value for field, value in fields.items()})
+                groups.setdefault(tuple(sorted(fields)), []).append(params)
+
+            db = None
+            try:
+                db = self.session_factory()
+                for fields, params_list in groups.items():
+                    stmt = (
+                        update(Reading.__table__)
+                        .where(
+                            Reading.__table__.c.id == bindparam("b_id"),
+                            Reading.__table__.c.user_id == bindparam("b_user_id")
+                        )
+                        .values(
+                            updated_at=bindparam("b_updated_at"),
+                            **{field: bindparam(f"b_{field}") for field in fields}
+                        )
+                    )
+                    db.execute(stmt, params_list)
+                db.commit()
+            except Exception:
+                if db is not None:
+                    db.rollback()
+                self._requeue(batch)
+                raise
+            finally:
+                # 放回之后才清空，等待同一报告的同步写入能取到放回的值
+                with self._lock:
+                    self._flushing = {}
+                    self._flush_done.notify_all()
+                if db is not None:
+                    db.close()
+
+            return len(batch)
+
+    def _requeue(self, batch: Dict[BufferKey, Dict[str, Any]]) -> None:
+        """刷新失败时放回缓冲，刷新期间写入的新值优先"""
+        with self._lock:
+            for key, fields in batch.items():
+                merged = dict(fields)
+                merged.update(self._pending.get(key, {}))
+                self._pending[key] = merged
+
+    # ===== 后台任务 =====
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务并做最后一次刷新"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                record = {
+                    "event": "write_buffer_flush_failed",
+                    "pending": self.pending_count,
+                    "error": str(e)
+                }
+                logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+# 全局写回缓冲实例
+reading_write_buffer = ReadingWriteBuffer(
+    flush_interval=settings.write_behind_flush_interval,
+    max_pending=settings.write_behind_max_pending
+)
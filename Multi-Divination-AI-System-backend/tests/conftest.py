@@ -0,0 +1,74 @@
+# tests/conftest.py - 测试环境：临时 SQLite 数据库、本地假模型服务
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_tmp_dir = tempfile.mkdtemp(prefix="divination-tests-")
+
+# 必须在导入 config 之前设置
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+os.environ["ENVIRONMENT"] = "development"
+os.environ["BLOB_DIR"] = os.path.join(_tmp_dir, "blobs")
+os.environ.setdefault("EPHEMERIS_DIR", os.path.join(BACKEND_DIR, "data"))
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GENERATION_RESILIENCE_ENABLED"] = "false"
+# 显式使用开发模式：没有令牌的请求按测试用户处理
+os.environ["AUTH_REQUIRED"] = "false"
+sys.path.insert(0, BACKEND_DIR)
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from constants import TEST_USER_ID
+from database import Base, SessionLocal, engine
+from models import User
+from services.model_client import set_model_client
+from services.auth import set_authenticator
+from services.chat_stream import chat_context_cache
+from services.quota import reading_quota
+from services.write_buffer import reading_write_buffer
+from benchmarks.fake_model_server import create_fake_model_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    """每个测试使用空数据库（只有测试用户）和空的进程内缓存"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(id=TEST_USER_ID, username="testuser", email="test@example.com", hashed_password="-"))
+    db.commit()
+    db.close()
+
+    chat_context_cache.clear()
+    reading_quota._buckets.clear()
+    reading_write_buffer._pending.clear()
+    set_authenticator(None)
+    yield
+    set_model_client(None)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def fake_model():
+    client = create_fake_model_client(latency=0.01, tokens=40)
+    set_model_client(client)
+    return client
+
+
+@pytest.fixture
+def client(fake_model):
+    with TestClient(main.app) as test_client:
+        # lifespan 中可能创建默认模型客户端，这里重新注入
+        set_model_client(fake_model)
+        yield test_client
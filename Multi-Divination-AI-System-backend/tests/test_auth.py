@@ -0,0 +1,37 @@
+# tests/test_auth.py - 默认要求认证；默认签名密钥下拒绝启动
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import DEFAULT_SECRET_KEY, Settings, settings
+from constants import TEST_USER_ID
+from services.auth import JWTAuthenticator, set_authenticator
+
+
+def test_auth_is_required_by_default(monkeypatch):
+    monkeypatch.delenv("AUTH_REQUIRED", raising=False)
+    assert Settings(_env_file=None).auth_required is True
+
+
+def test_refuses_to_start_with_default_secret(monkeypatch):
+    monkeypatch.setattr(settings, "auth_required", True)
+    monkeypatch.setattr(settings, "secret_key", DEFAULT_SECRET_KEY)
+
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        with TestClient(main.app):
+            pass
+
+
+def test_requests_without_token_are_rejected(monkeypatch, fake_model):
+    monkeypatch.setattr(settings, "auth_required", True)
+    monkeypatch.setattr(settings, "secret_key", "test-secret")
+    authenticator = JWTAuthenticator(secret_key="test-secret")
+    set_authenticator(authenticator)
+
+    with TestClient(main.app) as client:
+        response = client.get("/readings/")
+        assert response.status_code == 401
+
+        token = authenticator.create_access_token(TEST_USER_ID)
+        response = client.get("/readings/", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
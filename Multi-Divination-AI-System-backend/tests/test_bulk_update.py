@@ -0,0 +1,40 @@
+# tests/test_bulk_update.py - 批量更新的逐条结果：不存在 / 不属于当前用户 / 不符合筛选条件
+from constants import ERROR_MESSAGES, TEST_USER_ID
+from models import DivinationMethod, Reading, User
+
+
+def create_reading(db, method: DivinationMethod, user_id: int = TEST_USER_ID) -> int:
+    reading = Reading(user_id=user_id, method=method, main_question="What should I focus on?", output_text="...")
+    db.add(reading)
+    db.commit()
+    return reading.id
+
+
+def test_ids_excluded_by_filter_are_not_reported_missing(client, db):
+    tarot = create_reading(db, DivinationMethod.TAROT)
+    mbti = create_reading(db, DivinationMethod.MBTI)
+    other_user = User(username="other", email="other@example.com", hashed_password="-")
+    db.add(other_user)
+    db.commit()
+    foreign = create_reading(db, DivinationMethod.TAROT, other_user.id)
+
+    response = client.patch("/readings/bulk", json={
+        "reading_ids": [tarot, mbti, foreign, 9999],
+        "method": "Tarot",
+        "update": {"is_favorite": True}
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated_count"] == 1
+    results = {item["id"]: item for item in body["results"]}
+    assert results[tarot]["success"] and results[tarot]["is_favorite"] is True
+    assert not results[mbti]["success"]
+    assert results[mbti]["error"] == ERROR_MESSAGES["READING_FILTERED_OUT"]
+    # 其他用户的报告与不存在的报告一样处理，不泄露是否存在
+    assert results[foreign]["error"] == ERROR_MESSAGES["READING_NOT_FOUND"]
+    assert results[9999]["error"] == ERROR_MESSAGES["READING_NOT_FOUND"]
+
+    db.expire_all()
+    assert db.get(Reading, mbti).is_favorite is False
+    assert db.get(Reading, foreign).is_favorite is False
@@ -0,0 +1,38 @@
+# tests/test_chat_service.py - 追加消息：会话统计与 token_offset（支持/不支持 UPDATE ... RETURNING）
+import pytest
+
+from constants import TEST_USER_ID
+from database import engine
+from models import ChatSession
+from schemas import ChatMessageCreate, ChatSessionCreate
+from services.chat_service import ChatService
+
+
+@pytest.mark.parametrize("update_returning", [True, False])
+def test_append_messages_assigns_increasing_offsets(db, monkeypatch, update_returning):
+    monkeypatch.setattr(engine.dialect, "update_returning", update_returning)
+    service = ChatService(db)
+    session = service.create_session(ChatSessionCreate(title="Offsets"), TEST_USER_ID)
+
+    first = service.append_messages(session.id, [
+        ChatMessageCreate(content="Hello there"),
+        ChatMessageCreate(content="Hi! How can I help you today?", is_user_message=False)
+    ], TEST_USER_ID)
+    second = service.append_message(session.id, ChatMessageCreate(content="Tell me about my chart"), TEST_USER_ID)
+
+    rows = first + [second]
+    offsets = [row.token_offset for row in rows]
+    assert offsets == sorted(offsets) and len(set(offsets)) == 3
+    assert offsets[-1] == sum(row.token_count for row in rows)
+
+    db.expire_all()
+    stored = db.get(ChatSession, session.id)
+    assert stored.message_count == 3
+    assert stored.token_total == offsets[-1]
+
+
+@pytest.mark.parametrize("update_returning", [True, False])
+def test_append_to_missing_session_raises_lookup_error(db, monkeypatch, update_returning):
+    monkeypatch.setattr(engine.dialect, "update_returning", update_returning)
+    with pytest.raises(LookupError):
+        ChatService(db).append_message(9999, ChatMessageCreate(content="Hello"), TEST_USER_ID)
@@ -0,0 +1,159 @@
+# tests/test_chat_stream.py - /chat WebSocket 流式对话（本地假模型服务）
+import asyncio
+import threading
+from contextlib import aclosing
+
+from fastapi import WebSocketDisconnect
+
+from database import SessionLocal
+from models import ChatMessage
+from routers.chat_routes import chat_websocket
+from services import chat_stream
+
+
+def create_session(client) -> int:
+    response = client.post("/chat/sessions", json={"title": "Stream test"})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def stored_messages(session_id: int):
+    db = SessionLocal()
+    try:
+        return db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.id).all()
+    finally:
+        db.close()
+
+
+class DisconnectingWebSocket:
+    """收到若干个 token 帧后模拟客户端断开（发送时抛出 WebSocketDisconnect）"""
+
+    def __init__(self, content: str, disconnect_after: int):
+        self.headers = {}
+        self.query_params = {}
+        self.content = content
+        self.disconnect_after = disconnect_after
+        self.frames = []
+        self._received = False
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def receive_json(self):
+        if self._received:
+            raise WebSocketDisconnect()
+        self._received = True
+        return {"content": self.content}
+
+    async def send_json(self, frame):
+        tokens = sum(1 for f in self.frames if f["type"] == "token")
+        if frame["type"] == "token" and tokens >= self.disconnect_after:
+            raise WebSocketDisconnect()
+        self.frames.append(frame)
+
+
+def test_streamed_frames_and_saved_turn(client, fake_model):
+    session_id = create_session(client)
+
+    with client.websocket_connect(f"/chat/sessions/{session_id}/ws") as websocket:
+        websocket.send_json({"content": "What does my chart say about work?"})
+        frames = []
+        while True:
+            frame = websocket.receive_json()
+            frames.append(frame)
+            if frame["type"] != "token":
+                break
+
+        # 同一连接上的无效消息返回错误帧，连接保持可用
+        websocket.send_json({"content": ""})
+        assert websocket.receive_json()["type"] == "error"
+
+    tokens, done = frames[:-1], frames[-1]
+    assert done["type"] == "done"
+    assert len(tokens) > 1
+    assert done["usage"]["output_tokens"] > 0
+
+    messages = stored_messages(session_id)
+    assert [m.id for m in messages] == [done["user_message_id"], done["message_id"]]
+    assert messages[0].is_user_message and messages[0].content == "What does my chart say about work?"
+    assert not messages[1].is_user_message
+    assert messages[1].content == "".join(frame["text"] for frame in tokens)
+    assert not messages[1].message_metadata.get("interrupted")
+
+    response = client.get(f"/chat/sessions/{session_id}/messages")
+    assert [m["id"] for m in response.json()["messages"]] == [m.id for m in messages]
+
+
+def test_model_error_saves_user_message_only(client, fake_model):
+    session_id = create_session(client)
+    fake_model.fake_config.fail_next = 1
+
+    with client.websocket_connect(f"/chat/sessions/{session_id}/ws") as websocket:
+        websocket.send_json({"content": "Hello?"})
+        frame = websocket.receive_json()
+
+    assert frame["type"] == "error"
+    messages = stored_messages(session_id)
+    assert [(m.id, m.is_user_message) for m in messages] == [(frame["user_message_id"], True)]
+
+
+def test_interrupted_reply_is_saved(client, fake_model):
+    session_id = create_session(client)
+    fake_model.fake_config.chunk_tokens = 5
+    websocket = DisconnectingWebSocket("Tell me a long story", disconnect_after=3)
+
+    asyncio.run(chat_websocket(websocket, session_id))
+
+    assert [frame["type"] for frame in websocket.frames] == ["token"] * 3
+    messages = stored_messages(session_id)
+    assert len(messages) == 2
+    assert messages[0].is_user_message and messages[0].content == "Tell me a long story"
+    reply = messages[1]
+    assert not reply.is_user_message
+    assert reply.message_metadata["interrupted"] is True
+    # 保存断开前已生成的部分（包括未能推送的最后一段），而不是完整回复
+    sent = "".join(frame["text"] for frame in websocket.frames)
+    assert reply.content.startswith(sent) and len(reply.content) > len(sent)
+    assert len(reply.content.split()) < fake_model.fake_config.tokens
+
+
+def test_cancelled_reply_is_saved_off_the_event_loop(client, fake_model, monkeypatch):
+    session_id = create_session(client)
+    fake_model.fake_config.chunk_tokens = 5
+    save_threads = []
+    save_turn = chat_stream.save_turn
+
+    def recording_save_turn(context, messages):
+        save_threads.append(threading.current_thread())
+        return save_turn(context, messages)
+
+    monkeypatch.setattr(chat_stream, "save_turn", recording_save_turn)
+
+    async def run():
+        context = await chat_stream.get_chat_context(session_id)
+        first_token = asyncio.Event()
+
+        async def consume():
+            async with aclosing(chat_stream.stream_reply(context, "Tell me a long story")) as events:
+                async for event, _ in events:
+                    first_token.set()
+                    await asyncio.sleep(10)  # 向慢客户端推送时阻塞
+
+        # 连接断开时服务器取消处理任务（而不是正常结束迭代）
+        task = asyncio.create_task(consume())
+        await first_token.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+
+    assert len(save_threads) == 1 and save_threads[0] is not threading.main_thread()
+    messages = stored_messages(session_id)
+    assert [m.is_user_message for m in messages] == [True, False]
+    assert messages[1].message_metadata["interrupted"] is True
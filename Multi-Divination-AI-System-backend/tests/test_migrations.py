@@ -0,0 +1,85 @@
+# tests/test_migrations.py - 迁移把旧库升级到与模型一致，已由 create_all 建好的库可以直接升级
+import importlib.util
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import MetaData, Table, create_engine, inspect
+
+from database import Base
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location(
+    "initial_revision", os.path.join(BACKEND_DIR, "migrations", "versions", "0001_reading_chat_quota_columns.py")
+)
+initial_revision = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(initial_revision)
+
+NEW_TABLES = {"tarot_card_draws", "mbti_results", "generation_cache"}
+
+
+def alembic_config(url: str) -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def create_old_schema(engine) -> None:
+    """迁移之前的表结构：没有新列、新表和新索引"""
+    new_columns = {table: {column.name for column in columns} for table, columns in initial_revision.new_columns().items()}
+    old = MetaData()
+    for table in Base.metadata.sorted_tables:
+        if table.name in NEW_TABLES:
+            continue
+        Table(table.name, old, *[
+            column._copy() for column in table.columns if column.name not in new_columns.get(table.name, ())
+        ])
+    old.create_all(engine)
+
+
+def schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {index["name"] for index in inspector.get_indexes(table)}
+        )
+        for table in inspector.get_table_names() if table != "alembic_version"
+    }
+
+
+def assert_matches_models(engine) -> None:
+    current = schema(engine)
+    for table in Base.metadata.sorted_tables:
+        columns, indexes = current[table.name]
+        assert columns == {column.name for column in table.columns}, table.name
+    for name, table, _ in initial_revision.NEW_INDEXES:
+        assert name in current[table][1]
+
+
+def test_upgrade_old_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_engine(url)
+    create_old_schema(engine)
+    assert "readings" in schema(engine) and "tarot_card_draws" not in schema(engine)
+
+    command.upgrade(alembic_config(url), "head")
+    assert_matches_models(engine)
+
+    # 降级后再升级
+    command.downgrade(alembic_config(url), "base")
+    assert "spread_type" not in schema(engine)["readings"][0]
+    command.upgrade(alembic_config(url), "head")
+    assert_matches_models(engine)
+
+
+def test_upgrade_database_created_by_create_all(tmp_path):
+    url = f"sqlite:///{tmp_path / 'new.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    before = schema(engine)
+
+    command.upgrade(alembic_config(url), "head")
+    assert schema(engine) == before
@@ -0,0 +1,60 @@
+# tests/test_palm_upload.py - 手相图片流式上传：文件写入不在事件循环中执行
+import asyncio
+import io
+import os
+
+from PIL import Image
+
+from config import settings
+from services.blob_store import BlobWriter
+
+
+def png_bytes(width: int = 300, height: int = 400) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (180, 120, 90)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def record_writes(monkeypatch):
+    """记录每次写入是否发生在运行事件循环的线程中"""
+    on_event_loop = []
+    write = BlobWriter.write
+
+    def recording_write(self, data):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return write(self, data)
+
+    monkeypatch.setattr(BlobWriter, "write", recording_write)
+    return on_event_loop
+
+
+def stored_files():
+    return {os.path.join(root, name) for root, _, names in os.walk(settings.blob_dir) for name in names}
+
+
+def test_upload_writes_chunks_off_the_event_loop(client, monkeypatch):
+    on_event_loop = record_writes(monkeypatch)
+    image = png_bytes()
+
+    response = client.post("/palm/images", files={"file": ("palm.png", image, "image/png")})
+
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["size"], body["width"], body["height"]) == (len(image), 300, 400)
+    assert on_event_loop and not any(on_event_loop)
+    assert client.get(body["thumbnail_url"]).status_code == 200
+
+
+def test_oversized_upload_is_rejected_and_discarded(client, monkeypatch):
+    monkeypatch.setattr(settings, "palm_upload_max_bytes", 1024)
+    before = stored_files()
+
+    response = client.post("/palm/images", files={"file": ("palm.png", png_bytes(), "image/png")})
+
+    assert response.status_code == 413
+    # 中止的写入不留下临时文件
+    assert stored_files() == before
@@ -0,0 +1,175 @@
+# tests/test_query_budget.py - 接口的SQL查询次数上限（防止 N+1 查询回归）
+from datetime import datetime, timedelta
+
+from constants import TEST_USER_ID
+from models import DivinationMethod, Persona, Reading, ReadingSource
+from monitoring.query_stats import assert_max_queries, count_queries
+from schemas import ReadingUpdate
+from services.persona_service import PersonaService
+from services.reading_service import ReadingService
+
+
+def create_readings(db, count: int):
+    readings = [
+        Reading(
+            user_id=TEST_USER_ID,
+            method=DivinationMethod.TAROT,
+            main_question=f"Question {i}",
+            output_text="...",
+            input_data={"spread_type": "three_card"}
+        )
+        for i in range(count)
+    ]
+    db.add_all(readings)
+    db.commit()
+    return [reading.id for reading in readings]
+
+
+def test_reading_list_query_count_does_not_grow_with_page_size(client, db):
+    create_readings(db, 30)
+
+    small = client.get("/readings/", params={"limit": 5})
+    large = client.get("/readings/", params={"limit": 30})
+
+    assert small.status_code == 200 and len(large.json()) == 30
+    assert assert_max_queries(small, 1) == assert_max_queries(large, 1)
+
+
+def test_bulk_update_endpoint_is_a_single_statement(client, db):
+    reading_ids = create_readings(db, 20)
+
+    response = client.patch("/readings/bulk", json={"reading_ids": reading_ids, "update": {"is_favorite": True}})
+
+    assert response.status_code == 200
+    assert response.json()["updated_count"] == 20
+    assert_max_queries(response, 1)
+
+
+def test_bulk_update_by_filter_is_a_single_statement(db):
+    create_readings(db, 20)
+
+    with count_queries() as stats:
+        results = ReadingService(db).bulk_update_readings(
+            ReadingUpdate(user_rating=4), method=DivinationMethod.TAROT
+        )
+
+    assert len(results) == 20
+    assert stats.query_count == 1
+
+
+def create_integrated_reading(db, source_count: int) -> int:
+    source_ids = create_readings(db, source_count)
+    integrated = Reading(
+        user_id=TEST_USER_ID,
+        method=DivinationMethod.INTEGRATED,
+        main_question="Integrated question",
+        output_text="..."
+    )
+    db.add(integrated)
+    db.flush()
+    db.add_all(ReadingSource(integrated_reading_id=integrated.id, source_reading_id=source_id) for source_id in source_ids)
+    db.commit()
+    return integrated.id
+
+
+def test_reading_details_query_count_does_not_grow_with_sources(client, db):
+    small, large = create_integrated_reading(db, 2), create_integrated_reading(db, 20)
+
+    small_response = client.get(f"/readings/{small}/details")
+    large_response = client.get(f"/readings/{large}/details")
+
+    assert len(large_response.json()["source_readings"]) == 20
+    assert assert_max_queries(small_response, 2) == assert_max_queries(large_response, 2)
+
+
+def link_integrated_readings(db, source_id: int, count: int) -> None:
+    for _ in range(count):
+        integrated = Reading(
+            user_id=TEST_USER_ID, method=DivinationMethod.INTEGRATED, main_question="Q", output_text="..."
+        )
+        db.add(integrated)
+        db.flush()
+        db.add(ReadingSource(integrated_reading_id=integrated.id, source_reading_id=source_id))
+    db.commit()
+
+
+def test_reading_details_query_count_does_not_grow_with_integrated_readings(client, db):
+    small, large = create_readings(db, 2)
+    link_integrated_readings(db, small, 2)
+    link_integrated_readings(db, large, 20)
+
+    small_response = client.get(f"/readings/{small}/details")
+    large_response = client.get(f"/readings/{large}/details")
+
+    assert len(large_response.json()["integrated_readings"]) == 20
+    assert assert_max_queries(small_response, 2) == assert_max_queries(large_response, 2)
+
+
+def create_persona_with_readings(db, count: int) -> int:
+    persona = Persona(user_id=TEST_USER_ID, display_name=f"Persona {count}")
+    db.add(persona)
+    db.flush()
+    db.add_all(
+        Reading(
+            user_id=TEST_USER_ID,
+            persona_id=persona.id,
+            method=DivinationMethod.TAROT,
+            main_question=f"Question {i}",
+            output_text="...",
+            is_favorite=i % 2 == 0
+        )
+        for i in range(count)
+    )
+    db.commit()
+    return persona.id
+
+
+def test_persona_stats_query_count_does_not_grow_with_readings(client, db):
+    small, large = create_persona_with_readings(db, 2), create_persona_with_readings(db, 30)
+
+    small_response = client.get(f"/personas/{small}/stats")
+    large_response = client.get(f"/personas/{large}/stats")
+
+    assert large_response.json()["statistics"]["favorite_readings"] == 15
+    assert assert_max_queries(small_response, 2) == assert_max_queries(large_response, 2)
+
+
+def test_batch_summary_query_count_does_not_grow_with_readings(client, db):
+    create_persona_with_readings(db, 2)
+    small_response = client.get("/batch/summary")
+
+    for _ in range(5):
+        create_persona_with_readings(db, 10)
+    large_response = client.get("/batch/summary")
+
+    assert large_response.json()["statistics"]["total_readings"] == 52
+    assert assert_max_queries(small_response, 5) == assert_max_queries(large_response, 5)
+
+
+def test_birth_data_uses_latest_astrology_reading_in_one_query(db):
+    personas = [Persona(user_id=TEST_USER_ID, display_name=f"Persona {i}") for i in range(3)]
+    db.add_all(personas)
+    db.commit()
+    start = datetime(2026, 1, 1)
+    for persona in personas:
+        db.add_all([
+            Reading(
+                user_id=TEST_USER_ID,
+                persona_id=persona.id,
+                method=DivinationMethod.ASTROLOGY,
+                main_question="Chart",
+                output_text="...",
+                input_data={"birth_date": f"1990-01-{day:02d}"},
+                created_at=start + timedelta(days=day)
+            )
+            for day in range(1, 21)
+        ])
+    db.commit()
+    persona_ids = [persona.id for persona in personas]
+
+    with count_queries() as stats:
+        birth_data = PersonaService(db).get_birth_data(persona_ids)
+
+    assert stats.query_count == 1
+    assert set(birth_data) == set(persona_ids)
+    assert {data["birth_date"] for data in birth_data.values()} == {"1990-01-20"}
@@ -0,0 +1,115 @@
+# tests/test_quota.py - 订阅额度：多实例共享数据库时的总量上限、非 RETURNING 路径、失败退回
+import threading
+from datetime import datetime
+
+import pytest
+
+from constants import TEST_USER_ID
+from database import SessionLocal, engine
+from models import Subscription, SubscriptionStatus, SubscriptionTier
+from services.quota import QuotaExceededError, ReadingQuota, reading_quota
+
+GENERATION_REQUEST = {
+    "user_name": "Alice",
+    "primary_question": "What does this year hold?",
+    "selected_methods": ["MBTI", "Tarot"],
+    "input_data": {"mbti_type": "INFP"},
+    "generate_integrated": False,
+    "use_cache": False
+}
+
+
+def subscribe(db, limit: int) -> int:
+    subscription = Subscription(
+        user_id=TEST_USER_ID,
+        tier=SubscriptionTier.PREMIUM,
+        status=SubscriptionStatus.ACTIVE,
+        start_date=datetime(2020, 1, 1),
+        monthly_reading_limit=limit
+    )
+    db.add(subscription)
+    db.commit()
+    return subscription.id
+
+
+def stored_usage(subscription_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(Subscription, subscription_id).current_monthly_usage or 0
+    finally:
+        db.close()
+
+
+def consume_concurrently(instances, attempts_per_thread: int, threads_per_instance: int = 2) -> int:
+    """多个实例（模拟多个 worker）各开若干线程同时扣减，返回放行的总次数"""
+    allowed = []
+    lock = threading.Lock()
+
+    def worker(quota):
+        count = 0
+        for _ in range(attempts_per_thread):
+            try:
+                quota.consume(TEST_USER_ID)
+                count += 1
+            except QuotaExceededError:
+                pass
+        with lock:
+            allowed.append(count)
+
+    threads = [
+        threading.Thread(target=worker, args=(quota,))
+        for quota in instances for _ in range(threads_per_instance)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(allowed)
+
+
+@pytest.mark.parametrize("update_returning", [True, False])
+def test_instances_sharing_one_database_never_exceed_the_limit(db, monkeypatch, update_returning):
+    monkeypatch.setattr(engine.dialect, "update_returning", update_returning)
+    subscription_id = subscribe(db, limit=17)
+    instances = [ReadingQuota(lease_size=5) for _ in range(3)]
+
+    assert consume_concurrently(instances, attempts_per_thread=10) == 17
+
+    # 对账后归还未用完的预占次数，数据库中的用量等于实际放行次数
+    for quota in instances:
+        quota.reconcile(force=True)
+    assert stored_usage(subscription_id) == 17
+
+
+def test_unused_leases_are_returned_and_usable_by_other_instances(db):
+    subscription_id = subscribe(db, limit=6)
+    first, second = ReadingQuota(lease_size=5), ReadingQuota(lease_size=5)
+
+    first.consume(TEST_USER_ID)
+    assert stored_usage(subscription_id) == 5
+    second.consume(TEST_USER_ID)
+    with pytest.raises(QuotaExceededError):
+        second.consume(TEST_USER_ID)
+
+    assert first.reconcile(force=True) == 4
+    second.reconcile(force=True)
+    assert consume_concurrently([second], attempts_per_thread=10, threads_per_instance=1) == 4
+    second.reconcile(force=True)
+    assert stored_usage(subscription_id) == 6
+
+
+def test_failed_stream_refunds_quota(client, db, fake_model):
+    subscription_id = subscribe(db, limit=1)
+    fake_model.fake_config.error_rate = 1.0
+
+    response = client.post("/generation/readings/stream", json=GENERATION_REQUEST)
+    assert response.status_code == 200
+    assert "event: done" not in response.text
+
+    reading_quota.reconcile(force=True)
+    assert stored_usage(subscription_id) == 0
+
+    fake_model.fake_config.error_rate = 0.0
+    response = client.post("/generation/readings/stream", json=GENERATION_REQUEST)
+    assert "event: complete" in response.text
+    assert client.post("/generation/readings/stream", json=GENERATION_REQUEST).status_code == 429
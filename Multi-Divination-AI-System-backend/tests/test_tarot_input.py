@@ -0,0 +1,65 @@
+# tests/test_tarot_input.py - 塔罗输入：服务端抽牌不覆盖用户选牌，无效参数在请求校验时拒绝
+import pytest
+
+from schemas import GenerationRequest
+from services.generation_service import GenerationService
+from services.tarot import draw
+
+USER_CARDS = ["The Star", "Two of Cups", "The Moon"]
+
+
+def generation_request(input_data):
+    return GenerationRequest(
+        user_name="Alice",
+        primary_question="What does this year hold?",
+        selected_methods=["Tarot"],
+        input_data=input_data
+    )
+
+
+def batch_body(input_data):
+    return {
+        "user_name": "Alice",
+        "primary_question": "What does this year hold?",
+        "selected_methods": ["Tarot"],
+        "input_data": input_data,
+        "individual_reports": {"Tarot": "report"}
+    }
+
+
+def test_server_seeds_only_when_nothing_was_chosen():
+    seeded = GenerationService.with_tarot_seed(generation_request({}))
+    assert seeded.input_data["tarot_seed"]
+
+    for chosen in ({"selected_cards": USER_CARDS}, {"card_positions": [3, 40, 77]}):
+        request = generation_request(chosen)
+        assert GenerationService.with_tarot_seed(request) is request
+
+
+def test_batch_keeps_user_selected_cards(client):
+    response = client.post("/batch/readings", json=batch_body({"selected_cards": USER_CARDS}))
+    assert response.status_code == 200
+    reading = response.json()["individual_readings"][0]
+    assert reading["input_data"]["selected_cards"] == USER_CARDS
+    assert "tarot_draw" not in reading["input_data"]
+
+
+@pytest.mark.parametrize("input_data", [
+    {"tarot_seed": "not-hex"},
+    {"tarot_seed": "ab" * 4},
+    {"tarot_seed": draw()["seed"], "card_positions": [1, 1, 2]},
+    {"tarot_seed": draw()["seed"], "card_positions": ["a", "b", "c"]},
+    {"tarot_seed": draw()["seed"], "card_positions": 7},
+    {"tarot_seed": draw()["seed"], "spread_type": ["three_card"]},
+])
+def test_malformed_draw_is_rejected_before_saving(client, input_data):
+    response = client.post("/batch/readings", json=batch_body(input_data))
+    assert response.status_code == 422
+
+    response = client.post("/generation/readings/stream", json={
+        "user_name": "Alice",
+        "primary_question": "What does this year hold?",
+        "selected_methods": ["Tarot"],
+        "input_data": input_data
+    })
+    assert response.status_code == 422
@@ -0,0 +1,45 @@
+# tests/test_typed_results.py - 单条创建的塔罗/MBTI报告与批量创建一样写入逐张牌和维度得分记录
+from models import MBTIResult
+from services.mbti import QUESTIONS
+from services.tarot import draw
+
+
+def single_body(method, input_data):
+    return {
+        "method": method,
+        "main_question": "What does this year hold?",
+        "output_text": "A detailed report.",
+        "input_data": input_data
+    }
+
+
+def test_single_tarot_reading_appears_in_card_stats(client):
+    expected = draw(seed=draw()["seed"])
+
+    response = client.post("/readings/", json=single_body("Tarot", {"tarot_seed": expected["seed"]}))
+    assert response.status_code == 200
+
+    stats = client.get("/tarot/card-stats").json()
+    assert {stat["card"]: stat["count"] for stat in stats} == {card["card"]: 1 for card in expected["cards"]}
+    assert sum(stat["reversed_count"] for stat in stats) == sum(card["reversed"] for card in expected["cards"])
+
+
+def test_single_tarot_reading_without_draw_has_no_card_rows(client):
+    response = client.post("/readings/", json=single_body("Tarot", {"selected_cards": ["The Star"]}))
+    assert response.status_code == 200
+    assert client.get("/tarot/card-stats").json() == []
+
+
+def test_single_mbti_reading_writes_scores(client, db):
+    answers = {question_id: 1 for question_id in QUESTIONS}
+
+    response = client.post("/readings/", json=single_body("MBTI", {"quiz_answers": answers}))
+    assert response.status_code == 200
+
+    result = db.query(MBTIResult).filter(MBTIResult.reading_id == response.json()["id"]).one()
+    assert result.answered == len(QUESTIONS)
+
+
+def test_single_reading_with_malformed_draw_is_rejected(client):
+    response = client.post("/readings/", json=single_body("Tarot", {"tarot_seed": "not-hex"}))
+    assert response.status_code == 422
@@ -0,0 +1,236 @@
+# tests/test_write_buffer.py - 收藏/评分写回缓冲的合并、刷新与崩溃语义
+import json
+import logging
+import threading
+
+import pytest
+
+from config import settings
+from constants import TEST_USER_ID
+from database import SessionLocal
+from models import DivinationMethod, Persona, Reading
+from schemas import ReadingUpdate
+from services.batch_service import BatchService
+from services.persona_service import PersonaService
+from services.reading_service import ReadingService
+from services.write_buffer import ReadingWriteBuffer, reading_write_buffer
+
+
+def create_reading(db, persona_id=None) -> int:
+    reading = Reading(
+        user_id=TEST_USER_ID,
+        persona_id=persona_id,
+        method=DivinationMethod.MBTI,
+        main_question="What should I focus on?",
+        output_text="..."
+    )
+    db.add(reading)
+    db.commit()
+    return reading.id
+
+
+def stored(reading_id: int) -> Reading:
+    db = SessionLocal()
+    try:
+        return db.get(Reading, reading_id)
+    finally:
+        db.close()
+
+
+class FailingSession:
+    """执行语句时失败的会话"""
+
+    def __init__(self):
+        self.session = SessionLocal()
+
+    def execute(self, *args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+class BlockingSession:
+    """执行语句前阻塞，直到测试放行（模拟正在进行的刷新）"""
+
+    def __init__(self, entered: threading.Event, release: threading.Event):
+        self.session = SessionLocal()
+        self.entered = entered
+        self.release = release
+
+    def execute(self, *args, **kwargs):
+        self.entered.set()
+        assert self.release.wait(5)
+        return self.session.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    monkeypatch.setattr(settings, "write_behind_enabled", True)
+    yield reading_write_buffer
+    monkeypatch.setattr(reading_write_buffer, "session_factory", SessionLocal)
+
+
+def test_updates_are_merged_and_flushed_once(db):
+    reading_id = create_reading(db)
+    buffer = ReadingWriteBuffer()
+
+    buffer.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True})
+    buffer.enqueue(TEST_USER_ID, reading_id, {"user_rating": 3})
+    buffer.enqueue(TEST_USER_ID, reading_id, {"user_rating": 5})
+
+    assert buffer.pending_count == 1
+    assert buffer.flush() == 1
+    assert buffer.pending_count == 0
+    reading = stored(reading_id)
+    assert reading.is_favorite is True
+    assert reading.user_rating == 5
+
+
+def test_unflushed_updates_are_lost_on_crash_and_flushed_on_stop(db):
+    reading_id = create_reading(db)
+
+    crashed = ReadingWriteBuffer()
+    crashed.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True})
+    # 进程崩溃：缓冲对象直接丢弃，最多丢失一个刷新窗口内的更新
+    del crashed
+    assert not stored(reading_id).is_favorite
+
+    import asyncio
+    buffer = ReadingWriteBuffer(flush_interval=60)
+
+    async def run():
+        await buffer.start()
+        buffer.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True})
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert stored(reading_id).is_favorite is True
+
+
+def test_failed_flush_requeues_with_newer_values_first(db):
+    reading_id = create_reading(db)
+    buffer = ReadingWriteBuffer(session_factory=FailingSession)
+    buffer.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True, "user_rating": 2})
+
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert buffer.get(TEST_USER_ID, reading_id) == {"is_favorite": True, "user_rating": 2}
+
+    buffer.enqueue(TEST_USER_ID, reading_id, {"user_rating": 4})
+    buffer.session_factory = SessionLocal
+    buffer.flush()
+    reading = stored(reading_id)
+    assert reading.is_favorite is True
+    assert reading.user_rating == 4
+
+
+def test_direct_write_during_flush_is_not_overwritten(db, write_behind):
+    reading_id = create_reading(db)
+    entered, release = threading.Event(), threading.Event()
+    write_behind.session_factory = lambda: BlockingSession(entered, release)
+    write_behind.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True, "user_rating": 1})
+
+    flusher = threading.Thread(target=write_behind.flush)
+    flusher.start()
+    assert entered.wait(5)
+    # 刷新中的批次在提交前仍对读取可见
+    assert write_behind.buffered_values(TEST_USER_ID, "is_favorite") == {reading_id: True}
+
+    def direct_update():
+        session = SessionLocal()
+        try:
+            ReadingService(session).update_reading(
+                reading_id, ReadingUpdate(is_favorite=False, user_feedback="changed my mind"), TEST_USER_ID
+            )
+        finally:
+            session.close()
+
+    writer = threading.Thread(target=direct_update)
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive(), "同步写入应等待进行中的刷新完成"
+
+    release.set()
+    flusher.join(5)
+    writer.join(5)
+    reading = stored(reading_id)
+    assert reading.is_favorite is False
+    assert reading.user_rating == 1
+    assert reading.user_feedback == "changed my mind"
+
+
+def test_direct_write_to_other_reading_does_not_wait_for_flush(db, write_behind):
+    flushed_id, other_id = create_reading(db), create_reading(db)
+    entered, release = threading.Event(), threading.Event()
+    write_behind.session_factory = lambda: BlockingSession(entered, release)
+    write_behind.enqueue(TEST_USER_ID, flushed_id, {"is_favorite": True})
+
+    flusher = threading.Thread(target=write_behind.flush)
+    flusher.start()
+    try:
+        assert entered.wait(5)
+        # 刷新的数据库写入进行中，其它报告的同步写入不等待
+        ReadingService(db).update_reading(other_id, ReadingUpdate(user_feedback="great"), TEST_USER_ID)
+        assert stored(other_id).user_feedback == "great"
+    finally:
+        release.set()
+        flusher.join(5)
+    assert stored(flushed_id).is_favorite is True
+
+
+def test_background_flush_failure_is_logged_and_retried(db, caplog):
+    import asyncio
+    reading_id = create_reading(db)
+    buffer = ReadingWriteBuffer(session_factory=FailingSession, flush_interval=0.01)
+
+    async def run():
+        await buffer.start()
+        buffer.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True})
+        await asyncio.sleep(0.1)
+        buffer.session_factory = SessionLocal
+        await buffer.stop()
+
+    with caplog.at_level(logging.WARNING, logger="divination.write_buffer"):
+        asyncio.run(run())
+    record = json.loads(caplog.records[0].getMessage())
+    assert record["event"] == "write_buffer_flush_failed"
+    assert record["error"] == "database unavailable"
+    assert stored(reading_id).is_favorite is True
+
+
+def test_failed_flush_does_not_overwrite_later_bulk_update(db, write_behind):
+    reading_id = create_reading(db)
+    write_behind.enqueue(TEST_USER_ID, reading_id, {"is_favorite": True})
+    write_behind.session_factory = FailingSession
+    with pytest.raises(RuntimeError):
+        write_behind.flush()
+
+    ReadingService(db).bulk_update_readings(ReadingUpdate(is_favorite=False), reading_ids=[reading_id])
+    write_behind.session_factory = SessionLocal
+    write_behind.flush()
+    assert stored(reading_id).is_favorite is False
+
+
+def test_statistics_include_buffered_favorites(db, write_behind):
+    persona = Persona(user_id=TEST_USER_ID, display_name="Alice")
+    db.add(persona)
+    db.commit()
+    first, second = create_reading(db, persona.id), create_reading(db, persona.id)
+    ReadingService(db).bulk_update_readings(ReadingUpdate(is_favorite=True), reading_ids=[first])
+
+    ReadingService(db).update_reading(second, ReadingUpdate(is_favorite=True))
+    ReadingService(db).update_reading(first, ReadingUpdate(is_favorite=False))
+    assert write_behind.pending_count == 2
+
+    db.expire_all()
+    summary = BatchService(db).get_user_batch_summary()
+    assert summary["statistics"]["favorite_readings"] == 1
+    assert {r["id"]: r["is_favorite"] for r in summary["recent_readings"]} == {first: False, second: True}
+
+    db.expire_all()
+    stats = PersonaService(db).get_persona_with_stats(persona.id)
+    assert stats["statistics"]["favorite_readings"] == 1